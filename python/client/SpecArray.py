@@ -90,7 +90,8 @@ def SpecArray(data, datatype = ARRAY_CHAR, rows = 0, cols = 0):
                 rows, cols = data.shape
             else:
                 rows, cols = 1, data.shape[0]
-            data = data.tostring()
+            # kept as an array, sent without copy (see SpecArrayData.buffer)
+            data = numpy.ascontiguousarray(data)
 
         newArray = SpecArrayData(data, datatype, (rows, cols))
     else:
@@ -122,4 +123,15 @@ class SpecArrayData:
 
 
     def tostring(self):
+        if isinstance(self.data, numpy.ndarray):
+            return self.data.tobytes()
         return str(self.data)
+
+    def buffer(self):
+        """Return the bytes of the array, without copy"""
+        data = self.data
+        if isinstance(data, numpy.ndarray):
+            data = data.reshape(-1).view(numpy.uint8)
+        if is_python3():
+            return memoryview(data)
+        return buffer(data)
@@ -0,0 +1,659 @@
+#  %W%  %G% CSS
+#  "pyspec" Release %R%
+#
+"""SpecAsyncConnection module
+
+asyncio client for a remote Spec server. Messages are read and built
+with the SpecMessage codecs, and a single event loop can drive many
+connections with no thread nor polling.
+
+    conn = SpecAsyncConnection('localhost:fourc')
+    await conn.connect()
+    value = await conn.read_channel('var/A')
+    ret = await conn.run_cmd('1+1')
+    await conn.move('th', 12.5)
+    async for value in conn.channel_events('motor/th/position'):
+        print(value)
+
+The awaitables returned are asyncio futures and the async iterators
+plain objects, so that this module does not use the async/await
+syntax and the package still compiles with Python 2 (where this
+module is not available).
+
+Classes :
+SpecAsyncConnection -- asyncio protocol and API to a Spec server
+ChannelEvents -- async iterator over the values of a channel
+"""
+
+import asyncio
+import collections
+import functools
+import socket
+
+from pyspec.css_logger import log
+
+import SpecMessage
+from SpecConnection import MIN_PORT, MAX_PORT, WAIT_HELLO_TIMEOUT
+from SpecClientError import SpecClientError, SpecClientNotConnectedError, \
+        SpecClientProtocolError, SpecClientVersionError
+
+(DISCONNECTED, CONNECTING, WAITINGFORHELLO, CONNECTED) = (0, 1, 2, 3)
+
+# flags given to channel listeners when the connection is lost
+CONNECTION_LOST = -1
+
+
+class ChannelEvents(object):
+    """Async iterator over the values of a channel
+
+    The first value is the current one, sent by Spec when the channel
+    is registered. Iteration stops when the connection is lost or
+    close() is called.
+    """
+    def __init__(self, conn, chan_name, maxlen=None):
+        """Constructor
+
+        Arguments:
+        conn -- SpecAsyncConnection object
+        chan_name -- channel name, i.e. 'var/toto'
+        maxlen -- number of values kept for a slow reader, only the
+        latest ones being kept. None to keep all of them
+        """
+        self.conn = conn
+        self.chan_name = chan_name
+        self.values = collections.deque(maxlen=maxlen)
+        self.waiter = None
+        self.closed = False
+
+        conn.add_listener(chan_name, self.put)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = self.conn.loop.create_future()
+        if self.values:
+            future.set_result(self.values.popleft())
+        elif self.closed:
+            future.set_exception(StopAsyncIteration())
+        else:
+            self.waiter = future
+        return future
+
+    def put(self, value, flags=0):
+        """Add a value received from Spec (None if deleted)"""
+        if flags == CONNECTION_LOST:
+            self.closed = True
+            self._stop_waiter()
+            return
+
+        if flags & SpecMessage.DELETED:
+            value = None
+
+        waiter, self.waiter = self.waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(value)
+        else:
+            self.values.append(value)
+
+    def _stop_waiter(self):
+        waiter, self.waiter = self.waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(StopAsyncIteration())
+
+    def close(self):
+        """Stop the iteration, unregistering the channel if not used"""
+        if self.closed:
+            return
+        self.closed = True
+        self.conn.remove_listener(self.chan_name, self.put)
+        self._stop_waiter()
+
+    def aclose(self):
+        """Awaitable close(), for async generator like use"""
+        self.close()
+        future = self.conn.loop.create_future()
+        future.set_result(None)
+        return future
+
+
+class SpecAsyncConnection(asyncio.BufferedProtocol):
+    """SpecAsyncConnection class
+
+    asyncio protocol speaking to a remote Spec server. Bytes are
+    received in place in a SpecMessage.ReceiveBuffer and the data of
+    array messages directly in their numpy array.
+
+    Requests return asyncio futures, resolved when the reply arrives.
+    """
+    def __init__(self, spec_app, loop=None):
+        """Constructor
+
+        Arguments:
+        spec_app -- a 'host:port' or 'host:specname' string
+        loop -- event loop, by default the running one
+        """
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self.loop = loop
+
+        self.host, self.specname = spec_app.split(':')
+        try:
+            self.port = int(self.specname)
+            self.specname = None
+            self.scanports = False
+        except ValueError:
+            self.port = None
+            self.scanports = True
+        self.ignore_ports = []
+
+        self.state = DISCONNECTED
+        self.transport = None
+        self.server_version = None
+        self.ready = None
+        self.hello_timer = None
+        self.ports = None
+
+        self.message = None
+        self.receive_buffer = SpecMessage.ReceiveBuffer()
+
+        self.reg_replies = {}
+        self.listeners = {}
+
+        # arrays receiving the data of array channels
+        self.array_buffers = {}
+        self.reply_arrays = {}
+
+    def __str__(self):
+        return '<spec async connection: %s (@%s:%s)>' % (self.specname, self.host, self.port)
+
+    def set_ignore_ports(self, ports):
+        self.ignore_ports = ports
+
+    def is_connected(self):
+        return self.state == CONNECTED
+
+    #
+    # connection
+    #
+    def connect(self):
+        """Connect to Spec
+
+        If the connection was opened with a spec name, the ports from
+        MIN_PORT to MAX_PORT are tried until the server gives that name.
+
+        Return value:
+        future resolved once the server answers the hello message
+        """
+        if self.ready is not None and not self.ready.done():
+            return self.ready
+
+        self.ready = self.loop.create_future()
+
+        if self.scanports:
+            self.ports = iter(range(MIN_PORT, MAX_PORT + 1))
+        else:
+            self.ports = iter([self.port])
+
+        self.state = CONNECTING
+        self._connect_next()
+        return self.ready
+
+    def _connect_next(self):
+        """Try the next port to connect to"""
+        for port in self.ports:
+            if port not in self.ignore_ports:
+                break
+        else:
+            self.state = DISCONNECTED
+            if not self.ready.done():
+                self.ready.set_exception(SpecClientNotConnectedError(
+                    "cannot connect to spec %s on %s" % (self.specname or self.port, self.host)))
+            return
+
+        self.port = port
+        task = self.loop.create_task(
+            self.loop.create_connection(lambda: self, self.host, port))
+        task.add_done_callback(self._connection_tried)
+
+    def _connection_tried(self, task):
+        if task.cancelled() or task.exception() is not None:
+            if self.ready.done():
+                self.state = DISCONNECTED
+            else:
+                self._connect_next()
+
+    def close(self):
+        """Close the connection"""
+        self.ports = iter(())
+        if self.transport is not None:
+            self.transport.close()
+
+    disconnect = close
+
+    # asyncio interface
+    def connection_made(self, transport):
+        self.transport = transport
+
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        self.state = WAITINGFORHELLO
+        self.hello_timer = self.loop.call_later(WAIT_HELLO_TIMEOUT, self._hello_timeout)
+        self.send_msg(SpecMessage.msg_hello())
+
+    def _hello_timeout(self):
+        log.log(2, "socket connected but no response to hello message. forget this socket")
+        self.hello_timer = None
+        self.transport.abort()
+
+    def connection_lost(self, exc):
+        if self.hello_timer is not None:
+            self.hello_timer.cancel()
+            self.hello_timer = None
+
+        was_connected = (self.state == CONNECTED)
+
+        self.transport = None
+        self.server_version = None
+        self.state = DISCONNECTED
+        self.message = None
+        self.receive_buffer = SpecMessage.ReceiveBuffer()
+
+        if not was_connected and not self.ready.done():
+            # wrong spec or no hello reply, try the next port
+            self.state = CONNECTING
+            self._connect_next()
+            return
+
+        log.log(2, "connection to spec %s lost" % self.specname)
+
+        replies, self.reg_replies = self.reg_replies, {}
+        self.reply_arrays = {}
+        for future in replies.values():
+            if not future.done():
+                future.set_exception(SpecClientNotConnectedError("connection lost"))
+
+        listeners, self.listeners = self.listeners, {}
+        for callbacks in listeners.values():
+            for callback in callbacks:
+                callback(None, CONNECTION_LOST)
+
+    def get_buffer(self, sizehint):
+        """Return the buffer to receive the next bytes in"""
+        msg = self.message
+        if msg is not None and msg.arrayView is not None:
+            return msg.arrayView[msg.arrayFilled:]
+
+        nbytes = 32768
+        if msg is not None and not msg.readheader:
+            # the rest of a large message is received at once
+            nbytes = max(nbytes, msg.bytesToRead - len(self.receive_buffer))
+        return self.receive_buffer.freeView(nbytes)
+
+    def buffer_updated(self, nbytes):
+        """Read the messages received
+
+        As with SpecConnection.handle_read, complete messages are read
+        in one go and the others in pieces, with a SpecMessage object.
+        """
+        msg = self.message
+        if msg is not None and msg.arrayView is not None:
+            msg.arrayReceived(nbytes)
+            if msg.isComplete():
+                self.message = None
+                try:
+                    self.dispatch_msg(msg)
+                except SpecClientProtocolError as e:
+                    self.protocol_error(e)
+            return
+
+        self.receive_buffer.received(nbytes)
+        sbuffer = self.receive_buffer.view()
+        offset = 0
+
+        try:
+            while offset < len(sbuffer):
+                if self.message is None:
+                    for message, offset in SpecMessage.iterMessages(sbuffer, offset,
+                                                                    self.server_version):
+                        self.dispatch_msg(message)
+
+                    if offset >= len(sbuffer):
+                        break
+
+                    self.message = SpecMessage.message(version = self.server_version)
+
+                consumedBytes = self.message.readFromStream(sbuffer, offset, self._array_for)
+                if consumedBytes == 0:
+                    break
+                offset += consumedBytes
+
+                if self.message.isComplete():
+                    message, self.message = self.message, None
+                    self.dispatch_msg(message)
+        except SpecClientProtocolError as e:
+            self.protocol_error(e)
+        finally:
+            del sbuffer
+            self.receive_buffer.consume(offset)
+
+    def protocol_error(self, error):
+        """Close the connection on a message that cannot be handled"""
+        log.log(1, "closing connection to spec %s: %s" % (self.specname, error))
+        self.transport.abort()
+
+    #
+    # messages
+    #
+    def _array_for(self, msg):
+        """Return the array to receive the data of an array message in"""
+        if msg.cmd == SpecMessage.REPLY:
+            return self.reply_arrays.pop(msg.sn, None)
+        return self.array_buffers.get(msg.name)
+
+    def dispatch_msg(self, msg):
+        """Dispatch a message received from spec"""
+        try:
+            if msg.cmd == SpecMessage.REPLY:
+                self.dispatch_reply_msg(msg)
+            elif msg.cmd == SpecMessage.EVENT:
+                self.dispatch_event_msg(msg)
+            elif msg.cmd == SpecMessage.HELLO_REPLY:
+                self.dispatch_hello_reply_msg(msg)
+        except SpecClientProtocolError:
+            raise
+        except Exception as e:
+            raise SpecClientProtocolError(str(e))
+
+    def dispatch_event_msg(self, msg):
+        callbacks = self.listeners.get(msg.name)
+        if not callbacks:
+            # events may still come after the channel is unregistered
+            return
+
+        for callback in list(callbacks):
+            callback(msg.data, msg.flags)
+
+    def dispatch_reply_msg(self, msg):
+        if msg.sn <= 0:
+            return
+
+        # the array given for the reply, if it was not an array reply
+        self.reply_arrays.pop(msg.sn, None)
+
+        future = self.reg_replies.pop(msg.sn, None)
+        if future is None:
+            raise SpecClientProtocolError("non expected reply received")
+
+        if future.done():
+            # cancelled by the caller
+            return
+
+        if msg.type == SpecMessage.ERROR:
+            future.set_exception(SpecClientError(msg.data, msg.err))
+        else:
+            future.set_result(msg.data)
+
+    def dispatch_hello_reply_msg(self, msg):
+        if self.hello_timer is not None:
+            self.hello_timer.cancel()
+            self.hello_timer = None
+
+        if self.scanports and msg.name != self.specname:
+            self.transport.close()
+            return
+
+        if not self.scanports:
+            self.specname = msg.name
+
+        self.server_version = msg.vers
+        self.state = CONNECTED
+        log.log(2, "connected to spec %s on port %s" % (self.specname, self.port))
+
+        # listeners registered before the connection
+        for chan_name in self.listeners:
+            self.send_msg(SpecMessage.msg_register(chan_name, version = self.server_version))
+
+        if not self.ready.done():
+            self.ready.set_result(self)
+
+    def send_msg(self, msg):
+        """Send a message to Spec
+
+        The header and data buffers of the message are given to the
+        transport as they are, arrays not being copied, and sent
+        together with sendmsg where asyncio supports it.
+        """
+        if self.transport is None:
+            raise SpecClientNotConnectedError
+        self.transport.writelines(msg.sendingParts())
+
+    def send_msg_with_reply(self, reply, msg, out=None):
+        """Send a message, returning a future resolved with the reply data
+
+        Arguments:
+        reply -- SpecReply object of the message
+        msg -- SpecMessage object to send
+        out -- numpy array to receive an array reply in
+        """
+        if not self.is_connected():
+            raise SpecClientNotConnectedError
+
+        future = self.loop.create_future()
+        self.reg_replies[reply.id] = future
+        if out is not None:
+            self.reply_arrays[reply.id] = out
+
+        self.send_msg(msg)
+        return future
+
+    #
+    # channels
+    #
+    def add_listener(self, chan_name, callback):
+        """Call callback(value, flags) on each event of a channel,
+        registering the channel when needed
+
+        flags are the message flags (SpecMessage.DELETED), or
+        CONNECTION_LOST once when the connection is lost.
+        """
+        callbacks = self.listeners.setdefault(chan_name, [])
+        callbacks.append(callback)
+        if len(callbacks) == 1 and self.is_connected():
+            self.send_msg(SpecMessage.msg_register(chan_name, version = self.server_version))
+
+    def remove_listener(self, chan_name, callback):
+        """Stop calling callback on the events of a channel,
+        unregistering the channel when no listener is left"""
+        callbacks = self.listeners.get(chan_name)
+        if not callbacks or callback not in callbacks:
+            return
+
+        callbacks.remove(callback)
+        if not callbacks:
+            del self.listeners[chan_name]
+            if self.is_connected():
+                self.send_msg(SpecMessage.msg_unregister(chan_name, version = self.server_version))
+
+    def channel_events(self, chan_name, maxlen=None):
+        """Return an async iterator over the values of a channel
+
+        Arguments:
+        chan_name -- channel name, i.e. 'var/toto' (or 'toto')
+        maxlen -- number of values kept for a slow reader (see ChannelEvents)
+        """
+        return ChannelEvents(self, _channel_name(chan_name), maxlen)
+
+    def set_array_buffer(self, chan_name, array):
+        """Receive the events of an array channel in the same array
+        (see SpecConnection.set_array_buffer)"""
+        chan_name = _channel_name(chan_name)
+        if array is None:
+            self.array_buffers.pop(chan_name, None)
+        else:
+            self.array_buffers[chan_name] = array
+
+    def read_channel(self, chan_name, out=None):
+        """Read the value of a channel
+
+        Arguments:
+        chan_name -- channel name, i.e. 'var/toto' (or 'toto')
+        out -- numpy array to receive the value of an array channel in,
+        if it has the right type and shape
+
+        Return value:
+        future resolved with the value
+        """
+        reply, msg = SpecMessage.msg_chan_read(_channel_name(chan_name),
+                                               version = self.server_version)
+        return self.send_msg_with_reply(reply, msg, out)
+
+    def write_channel(self, chan_name, value):
+        """Write the value of a channel. Spec does not reply to it."""
+        if not self.is_connected():
+            raise SpecClientNotConnectedError
+
+        self.send_msg(SpecMessage.msg_chan_send(_channel_name(chan_name), value,
+                                                version = self.server_version))
+
+    #
+    # commands
+    #
+    def run_cmd(self, cmd, *args):
+        """Run a command in Spec
+
+        Arguments:
+        cmd -- command string, i.e. '1+1', or macro or function name
+        args -- arguments of the macro or function, if any
+
+        Return value:
+        future resolved with the value returned by the command
+        """
+        if not args:
+            reply, msg = SpecMessage.msg_cmd_with_return(cmd, version = self.server_version)
+        elif self.server_version is not None and self.server_version >= 3:
+            reply, msg = SpecMessage.msg_func_with_return([cmd] + list(args),
+                                                          version = self.server_version)
+        else:
+            cmd = cmd + ' ' + ' '.join(map(repr, args))
+            reply, msg = SpecMessage.msg_cmd_with_return(cmd, version = self.server_version)
+
+        return self.send_msg_with_reply(reply, msg)
+
+    def run_func(self, cmd, *args):
+        """Call a macro function in Spec (server version 3 or above)
+
+        Return value:
+        future resolved with the value returned by the function
+        """
+        if self.server_version is None or self.server_version < 3:
+            raise SpecClientVersionError("need spec server minimum version 3")
+
+        reply, msg = SpecMessage.msg_func_with_return([cmd] + list(args),
+                                                      version = self.server_version)
+        return self.send_msg_with_reply(reply, msg)
+
+    def abort(self):
+        """Abort the command or move running in Spec"""
+        if self.is_connected():
+            self.send_msg(SpecMessage.msg_abort(version = self.server_version))
+
+    #
+    # motors
+    #
+    def get_position(self, mne):
+        """Return a future resolved with the position of motor mne"""
+        return self.read_channel("motor/%s/position" % mne)
+
+    def move(self, mne, target_position):
+        """Move motor mne to target_position
+
+        Return value:
+        future resolved with the motor position once the move is done.
+        Cancelling it does not stop the motor (see abort).
+        """
+        if not self.is_connected():
+            raise SpecClientNotConnectedError
+
+        target = float(target_position)
+
+        done_chan = "motor/%s/move_done" % mne
+        done = self.loop.create_future()
+        moving = [False]
+
+        def finish():
+            self.remove_listener(done_chan, move_done)
+            if done.done():
+                return
+            position = self.get_position(mne)
+            position.add_done_callback(functools.partial(_chain_future, done))
+
+        def move_done(value, flags):
+            if flags == CONNECTION_LOST:
+                if not done.done():
+                    done.set_exception(SpecClientNotConnectedError("connection lost"))
+                return
+            if value:
+                moving[0] = True
+            elif moving[0]:
+                finish()
+
+        def started(read):
+            # the move_done value once start_one is handled. A move refused
+            # or already done only shows here, with no event
+            if read.cancelled() or done.done():
+                return
+            if read.exception() is not None:
+                self.remove_listener(done_chan, move_done)
+                done.set_exception(read.exception())
+            elif not read.result() and not moving[0]:
+                finish()
+
+        self.add_listener(done_chan, move_done)
+        self.write_channel("motor/%s/start_one" % mne, target)
+        self.read_channel(done_chan).add_done_callback(started)
+
+        return done
+
+    def move_relative(self, mne, inc_position):
+        """Move motor mne by inc_position from its current position
+
+        Return value:
+        future resolved with the motor position once the move is done
+        """
+        done = self.loop.create_future()
+
+        def got_position(position):
+            if done.done():
+                return
+            if position.exception() is not None:
+                done.set_exception(position.exception())
+                return
+            target = float(position.result()) + float(inc_position)
+            self.move(mne, target).add_done_callback(
+                functools.partial(_chain_future, done))
+
+        self.get_position(mne).add_done_callback(got_position)
+        return done
+
+    mv = move
+    mvr = move_relative
+
+
+def _channel_name(chan_name):
+    if len(chan_name.split("/")) == 1:
+        return "var/%s" % chan_name
+    return chan_name
+
+def _chain_future(target, source):
+    """Copy the result of future source to future target"""
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
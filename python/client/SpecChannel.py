@@ -91,11 +91,13 @@ class SpecChannel(object):
         self.value = None
         self._connected = False
 
-    def read(self):
+    def read(self, out=None):
         """Read the channel value
 
         If channel is registered, just return the internal value,
-        else obtain the channel value and return it.
+        else obtain the channel value and return it. The value of
+        an array channel is received in the numpy array out if given
+        and of the right type and shape.
         """
         if self.registered and self.value is not None:
             return self.value
@@ -112,7 +114,7 @@ class SpecChannel(object):
 
             conn.wait_connected()
 
-            reply_id = conn.send_msg_chan_read(self.spec_chan_name)
+            reply_id = conn.send_msg_chan_read(self.spec_chan_name, out)
 
             try:
                 self.value = conn.wait_reply(reply_id)
@@ -22,6 +22,7 @@ except ImportError:  # python 3.12 and beyond
     import pyspec.asyncore_vintage as asyncore
 
 import socket
+import errno
 import string
 import traceback
 import sys
@@ -29,7 +30,7 @@ import time
 import numpy as np
 
 from pyspec.css_logger import log
-from pyspec.utils import is_python3, is_remote_host
+from pyspec.utils import is_remote_host
 from pyspec.utils import is_macos, async_loop
 
 import spec_shm
@@ -184,8 +185,8 @@ class _SpecConnection(asyncore.dispatcher):
 
         self.message = None
 
-        self.received_strings = []
-        self.output_strings = []
+        self.receive_buffer = SpecMessage.ReceiveBuffer()
+        self.send_queue = SpecMessage.SendQueue()
         self.sendq = []
 
         self.server_version = None
@@ -194,6 +195,10 @@ class _SpecConnection(asyncore.dispatcher):
         self.reg_channels = {}
         self.reg_replies = {}
 
+        # arrays receiving the data of array channels (see set_array_buffer)
+        self.array_buffers = {}
+        self.reply_arrays = {}
+
         self.simulation_mode = False
 
         # some shortcuts
@@ -432,13 +437,20 @@ class _SpecConnection(asyncore.dispatcher):
         cmd = SpecCommand(self, cmd, timeout=timeout)
         return cmd()
 
-    def read_channel(self, chan_name):
+    def read_channel(self, chan_name, out=None):
+        """Read the value of a channel
+
+        Arguments:
+        chan_name -- channel name, i.e. 'var/toto' (or 'toto')
+        out -- numpy array to receive the value of an array channel in,
+        if it has the right type and shape
+        """
         p = chan_name.split("/")
         if len(p) == 1:
             chan_name = "var/%s" % chan_name
 
         chan = self.get_channel(chan_name)
-        return chan.read()
+        return chan.read(out)
 
     def write_channel(self, chan_name,value):
         p = chan_name.split("/")
@@ -447,6 +459,26 @@ class _SpecConnection(asyncore.dispatcher):
         chan = self.get_channel(chan_name)
         return chan.write(value)
 
+    def set_array_buffer(self, chan_name, array):
+        """Receive the values of an array channel in the same array
+
+        The events of channel chan_name are received directly in array
+        (a numpy array of the right type and shape), so that a client
+        following images does not allocate one for each of them.
+        The array is overwritten by the next event. With array None,
+        a new array is created for each event again.
+        """
+        if array is None:
+            self.array_buffers.pop(chan_name, None)
+        else:
+            self.array_buffers[chan_name] = array
+
+    def _array_for(self, msg):
+        """Return the array to receive the data of an array message in"""
+        if msg.cmd == SpecMessage.REPLY:
+            return self.reply_arrays.pop(msg.sn, None)
+        return self.array_buffers.get(msg.name)
+
     def need_server(self):
         if self.socket_connected:
             return
@@ -689,27 +721,49 @@ class _SpecConnection(asyncore.dispatcher):
     def handle_read(self):
         """Handle 'read' events on socket
 
-        Messages are built from the read calls on the socket.
+        Messages are built from the read calls on the socket. The bytes
+        are received in a buffer kept between calls and messages are
+        read from it in place. The data of array messages is received
+        directly in its array.
         """
-        _received = self.recv(32768) 
+        if self.message is not None and self.message.arrayView is not None:
+            received = self.recv_message_part(self.message.recvArray)
+            if received and self.message.isComplete():
+                message, self.message = self.message, None
+                self.dispatch_msg(message)
+            return
 
-        self.received_strings.append(_received)
+        nbytes = 32768
+        if self.message is not None and not self.message.readheader:
+            # the rest of a large message is received at once
+            nbytes = max(nbytes, self.message.bytesToRead - len(self.receive_buffer))
 
-        if is_python3():
-            s = b''.join(self.received_strings)
-            sbuffer = memoryview(s)
-        else:
-            s = ''.join(self.received_strings)
-            sbuffer = buffer(s)
+        if not self.recv_message_part(self.receive_buffer.recvFrom, nbytes):
+            return
+
+        sbuffer = self.receive_buffer.view()
 
         consumedBytes = 0
         offset = 0
 
         while offset < len(sbuffer):
             if self.message is None:
+                # the complete messages are read in one go
+                try:
+                    for message, offset in SpecMessage.iterMessages(sbuffer, offset,
+                                                                    self.server_version):
+                        self.dispatch_msg(message)
+                except SpecClientProtocolError:
+                    del sbuffer
+                    self.receive_buffer.consume(offset)
+                    raise
+
+                if offset >= len(sbuffer):
+                    break
+
                 self.message = SpecMessage.message(version = self.server_version)
 
-            consumedBytes = self.message.readFromStream(sbuffer[offset:])
+            consumedBytes = self.message.readFromStream(sbuffer, offset, self._array_for)
 
             if consumedBytes == 0:
                 break
@@ -717,22 +771,47 @@ class _SpecConnection(asyncore.dispatcher):
             offset += consumedBytes
 
             if self.message.isComplete():
+                message, self.message = self.message, None
                 try:
-                    # dispatch incoming message
-                    if self.message.cmd == SpecMessage.REPLY:
-                        self.dispatch_reply_msg(self.message)
-                    elif self.message.cmd == SpecMessage.EVENT:
-                        self.dispatch_event_msg(self.message)
-                    elif self.message.cmd == SpecMessage.HELLO_REPLY:
-                        self.dispatch_hello_reply_msg(self.message)
-                except Exception as e:
-                    self.message = None
-                    self.received_strings = [ s[offset:] ]
-                    raise SpecClientProtocolError(str(e))
-                else:
-                    self.message = None
-                                   
-        self.received_strings = [ s[offset:] ]
+                    self.dispatch_msg(message)
+                except SpecClientProtocolError:
+                    del sbuffer
+                    self.receive_buffer.consume(offset)
+                    raise
+
+        del sbuffer
+        self.receive_buffer.consume(offset)
+
+    def recv_message_part(self, recv_func, *args):
+        """Receive bytes from the socket with recv_func
+
+        Return value:
+        the number of bytes received, 0 if the connection is closed
+        """
+        try:
+            received = recv_func(self.socket, *args)
+        except socket.error as e:
+            if e.args[0] in asyncore._DISCONNECTED:
+                self.handle_close()
+                return 0
+            raise
+
+        if not received:
+            # connection closed by spec
+            self.handle_close()
+        return received
+
+    def dispatch_msg(self, msg):
+        """Dispatch a message received from spec"""
+        try:
+            if msg.cmd == SpecMessage.REPLY:
+                self.dispatch_reply_msg(msg)
+            elif msg.cmd == SpecMessage.EVENT:
+                self.dispatch_event_msg(msg)
+            elif msg.cmd == SpecMessage.HELLO_REPLY:
+                self.dispatch_hello_reply_msg(msg)
+        except Exception as e:
+            raise SpecClientProtocolError(str(e))
 
     def dispatch_event_msg(self, msg):
 
@@ -751,6 +830,9 @@ class _SpecConnection(asyncore.dispatcher):
         if reply_id <= 0:
             return 
 
+        # the array given for the reply, if it was not an array reply
+        self.reply_arrays.pop(reply_id, None)
+
         reply = self.reg_replies.get(reply_id, None)
 
         if reply is None:
@@ -797,15 +879,10 @@ class _SpecConnection(asyncore.dispatcher):
         if not self.readable(): 
             return False
 
-        buf_len = sum(map(len, self.output_strings)) 
-
-        if len(self.sendq) > 0 or buf_len > 0:
+        if len(self.sendq) > 0 or len(self.send_queue) > 0:
             return True
         return False
 
-        #ret = self.readable() and (len(self.sendq) > 0 or sum(map(len, self.output_strings)) > 0)
-        #return ret
-
     def handle_connect(self):
         """Handle 'connect' event on socket
 
@@ -822,16 +899,17 @@ class _SpecConnection(asyncore.dispatcher):
         Send all the messages from the queue.
         """
         while len(self.sendq) > 0:
-            self.output_strings.append(self.sendq.pop().sendingString())
+            self.send_queue.append(self.sendq.pop())
 
-        if is_python3():
-            out_buffer = b''.join(self.output_strings)
-        else:
-            out_buffer = ''.join(self.output_strings)
-
-        sent = self.send(out_buffer)
-
-        self.output_strings = [ out_buffer[sent:] ]
+        try:
+            self.send_queue.sendTo(self.socket)
+        except socket.error as e:
+            if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                return
+            if e.args[0] in asyncore._DISCONNECTED:
+                self.handle_close()
+                return
+            raise
 
 
     def send_msg_cmd_with_return(self, cmd, caller=None):
@@ -922,11 +1000,12 @@ class _SpecConnection(asyncore.dispatcher):
         msg = SpecMessage.msg_func(cmd, version = self.server_version)
         self.__send_msg_no_reply( msg )
 
-    def send_msg_chan_read(self, chan_name):
+    def send_msg_chan_read(self, chan_name, out=None):
         """Send a channel read message, and return the reply id.
 
         Arguments:
         chan_name -- a string representing the channel name, i.e. 'var/toto'
+        out -- numpy array to receive the value in, for array channels
         """
         if not self.is_connected():
             raise SpecClientNotConnectedError
@@ -937,6 +1016,8 @@ class _SpecConnection(asyncore.dispatcher):
             caller = None
 
         reply, msg = SpecMessage.msg_chan_read(chan_name, version = self.server_version)
+        if out is not None:
+            self.reply_arrays[reply.id] = out
         reply_id = self.__send_msg_with_reply(reply, msg, receiver_obj = caller)
         return reply_id
 
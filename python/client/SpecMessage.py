@@ -22,6 +22,15 @@ Message versions:
 import struct
 import time
 import types
+import itertools
+import collections
+
+import numpy
+
+try:
+    from sys import intern
+except ImportError:  # python 2, a builtin
+    pass
 
 from pyspec.utils import is_python3, is_python2
 from pyspec.css_logger import log
@@ -46,6 +55,44 @@ NULL='\000'
 # flags
 DELETED = 0x0001
 
+# header formats, in little endian, for each message version
+HEADER_FORMATS = {
+    2: '<IiiiIIiiIII80s',
+    3: '<IiiiIIiiIIIi80s',
+    4: '<IiIIIIiiIIIii80s',
+}
+
+_header_structs = {}
+
+# channel names read from message headers (see channelName)
+_channel_names = {}
+MAX_CHANNEL_NAMES = 10000
+
+def headerStruct(fmt):
+    """Return the struct.Struct for a header format, compiled only once"""
+    codec = _header_structs.get(fmt)
+    if codec is None:
+        codec = _header_structs[fmt] = struct.Struct(fmt)
+    return codec
+
+def channelName(rawname):
+    """Return the name in the 80 bytes of a message header
+
+    Names are decoded once and interned, as the same few channels come
+    again and again in events.
+    """
+    name = _channel_names.get(rawname)
+    if name is None:
+        if len(_channel_names) >= MAX_CHANNEL_NAMES:
+            _channel_names.clear()
+        if is_python3():
+            name = rawname.decode()
+        else:
+            name = rawname
+        name = intern(name.replace(NULL, '').strip())
+        _channel_names[rawname] = name
+    return name
+
 def message(*args, **kwargs):
     """Return a new SpecMessage object
 
@@ -133,6 +180,46 @@ def dictionarytoraw(dict):
 
     return (len(data) > 0 and data) or NULL
 
+def decodeData(rawstring, datatype, rows=0, cols=0):
+    """Return the data of a message from its raw bytes
+
+    Arguments:
+    rawstring -- raw data bytes
+    datatype -- data type
+    rows, cols -- shape of ARRAY_* data
+    """
+    data = rawstring[:-1] #remove last NULL byte
+
+    if datatype == ERROR:
+        if is_python3():
+            data2 = data.tobytes()
+            data = data2.decode('utf-8')
+        return data
+    elif datatype == STRING or datatype == DOUBLE:
+        # try to convert data to a more appropriate type
+        if is_python3():
+            data2 = data.tobytes()
+            data = data2.decode('utf-8')
+
+        try:
+            data = int(data)
+        except:
+            try:
+                data = float(data)
+            except:
+                pass
+
+        return data
+    elif datatype == ASSOC:
+        return rawtodictonary(rawstring)
+    elif SpecArray.isArrayType(datatype):
+        #Here we read cols and rows... which are *supposed* to be received in the header!!!
+        #better approach: data contains this information (since it is particular to that data type)
+        # copied, as the stream buffer is reused for the next messages
+        return SpecArray.SpecArray(bytes(rawstring), datatype, rows, cols)
+    else:
+        raise TypeError
+
 class SpecMessage:
     """Base class for messages."""
     def __init__(self, packedHeader):
@@ -143,7 +230,7 @@ class SpecMessage:
         use the same syntax as the 'struct' Python module
         """
         self.packedHeaderDataFormat = packedHeader
-        self.headerLength = struct.calcsize(self.packedHeaderDataFormat)
+        self.headerLength = headerStruct(self.packedHeaderDataFormat).size
         self.bytesToRead = self.headerLength
         self.readheader = True
         self.data = ''
@@ -164,29 +251,52 @@ class SpecMessage:
         self.err = 0
         self.flags = 0
 
+        # array receiving the data of ARRAY_* messages (see startArray)
+        self.array = None
+        self.arrayView = None
+        self.arrayFilled = 0
+
     def isComplete(self):
         """Return wether a message read from stream has been fully received or not."""
         return self.bytesToRead == 0
 
-    def readFromStream(self, streamBuf):
+    def readFromStream(self, streamBuf, offset=0, arrays=None):
         """Read buffer from stream and try to create a message from it
 
         Arguments:
         streamBuf - string buffer of the last bytes received from Spec
+        offset - position in streamBuf of the first byte to read
+        arrays - function called with the message once its header is
+        read, returning the array to receive ARRAY_* data in or None
+        (see startArray)
 
         Return value :
         the number of consumed bytes
         """
         consumedBytes = 0
+        available = len(streamBuf) - offset
 
         try:
-            while self.bytesToRead > 0 and len(streamBuf[consumedBytes:]) >= self.bytesToRead:
-                if self.readheader:
+            while self.bytesToRead > 0:
+                if self.arrayView is not None:
+                    # array data is taken as it comes
+                    start = offset + consumedBytes
+                    nbytes = min(available - consumedBytes, self.bytesToRead)
+                    if nbytes == 0:
+                        break
+                    self.fillArray(streamBuf[start:start+nbytes])
+                    consumedBytes += nbytes
+                elif available - consumedBytes < self.bytesToRead:
+                    break
+                elif self.readheader:
                     self.readheader = False
-                    self.type, self.bytesToRead = self.readHeader(streamBuf[:self.headerLength])
+                    self.type, self.bytesToRead = self.readHeader(streamBuf[offset:offset+self.headerLength])
                     consumedBytes = self.headerLength
+                    if SpecArray.isArrayType(self.type):
+                        self.startArray(arrays and arrays(self))
                 else:
-                    rawdata = streamBuf[consumedBytes:consumedBytes+self.bytesToRead]
+                    start = offset + consumedBytes
+                    rawdata = streamBuf[start:start+self.bytesToRead]
                     consumedBytes += self.bytesToRead
                     self.bytesToRead = 0
     
@@ -199,6 +309,67 @@ class SpecMessage:
   
         return consumedBytes
 
+    def startArray(self, out=None):
+        """Prepare to receive the data of an ARRAY_* message directly in a
+        numpy array, allocated once its header is read
+
+        Arguments:
+        out -- array to use instead if it has the right type and shape,
+        so that the same array can receive many messages
+
+        Return value:
+        True if the data is to be received in the array
+        """
+        numtype = SpecArray.SPEC_TO_NUM.get(self.type)
+        if numtype is None:
+            return False
+
+        if self.rows == 1:
+            shape = (self.cols, )
+        else:
+            shape = (self.rows, self.cols)
+
+        if out is not None and (out.dtype != numtype or out.shape != shape or
+                                not out.flags.c_contiguous or not out.flags.writeable):
+            log.log(2, "array for %s does not fit the data received" % self.name)
+            out = None
+
+        if out is None:
+            out = numpy.empty(shape, dtype=numtype)
+
+        if out.nbytes != self.bytesToRead:
+            return False
+
+        self.array = out
+        self.arrayView = memoryview(out.reshape(-1).view(numpy.uint8))
+        self.arrayFilled = 0
+        return True
+
+    def fillArray(self, rawstring):
+        """Copy the next bytes of the data of an ARRAY_* message in its array"""
+        nbytes = len(rawstring)
+        self.arrayView[self.arrayFilled:self.arrayFilled+nbytes] = rawstring
+        self.arrayReceived(nbytes)
+
+    def recvArray(self, sock):
+        """Receive the next bytes of the data of an ARRAY_* message from
+        the socket sock directly in its array
+
+        Return value:
+        the number of bytes received
+        """
+        nbytes = sock.recv_into(self.arrayView[self.arrayFilled:], self.bytesToRead)
+        self.arrayReceived(nbytes)
+        return nbytes
+
+    def arrayReceived(self, nbytes):
+        self.arrayFilled += nbytes
+        self.bytesToRead -= nbytes
+        if self.bytesToRead == 0:
+            self.data = self.array
+            self.array = None
+            self.arrayView = None
+
     def readHeader(self, rawstring):
         """Read the header of the message coming from stream
 
@@ -220,37 +391,7 @@ class SpecMessage:
         Return value:
         the data read
         """
-        data = rawstring[:-1] #remove last NULL byte
-
-        if datatype == ERROR:
-            if is_python3():
-                data2 = data.tobytes()
-                data = data2.decode('utf-8')
-            return data
-        elif datatype == STRING or datatype == DOUBLE:
-            # try to convert data to a more appropriate type
-            if is_python3():
-                data2 = data.tobytes()
-                data = data2.decode('utf-8')
-
-            try:
-                data = int(data)
-            except:
-                try:
-                    data = float(data)
-                except:
-                    pass
-
-            return data
-        elif datatype == ASSOC:
-            return rawtodictonary(rawstring)
-        elif SpecArray.isArrayType(datatype):
-            #Here we read cols and rows... which are *supposed* to be received in the header!!!
-            #better approach: data contains this information (since it is particular to that data type)
-            return SpecArray.SpecArray(rawstring, datatype, self.rows, self.cols)
-        else:
-            raise TypeError
-
+        return decodeData(rawstring, datatype, self.rows, self.cols)
 
     def dataType(self, data):
         """Try to guess data type
@@ -267,6 +408,11 @@ class SpecMessage:
             return STRING
         elif is_python2() and isinstance(data,long):
             return STRING
+        elif isinstance(data, numpy.ndarray):
+            # sent from the array itself
+            self.data = SpecArray.SpecArray(data)
+            self.rows, self.cols = self.data.shape
+            return self.data.type
         elif isinstance(data, SpecArray.SpecArrayData):
             self.rows, self.cols = data.shape
             return data.type
@@ -287,10 +433,42 @@ class SpecMessage:
 
         return rawstring
 
+    def sendingDataParts(self):
+        """Return the buffers holding the data part of the message.
+        Arrays are not copied and, as when received, have no NULL end."""
+        if isinstance(self.data, SpecArray.SpecArrayData):
+            return [self.data.buffer()]
+
+        data = self.sendingDataString(self.data, self.type)
+        if is_python3():
+            data = data.encode('utf-8')
+        return [data]
+
+    def sendingParts(self):
+        """Return the buffers to send over the socket for the message,
+        the header first (see SendQueue)."""
+        if self.type is None:
+            # invalid message
+            return []
+
+        parts = [part for part in self.sendingDataParts() if len(part) > 0]
+        datalen = sum(len(part) for part in parts)
+
+        if is_python3():
+            name = self.name.encode('utf-8')
+        else:
+            name = str(self.name)
+
+        return [self.packHeader(datalen, name)] + parts
+
+    def packHeader(self, datalen, name):
+        """Return the packed header of the message"""
+        return b''
+
     def sendingString(self):
         """Create a string representing the message which can be send
         over the socket."""
-        return ''
+        return b''.join([bytes(part) for part in self.sendingParts()])
 
 class message2(SpecMessage):
     """Version 2 message class"""
@@ -301,7 +479,7 @@ class message2(SpecMessage):
         Otherwise, the 'init' method is called with the specified arguments, for
         creating a message from arguments.
         """
-        SpecMessage.__init__(self, '<IiiiIIiiIII80s')
+        SpecMessage.__init__(self, HEADER_FORMATS[2])
 
         if len(args) > 0:
             self.init(*args, **kwargs)
@@ -324,13 +502,13 @@ class message2(SpecMessage):
         self.magic, self.vers, self.size, self.sn, \
                     self.sec, self.usec, self.cmd, \
                     datatype, self.rows, self.cols, \
-                    datalen, name  = struct.unpack(self.packedHeaderDataFormat, rawstring)
+                    datalen, name  = headerStruct(self.packedHeaderDataFormat).unpack(rawstring)
         if self.magic != MAGIC_NUMBER:
             self.packedHeaderDataFormat=">"+self.packedHeaderDataFormat[1:]
             self.magic, self.vers, self.size, self.sn, \
                     self.sec, self.usec, self.cmd, \
                     datatype, self.rows, self.cols, \
-                    datalen, name  = struct.unpack(self.packedHeaderDataFormat, rawstring)
+                    datalen, name  = headerStruct(self.packedHeaderDataFormat).unpack(rawstring)
 
         self.time = self.sec + float(self.usec) / 1E6
 
@@ -341,28 +519,14 @@ class message2(SpecMessage):
 
         return (datatype, datalen)
 
-    def sendingString(self):
-        if self.type is None:
-            # invalid message
-            return ''
-
-        data = self.sendingDataString(self.data, self.type)
-        datalen = len(data)
-
-        if is_python3():
-            name = self.name.encode('utf-8')
-            data = data.encode('utf-8')
-        else:
-            name = str(self.name)
-
-        header = struct.pack(self.packedHeaderDataFormat, self.magic, self.vers, self.size,
+    def packHeader(self, datalen, name):
+        return headerStruct(self.packedHeaderDataFormat).pack(self.magic, self.vers, self.size,
                              self.sn, self.sec, self.usec, self.cmd, self.type,
                              self.rows, self.cols, datalen, name)
-        return header + data
 
 class message3(SpecMessage):
     def __init__(self, *args, **kwargs):
-        SpecMessage.__init__(self, '<IiiiIIiiIIIi80s')
+        SpecMessage.__init__(self, HEADER_FORMATS[3])
 
         if len(args) > 0:
             self.init(*args, **kwargs)
@@ -385,14 +549,14 @@ class message3(SpecMessage):
         self.magic, self.vers, self.size, self.sn, \
                     self.sec, self.usec, self.cmd, \
                     datatype, self.rows, self.cols, \
-                    datalen, self.err, name  = struct.unpack(self.packedHeaderDataFormat, rawstring)
+                    datalen, self.err, name  = headerStruct(self.packedHeaderDataFormat).unpack(rawstring)
 
         if self.magic != MAGIC_NUMBER:
             self.packedHeaderDataFormat=">"+self.packedHeaderDataFormat[1:]
             self.magic, self.vers, self.size, self.sn, \
                     self.sec, self.usec, self.cmd, \
                     datatype, self.rows, self.cols, \
-                    datalen, self.err, name  = struct.unpack(self.packedHeaderDataFormat, rawstring)
+                    datalen, self.err, name  = headerStruct(self.packedHeaderDataFormat).unpack(rawstring)
 
         self.time = self.sec + float(self.usec) / 1E6
 
@@ -406,28 +570,14 @@ class message3(SpecMessage):
 
         return (datatype, datalen)
 
-    def sendingString(self):
-        if self.type is None:
-            return ''
-
-        data = self.sendingDataString(self.data, self.type)
-        datalen = len(data)
-
-        if is_python3():
-            name = self.name.encode('utf-8')
-            data = data.encode('utf-8')
-        else:
-            name = str(self.name)
-
-        header = struct.pack(self.packedHeaderDataFormat, self.magic, self.vers, self.size,
+    def packHeader(self, datalen, name):
+        return headerStruct(self.packedHeaderDataFormat).pack(self.magic, self.vers, self.size,
                              self.sn, self.sec, self.usec, self.cmd, self.type,
-                             self.rows, self.cols, datalen, self.err, self.name)
-
-        return header + data
+                             self.rows, self.cols, datalen, self.err, name)
 
 class message4(SpecMessage):
     def __init__(self, *args, **kwargs):
-        SpecMessage.__init__(self, '<IiIIIIiiIIIii80s')
+        SpecMessage.__init__(self, HEADER_FORMATS[4])
 
         if len(args) > 0:
             self.init(*args, **kwargs)
@@ -451,78 +601,261 @@ class message4(SpecMessage):
         self.magic, self.vers, self.size, self.sn, \
                     self.sec, self.usec, self.cmd, \
                     datatype, self.rows, self.cols, \
-                    datalen, self.err, self.flags, name  = struct.unpack(self.packedHeaderDataFormat, rawstring)
+                    datalen, self.err, self.flags, name  = headerStruct(self.packedHeaderDataFormat).unpack(rawstring)
         if self.magic != MAGIC_NUMBER:
             self.packedHeaderDataFormat=">"+self.packedHeaderDataFormat[1:]
             self.magic, self.vers, self.size, self.sn, \
                     self.sec, self.usec, self.cmd, \
                     datatype, self.rows, self.cols, \
-                    datalen, self.err, self.flags, name  = struct.unpack(self.packedHeaderDataFormat, rawstring)
+                    datalen, self.err, self.flags, name  = headerStruct(self.packedHeaderDataFormat).unpack(rawstring)
         self.time = self.sec + float(self.usec) / 1E6
         
-        if is_python3():
-            name = name.decode()
-        
-        name = name.replace(NULL, '') #remove padding null bytes
-        self.name = name.strip()
+        self.name = channelName(name)
 
         if self.err > 0:
             datatype = ERROR #change message type to 'ERROR' for further processing
 
         return (datatype, datalen)
 
-    def sendingString(self):
-        if self.type is None:
-            # invalid message
-            return ''
-
-        try:
-            data = self.sendingDataString(self.data, self.type)
-            datalen = len(data)
-
-            if is_python3():
-                name = self.name.encode('utf-8')
-                data = data.encode('utf-8')
-            else:
-                name = str(self.name)
-
-            header = struct.pack(self.packedHeaderDataFormat, self.magic, self.vers, self.size,
+    def packHeader(self, datalen, name):
+        return headerStruct(self.packedHeaderDataFormat).pack(self.magic, self.vers, self.size,
                              self.sn, self.sec, self.usec, self.cmd, self.type,
                              self.rows, self.cols, datalen, self.err, self.flags, name)
-        except:
-            import traceback
-            log.log(2,"specmessage error: %s" % traceback.format_exc())
-
-        return header + data
 
 class anymessage(SpecMessage):
     def __init__(self, *args, **kwargs):
         SpecMessage.__init__(self, '<Ii')
 
-    def readFromStream(self, streamBuf):
-        if len(streamBuf) >= self.bytesToRead:
-            magic, version = struct.unpack(self.packedHeaderDataFormat, streamBuf[:self.headerLength])
+    def readFromStream(self, streamBuf, offset=0, arrays=None):
+        if len(streamBuf) - offset >= self.bytesToRead:
+            magic, version = headerStruct(self.packedHeaderDataFormat).unpack_from(streamBuf, offset)
 
             if magic != MAGIC_NUMBER:
                 self.packedHeaderDataFormat=">"+self.packedHeaderDataFormat[1:]
-                magic, version = struct.unpack(self.packedHeaderDataFormat, streamBuf[:self.headerLength])
+                magic, version = headerStruct(self.packedHeaderDataFormat).unpack_from(streamBuf, offset)
 
             # try to guess which message class suits best
             if version == 2:
                 self.__class__ = message2
                 message2.__init__(self)
-                return self.readFromStream(streamBuf)
+                return self.readFromStream(streamBuf, offset, arrays)
             elif version == 3:
                 self.__class__ = message3
                 message3.__init__(self)
-                return self.readFromStream(streamBuf)
+                return self.readFromStream(streamBuf, offset, arrays)
             elif version >= 4:
                 self.__class__ = message4
                 message4.__init__(self)
-                return self.readFromStream(streamBuf)
+                return self.readFromStream(streamBuf, offset, arrays)
 
         return 0
 
+class MessageRecord(object):
+    """A message read by iterMessages
+
+    It has the attributes of a SpecMessage read from stream, without
+    the state needed to read it in pieces.
+    """
+    __slots__ = ('magic', 'vers', 'size', 'sn', 'sec', 'usec', 'cmd',
+                 'type', 'rows', 'cols', 'err', 'flags', 'name', 'data')
+
+    def __init__(self, fields):
+        (self.magic, self.vers, self.size, self.sn, self.sec, self.usec,
+         self.cmd, self.type, self.rows, self.cols) = fields[:10]
+
+        self.err = 0
+        self.flags = 0
+        if self.vers >= 4:
+            self.err, self.flags = fields[11:13]
+            self.name = channelName(fields[13])
+        else:
+            if self.vers == 3:
+                self.err = fields[11]
+            if is_python3():
+                self.name = fields[-1].replace(NULL_B, b'')
+            else:
+                self.name = fields[-1].replace(NULL, '')
+
+        if self.err > 0:
+            self.type = ERROR
+
+        self.data = None
+
+    @property
+    def time(self):
+        return self.sec + float(self.usec) / 1E6
+
+    def isComplete(self):
+        return True
+
+def iterMessages(streamBuf, offset, version):
+    """Read all the complete messages in a buffer in one pass
+
+    Arguments:
+    streamBuf -- buffer of the bytes received from Spec
+    offset -- position in streamBuf of the first message
+    version -- header version of the messages
+
+    Yield (message, end) for each message, end being the position
+    after it in streamBuf. Stop at the first message that is not
+    complete or holds an array, to be read with a SpecMessage object.
+    """
+    fmt = HEADER_FORMATS.get(version)
+    if fmt is None:
+        return
+
+    codecs = (headerStruct(fmt), headerStruct('>' + fmt[1:]))
+    codec = codecs[0]
+    hlen = codec.size
+    size = len(streamBuf)
+
+    while size - offset >= hlen:
+        fields = codec.unpack_from(streamBuf, offset)
+        if fields[0] != MAGIC_NUMBER:
+            codec = codecs[codec is codecs[0]]
+            fields = codec.unpack_from(streamBuf, offset)
+            if fields[0] != MAGIC_NUMBER:
+                return
+
+        datatype, datalen = fields[7], fields[10]
+        start = offset + hlen
+        if SpecArray.ARRAY_MIN <= datatype <= SpecArray.ARRAY_MAX or size - start < datalen:
+            return
+
+        msg = MessageRecord(fields)
+        msg.data = decodeData(streamBuf[start:start+datalen], msg.type)
+        offset = start + datalen
+
+        yield msg, offset
+
+class SendQueue:
+    """Buffers waiting to be sent to Spec
+
+    Messages are queued as their header and data buffers, arrays not
+    being copied, and sent with a single scatter-gather sendmsg call
+    when the socket has it. A buffer partly sent is kept with the
+    offset of the first byte not sent yet.
+    """
+    # buffers given to one sendmsg call, below the usual IOV_MAX
+    MAX_PARTS = 512
+
+    def __init__(self):
+        self.parts = collections.deque()
+        self.offset = 0
+
+    def __len__(self):
+        return len(self.parts)
+
+    def append(self, msg):
+        self.parts.extend(msg.sendingParts())
+
+    def sendTo(self, sock):
+        """Send as many queued bytes as the socket sock takes
+
+        Return value:
+        the number of bytes sent
+        """
+        if not self.parts:
+            return 0
+
+        first = self.parts[0]
+        if self.offset:
+            if is_python3():
+                first = memoryview(first)[self.offset:]
+            else:
+                first = buffer(first, self.offset)
+
+        if hasattr(sock, 'sendmsg'):
+            parts = [first]
+            parts.extend(itertools.islice(self.parts, 1, self.MAX_PARTS))
+            sent = sock.sendmsg(parts)
+        else:
+            sent = sock.send(first)
+
+        self.consume(sent)
+        return sent
+
+    def consume(self, nbytes):
+        """Drop the first nbytes queued bytes, once sent"""
+        while nbytes > 0:
+            left = len(self.parts[0]) - self.offset
+            if nbytes < left:
+                self.offset += nbytes
+                return
+            nbytes -= left
+            self.parts.popleft()
+            self.offset = 0
+
+class ReceiveBuffer:
+    """Buffer for the bytes received from Spec
+
+    Bytes are received at the end of a bytearray (see recvFrom) and
+    messages are read in place from the start (see view and consume).
+    The unread bytes are only moved when more room is needed, so that
+    a message received in many pieces is copied a bounded number of
+    times whatever its size.
+    """
+    def __init__(self, size=32768):
+        self.size = size
+        self.buf = bytearray(size)
+        self.start = 0  # first unread byte
+        self.end = 0    # end of the received bytes
+
+    def __len__(self):
+        return self.end - self.start
+
+    def reserve(self, nbytes):
+        """Make room for receiving nbytes more bytes"""
+        if self.end + nbytes <= len(self.buf):
+            return
+
+        unread = self.end - self.start
+        if unread + nbytes <= len(self.buf) // 2:
+            # moved to the front, leaving at least half of the buffer free
+            self.buf[:unread] = self.buf[self.start:self.end]
+        else:
+            newbuf = bytearray(max(2 * len(self.buf), unread + nbytes))
+            newbuf[:unread] = self.buf[self.start:self.end]
+            self.buf = newbuf
+
+        self.start = 0
+        self.end = unread
+
+    def recvFrom(self, sock, nbytes=32768):
+        """Receive at most nbytes from the socket sock
+
+        Return value:
+        the number of bytes received
+        """
+        received = sock.recv_into(self.freeView(nbytes), nbytes)
+        self.received(received)
+        return received
+
+    def freeView(self, nbytes):
+        """Return a writable view of the room for at least nbytes more
+        bytes, to receive them in place (see received)"""
+        self.reserve(nbytes)
+        return memoryview(self.buf)[self.end:]
+
+    def received(self, nbytes):
+        """Mark nbytes written in the view given by freeView as received"""
+        self.end += nbytes
+
+    def view(self):
+        """Return the received bytes not consumed yet, without copy"""
+        if is_python3():
+            return memoryview(self.buf)[self.start:self.end]
+        return buffer(self.buf, self.start, self.end - self.start)
+
+    def consume(self, nbytes):
+        """Mark the first nbytes unread bytes as read"""
+        self.start += nbytes
+        if self.start >= self.end:
+            self.start = self.end = 0
+            if len(self.buf) > 4 * self.size:
+                # do not keep the room taken by a large message
+                self.buf = bytearray(self.size)
+
 def commandListToCommandString(cmdlist):
     """Convert a command list to a Spec command string."""
 
@@ -5,6 +5,7 @@
 import re
 import time
 import socket
+import errno
 
 try:
     import asyncore
@@ -37,7 +38,7 @@ class SpecHandler(asyncore.dispatcher):
         self.sendq = []
 
         self.received_strings = []
-        self.output_strings = []
+        self.send_queue = SpecMessage.SendQueue()
         self.client_version = None
         self.client_order = ""
 
@@ -47,7 +48,7 @@ class SpecHandler(asyncore.dispatcher):
     # asyncore interface
     def writable(self):
         try:
-            is_writable = len(self.sendq) > 0 or sum(map(len, self.output_strings)) > 0
+            is_writable = len(self.sendq) > 0 or len(self.send_queue) > 0
         except:
             log_exception()
 
@@ -125,12 +126,13 @@ class SpecHandler(asyncore.dispatcher):
         # send all the messages from the queue
         #
         while len(self.sendq) > 0:
-            self.output_strings.append(self.sendq.pop().sendingString())
+            self.send_queue.append(self.sendq.pop(0))
 
         try:
-            outbuf = b''.join(self.output_strings)
-            sent = self.send(outbuf)
-            self.output_strings = [ outbuf[sent:] ]
+            self.send_queue.sendTo(self.socket)
+        except socket.error as e:
+            if e.args[0] not in (errno.EWOULDBLOCK, errno.EAGAIN, errno.EINTR):
+                log.log(2,"error writing message: %s" % str(e))
         except:
             import traceback
             log.log(2,"error writing message: %s" % traceback.format_exc())
@@ -14,6 +14,7 @@ __all__ = [
     'saferef.py',
     'Spec.py',
     'SpecArray.py',
+    'SpecAsyncConnection.py',
     'SpecChannel.py',
     'SpecClientError.py',
     'SpecCommand.py',
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# ******************************************************************************
+#
+#  %W%  %G% CSS
+#
+#  "pyspec" Release %R%
+#
+#  Copyright (c) 2013,2014,2015,2016,2017,2018,2019,2020,2021
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("pyspec") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+# ******************************************************************************
+
+"""
+
+****************
+benchmark
+****************
+
+Description
+****************
+   Measures the performance of the spec file parser (pyspec.file.spec) on
+   synthetic spec files. A file is generated with a given number of scans,
+   points, columns, MCA channels and density of erroneous lines, and the
+   time taken to open it, parse its data, MCAs and metadata, save its scans
+   and update it after new scans are appended is reported as JSON, with
+   throughput and peak memory, to compare runs between versions.
+
+Usage
+****************
+
+   python benchmark.py [-n scans] [-p points] [-c columns] [-m channels]
+                       [-e errors] [-f format] [-k] [-o output.json]
+
+   results = runBenchmark(scans=200, points=500, columns=10)
+
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import getopt
+import platform
+import tempfile
+
+import numpy
+
+try:
+    import resource
+except ImportError:   # not on windows
+    resource = None
+
+from pyspec.file.spec import FileSpec
+
+# MCA channels written on each line of an @A block
+_MCA_LINE = 16
+
+
+def generateFile(filename, scans=100, points=100, columns=8, channels=0,
+                 errors=0.0, first=1, append=False, seed=0):
+    """
+    Writes a synthetic spec file with `scans` scans numbered from `first`,
+    of `points` points and `columns` data columns. With `channels`, every
+    point has an MCA spectrum of that many channels. `errors` is the
+    fraction of data lines written with a wrong number of columns.
+    Returns the number of bytes written
+    """
+    rand = numpy.random.RandomState(seed + first)
+    motors = ["mot%d" % idx for idx in range(8)]
+    labels = ["Theta"] + ["cnt%d" % idx for idx in range(1, columns)]
+
+    rowfmt = " ".join(["%.6g"] * columns) + "\n"
+    badline = " ".join(["1"] * max(columns - 1, 1)) + "\n"
+
+    with open(filename, "a" if append else "w") as fd:
+        start = fd.tell()
+        if not append or start == 0:
+            fd.write("#F %s\n#E %d\n#D %s\n" %
+                     (filename, int(time.time()), time.ctime()))
+            fd.write("#O0 %s\n\n" % "  ".join(motors))
+
+        for number in range(first, first + scans):
+            fd.write("#S %d  ascan  Theta 0 10 %d 1\n" % (number, points))
+            fd.write("#D %s\n#T 1  (Seconds)\n" % time.ctime())
+            fd.write("#P0 %s\n" % " ".join("%.4f" % pos for pos in
+                                            rand.uniform(-90, 90, 8)))
+            if channels:
+                fd.write("#@MCA %dC\n#@CHANN %d 0 %d 1\n" %
+                         (_MCA_LINE, channels, channels - 1))
+            fd.write("#N %d\n#L %s\n" % (columns, "  ".join(labels)))
+
+            data = rand.uniform(0, 1000, (points, columns))
+            data[:, 0] = numpy.linspace(0, 10, points)
+            bad = rand.uniform(0, 1, points) < errors
+
+            for row in range(points):
+                if channels:
+                    spectrum = rand.randint(0, 1000, channels)
+                    lines = [" ".join(map(str, spectrum[idx:idx + _MCA_LINE]))
+                             for idx in range(0, channels, _MCA_LINE)]
+                    fd.write("@A %s\n" % " \\\n".join(lines))
+                fd.write(badline if bad[row] else rowfmt % tuple(data[row]))
+            fd.write("\n")
+
+        return fd.tell() - start
+
+
+def peakMemory():
+    """
+    Returns the peak resident memory of the process in bytes, or None
+    when it cannot be known
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+def _result(elapsed, nbytes=None, points=None):
+    result = {"seconds": elapsed, "peak_rss": peakMemory()}
+    if nbytes is not None:
+        result["mb_per_sec"] = nbytes / 1e6 / elapsed if elapsed else None
+    if points is not None:
+        result["points_per_sec"] = points / elapsed if elapsed else None
+    return result
+
+
+def _resetScans(filespec):
+    for scan in filespec:
+        scan.resetParsedData()
+
+
+def runBenchmark(scans=100, points=100, columns=8, channels=0, errors=0.0,
+                 format="spec", workdir=None, keep=False):
+    """
+    Generates a spec file and times the parser on it. Returns a
+    dictionary with the parameters and, for each operation, the time
+    taken, throughput and peak memory of the process at its end
+    """
+    tmpdir = tempfile.mkdtemp(prefix="specbench", dir=workdir)
+    filename = os.path.join(tmpdir, "bench.dat")
+
+    results = {
+        "params": {"scans": scans, "points": points, "columns": columns,
+                   "channels": channels, "errors": errors,
+                   "format": format},
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+    }
+
+    try:
+        t0 = time.time()
+        size = generateFile(filename, scans, points, columns, channels, errors)
+        results["generate"] = _result(time.time() - t0, size)
+        results["file_size"] = size
+
+        nbpoints = scans * points
+        times = {}
+
+        t0 = time.time()
+        filespec = FileSpec(filename)
+        times["open"] = _result(time.time() - t0, size)
+
+        t0 = time.time()
+        for scan in filespec:
+            scan.getData()
+        times["getData"] = _result(time.time() - t0, size, nbpoints)
+        _resetScans(filespec)
+
+        t0 = time.time()
+        for scan in filespec:
+            scan.getMcas()
+        times["getMcas"] = _result(time.time() - t0, size, nbpoints)
+        _resetScans(filespec)
+
+        t0 = time.time()
+        for scan in filespec:
+            scan.getMeta()
+        times["getMeta"] = _result(time.time() - t0, size)
+
+        savedir = os.path.join(tmpdir, "save")
+        os.mkdir(savedir)
+        saved = 0
+        t0 = time.time()
+        for scan in filespec:
+            outfile = os.path.join(savedir, "scan%d.%s" %
+                                   (scan.getNumber(), format))
+            scan.save(outfile, format=format)
+            saved += os.path.getsize(outfile)
+        times["save"] = _result(time.time() - t0, saved, nbpoints)
+
+        added = max(scans // 10, 1)
+        nbytes = generateFile(filename, added, points, columns, channels,
+                              errors, first=scans + 1, append=True)
+        t0 = time.time()
+        filespec.update()
+        times["update"] = _result(time.time() - t0, nbytes)
+
+        results["times"] = times
+        results["peak_rss"] = peakMemory()
+    finally:
+        if keep:
+            results["file"] = filename
+        else:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return results
+
+
+def printUsage():
+    print("Usage: benchmark.py [-n scans] [-p points] [-c columns] "
+          "[-m channels] [-e errors] [-f format] [-d dir] [-k] [-o output]")
+
+
+def main():
+    params = {}
+    outfile = None
+
+    try:
+        optlist, args = getopt.getopt(sys.argv[1:], "n:p:c:m:e:f:d:o:kh")
+    except getopt.GetoptError:
+        printUsage()
+        return 1
+
+    try:
+        for o, a in optlist:
+            if o == "-h":
+                printUsage()
+                return 0
+            elif o == "-n":
+                params["scans"] = int(a)
+            elif o == "-p":
+                params["points"] = int(a)
+            elif o == "-c":
+                params["columns"] = int(a)
+            elif o == "-m":
+                params["channels"] = int(a)
+            elif o == "-e":
+                params["errors"] = float(a)
+            elif o == "-f":
+                params["format"] = a
+            elif o == "-d":
+                params["workdir"] = a
+            elif o == "-k":
+                params["keep"] = True
+            elif o == "-o":
+                outfile = a
+    except ValueError as e:
+        print("Wrong value: %s" % e)
+        printUsage()
+        return 1
+
+    results = json.dumps(runBenchmark(**params), indent=2, sort_keys=True)
+    if outfile is None:
+        print(results)
+    else:
+        with open(outfile, "w") as fd:
+            fd.write(results + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+# ******************************************************************************
+#
+#  %W%  %G% CSS
+#
+#  "pyspec" Release %R%
+#
+#  Copyright (c) 2013,2014,2015,2016,2017,2018,2019,2020,2021
+#  by Certified Scientific Software.
+#  All rights reserved.
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software ("pyspec") and associated documentation files (the
+#  "Software"), to deal in the Software without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of the Software, and to
+#  permit persons to whom the Software is furnished to do so, subject to
+#  the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  Neither the name of the copyright holder nor the names of its contributors
+#  may be used to endorse or promote products derived from this software
+#  without specific prior written permission.
+#
+#     * The software is provided "as is", without warranty of any   *
+#     * kind, express or implied, including but not limited to the  *
+#     * warranties of merchantability, fitness for a particular     *
+#     * purpose and noninfringement.  In no event shall the authors *
+#     * or copyright holders be liable for any claim, damages or    *
+#     * other liability, whether in an action of contract, tort     *
+#     * or otherwise, arising from, out of or in connection with    *
+#     * the software or the use of other dealings in the software.  *
+#
+# ******************************************************************************
+
+"""
+
+****************
+catalog
+****************
+
+Description
+****************
+   This module keeps a catalog of the scans found in many spec data
+   files. The metadata of every scan (command, date, user, column labels,
+   motors...) is stored in a local SQLite database, so that scans can be
+   searched without opening the data files again.
+
+   Directories are crawled incrementally: files whose size and modification
+   time did not change since the last crawl are not read.
+
+Usage
+****************
+
+   catalog = ScanCatalog("scans.db")
+   catalog.crawl(["/data/exp1", "/data/exp2"])
+
+   for entry in catalog.find(command="ascan th", counter="det",
+                             after="2021-03-01", before="2021-04-01"):
+       scan = catalog.getScan(entry)
+
+"""
+
+import os
+import time
+import sqlite3
+
+from pyspec.css_logger import log
+from pyspec.file.spec import FileSpec, FileSpecFormatUnknown, _COMPRESSED
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    nbscans INTEGER
+);
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    idx INTEGER,
+    number INTEGER,
+    ord INTEGER,
+    command TEXT,
+    date TEXT,
+    epoch REAL,
+    user TEXT,
+    spec TEXT,
+    count_time REAL,
+    labels TEXT
+);
+CREATE TABLE IF NOT EXISTS columns (
+    scan_id INTEGER NOT NULL REFERENCES scans(id) ON DELETE CASCADE,
+    position INTEGER,
+    label TEXT,
+    mnemonic TEXT
+);
+CREATE TABLE IF NOT EXISTS motors (
+    scan_id INTEGER NOT NULL REFERENCES scans(id) ON DELETE CASCADE,
+    name TEXT,
+    mnemonic TEXT,
+    position REAL
+);
+CREATE INDEX IF NOT EXISTS scans_file ON scans(file_id);
+CREATE INDEX IF NOT EXISTS scans_command ON scans(command);
+CREATE INDEX IF NOT EXISTS scans_epoch ON scans(epoch);
+CREATE INDEX IF NOT EXISTS columns_label ON columns(label);
+CREATE INDEX IF NOT EXISTS columns_mnemonic ON columns(mnemonic);
+CREATE INDEX IF NOT EXISTS columns_scan ON columns(scan_id);
+CREATE INDEX IF NOT EXISTS motors_name ON motors(name);
+CREATE INDEX IF NOT EXISTS motors_mnemonic ON motors(mnemonic);
+CREATE INDEX IF NOT EXISTS motors_scan ON motors(scan_id);
+"""
+
+# the date in #D lines and the dates accepted in queries
+_SPEC_DATE = "%a %b %d %H:%M:%S %Y"
+_QUERY_DATES = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%Y-%m",
+                _SPEC_DATE)
+
+# separator of labels in the scans table, as in #L lines
+_LABEL_SEP = "  "
+
+
+class ScanCatalog(object):
+    """
+    Catalog of the scans in a set of spec files, saved in the SQLite
+    database `dbfile`
+    """
+
+    def __init__(self, dbfile):
+        self._dbfile = dbfile
+        self._db = sqlite3.connect(dbfile)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(_SCHEMA)
+        self._filespecs = {}
+
+    def close(self):
+        self._db.close()
+        self._filespecs = {}
+
+    def crawl(self, paths, recursive=True):
+        """
+        Adds to the catalog the spec files in `paths` (files or
+        directories). Files not modified since the last crawl are skipped
+        and files that disappeared from the directories are removed.
+        Returns the number of files (re)indexed
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+
+        nbindexed = 0
+
+        for path in paths:
+            path = os.path.abspath(path)
+
+            if os.path.isfile(path):
+                if self.updateFile(path):
+                    nbindexed += 1
+                continue
+
+            seen = set()
+            for dirpath, dirnames, filenames in os.walk(path):
+                if not recursive:
+                    dirnames[:] = []
+                for filename in filenames:
+                    filepath = os.path.join(dirpath, filename)
+                    seen.add(filepath)
+                    if self.updateFile(filepath):
+                        nbindexed += 1
+
+            # forget files that are gone
+            for filepath in self.getFiles(path):
+                if filepath not in seen and (
+                        recursive or os.path.dirname(filepath) == path):
+                    self.removeFile(filepath)
+
+        return nbindexed
+
+    def updateFile(self, filename):
+        """
+        Indexes the scans in `filename` unless the file has the same size
+        and modification time as when it was last indexed.
+        Returns True if the file was indexed
+        """
+        filename = os.path.abspath(filename)
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            self.removeFile(filename)
+            return False
+
+        row = self._db.execute("SELECT size, mtime FROM files WHERE path = ?",
+                               (filename,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return False
+
+        # a file that cannot be read is recorded without scans, so that
+        # it is not tried again until it changes
+        records = []
+        if _isSpecFile(filename):
+            try:
+                filespec = FileSpec(filename)
+                records = [_scanRecord(scan) for scan in filespec]
+            except FileSpecFormatUnknown:
+                pass
+            except Exception as e:
+                log.log(2, "cannot index file %s: %s: %s" %
+                        (filename, e.__class__.__name__, e))
+                records = []
+
+        with self._db:
+            self._db.execute("DELETE FROM files WHERE path = ?", (filename,))
+            cursor = self._db.execute(
+                "INSERT INTO files (path, size, mtime, nbscans) "
+                "VALUES (?, ?, ?, ?)",
+                (filename, stat.st_size, stat.st_mtime, len(records)))
+            file_id = cursor.lastrowid
+
+            for scaninfo, columns, motors in records:
+                cursor = self._db.execute(
+                    "INSERT INTO scans (file_id, idx, number, ord, command, "
+                    "date, epoch, user, spec, count_time, labels) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (file_id,) + scaninfo)
+                scan_id = cursor.lastrowid
+                self._db.executemany(
+                    "INSERT INTO columns VALUES (?, ?, ?, ?)",
+                    [(scan_id,) + column for column in columns])
+                self._db.executemany(
+                    "INSERT INTO motors VALUES (?, ?, ?, ?)",
+                    [(scan_id,) + motor for motor in motors])
+
+        self._filespecs.pop(filename, None)
+        return True
+
+    def removeFile(self, filename):
+        """
+        Removes `filename` and its scans from the catalog
+        """
+        filename = os.path.abspath(filename)
+        with self._db:
+            self._db.execute("DELETE FROM files WHERE path = ?", (filename,))
+        self._filespecs.pop(filename, None)
+
+    def getFiles(self, directory=None):
+        """
+        Returns the files in the catalog, only those under `directory`
+        if given
+        """
+        if directory is None:
+            rows = self._db.execute("SELECT path FROM files ORDER BY path")
+        else:
+            prefix = os.path.join(os.path.abspath(directory), "")
+            rows = self._db.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ? "
+                "ORDER BY path", (len(prefix), prefix))
+        return [row[0] for row in rows]
+
+    def getNumberScans(self):
+        return self._db.execute("SELECT count(*) FROM scans").fetchone()[0]
+
+    def find(self, command=None, counter=None, motor=None, user=None,
+             after=None, before=None, filename=None):
+        """
+        Returns the scans matching all the given conditions, as a list
+        of dictionaries with the scan metadata. Conditions are:
+
+          command:  the command starts with these words (ex: "ascan th")
+          counter:  a column has this label or counter mnemonic
+          motor:    a motor with this name or mnemonic is in the scan
+          user:     the scan was taken by this user
+          after, before:  the date of the scan is in this range. Dates are
+                    epoch values or strings as "2021-03-01 12:00"
+          filename: the path of the file matches this glob pattern
+        """
+        where = []
+        args = []
+
+        if command is not None:
+            command = " ".join(command.split())
+            where.append("(scans.command = ? OR "
+                         "substr(scans.command, 1, ?) = ?)")
+            args.extend([command, len(command) + 1, command + " "])
+        if counter is not None:
+            where.append("scans.id IN (SELECT scan_id FROM columns "
+                         "WHERE label = ? OR mnemonic = ?)")
+            args.extend([counter, counter])
+        if motor is not None:
+            where.append("scans.id IN (SELECT scan_id FROM motors "
+                         "WHERE name = ? OR mnemonic = ?)")
+            args.extend([motor, motor])
+        if user is not None:
+            where.append("scans.user = ?")
+            args.append(user)
+        if after is not None:
+            where.append("scans.epoch >= ?")
+            args.append(_toEpoch(after))
+        if before is not None:
+            where.append("scans.epoch < ?")
+            args.append(_toEpoch(before))
+        if filename is not None:
+            where.append("files.path GLOB ?")
+            args.append(filename)
+
+        sql = ("SELECT files.path, scans.idx, scans.number, scans.ord, "
+               "scans.command, scans.date, scans.epoch, scans.user, "
+               "scans.spec, scans.count_time, scans.labels "
+               "FROM scans JOIN files ON files.id = scans.file_id")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY files.path, scans.idx"
+
+        result = []
+        for row in self._db.execute(sql, args):
+            entry = dict(zip(("filename", "index", "number", "order",
+                              "command", "date", "epoch", "user", "spec",
+                              "count_time"), row[:10]))
+            entry["labels"] = row[10].split(_LABEL_SEP) if row[10] else []
+            result.append(entry)
+        return result
+
+    def getMotorPositions(self, entry):
+        """
+        Returns a list of (motor name, position) at the start of the scan
+        for a scan returned by find()
+        """
+        rows = self._db.execute(
+            "SELECT motors.name, motors.position FROM motors "
+            "JOIN scans ON scans.id = motors.scan_id "
+            "JOIN files ON files.id = scans.file_id "
+            "WHERE files.path = ? AND scans.idx = ? ORDER BY motors.rowid",
+            (entry["filename"], entry["index"]))
+        return rows.fetchall()
+
+    def getScan(self, entry):
+        """
+        Returns the Scan object for a scan returned by find()
+        """
+        filename = entry["filename"]
+        filespec = self._filespecs.get(filename)
+        if filespec is None:
+            filespec = FileSpec(filename)
+            self._filespecs[filename] = filespec
+        else:
+            filespec.update()
+        return filespec.getScanByNumber(entry["number"], entry["order"])
+
+    update_file = updateFile
+    remove_file = removeFile
+    get_files = getFiles
+    get_scan = getScan
+
+
+def _isSpecFile(filename):
+    """
+    Tells spec files from others in the crawled directories by their
+    first character, or by the magic number of the compressed files
+    that FileSpec reads
+    """
+    try:
+        with open(filename, "rb") as fd:
+            head = fd.read(8)
+    except (IOError, OSError):
+        return False
+    return head[:1] == b"#" or \
+        any(head.startswith(magic) for magic, _, _ in _COMPRESSED)
+
+
+def _scanRecord(scan):
+    """
+    Returns the metadata of a scan as rows for the catalog tables
+    """
+    labels = scan.getLabels() or []
+
+    # counter mnemonics, from the #J/#j lines of the file header
+    mnemonics = {}
+    names = scan.getCounterNames() or []
+    mnes = scan.getCounterMnemonics() or []
+    for name, mne in zip(names, mnes):
+        mnemonics[name] = mne
+
+    columns = [(pos, label, mnemonics.get(label, label))
+               for pos, label in enumerate(labels)]
+
+    motors = []
+    positions = scan.getMotorPositions() or []
+    motmnes = scan.getMotorMnemonics() or []
+    for idx, (name, position) in enumerate(positions):
+        mne = motmnes[idx] if idx < len(motmnes) else None
+        try:
+            position = float(position)
+        except ValueError:
+            position = None
+        motors.append((name, mne, position))
+
+    date = scan.getDate()
+    try:
+        epoch = time.mktime(time.strptime(date, _SPEC_DATE))
+    except (TypeError, ValueError):
+        epoch = None
+
+    count_time = scan.getCountTime()
+    try:
+        count_time = float(count_time[0])
+    except (TypeError, ValueError, IndexError):
+        count_time = None
+
+    scaninfo = (scan.getScanIndex(), scan.getNumber(), scan.getOrder(),
+                scan.getCommand(), date, epoch, scan.getUser(),
+                scan.getSpec(), count_time, _LABEL_SEP.join(labels))
+
+    return scaninfo, columns, motors
+
+
+def _toEpoch(value):
+    """
+    Returns the epoch for a date given as a number or as a string
+    """
+    if isinstance(value, (int, float)):
+        return value
+
+    for datefmt in _QUERY_DATES:
+        try:
+            return time.mktime(time.strptime(value.strip(), datefmt))
+        except ValueError:
+            pass
+
+    raise ValueError("cannot understand date %s" % value)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 3:
+        print("usage: catalog.py dbfile directory [directory ...]")
+        sys.exit(1)
+
+    t0 = time.time()
+    catalog = ScanCatalog(sys.argv[1])
+    nbfiles = catalog.crawl(sys.argv[2:])
+    print("%d files indexed in %3.2f secs. %d scans in catalog" %
+          (nbfiles, time.time() - t0, catalog.getNumberScans()))
+    catalog.close()
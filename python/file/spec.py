@@ -64,24 +64,523 @@ import numpy
 import os
 import time
 import string
+import mmap
+import multiprocessing
+import collections
+import select
+import zlib
+import bz2
+import bisect
+import json
+import array
+import ctypes
+import ctypes.util
+
+from pyspec.css_logger import log
+
+try:
+    import lzma
+except ImportError:
+    try:
+        import backports.lzma as lzma
+    except ImportError:
+        lzma = None
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
 
 
 class FileSpecFormatUnknown(BaseException):
     pass
 
 
+# lines checked when indexing. Only #S, #F and #E followed by a space open
+# a new block. #N and #L are kept with the scan for the index
+_reblock = re.compile(br'^#([SFENL]) ([^\n]*)', re.M)
+
+_LINECOUNT_CHUNK = 1 << 20
+
+# bytes read at a time when indexing without a memory map
+_INDEX_CHUNK = 1 << 25
+
+# gzip files: uncompressed bytes between saved decompressor states, and
+# bytes given to and taken from the decompressor at a time
+_SEEKPOINT_BYTES = 16 << 20
+_INFLATE_INPUT = 1 << 16
+_INFLATE_OUTPUT = 1 << 20
+
+_INDEX_VERSION = 2
+
+# bytes checked at the start of each block and before the end of the
+# indexed data to detect files rewritten or truncated (see FileSpec.update)
+_CHECK_BYTES = 256
+
+# runs of consecutive lines starting with a number. Shorter runs of data
+# lines are parsed line by line
+_BULK_MIN_LINES = 8
+_redatarun = re.compile(r'^(?:[ \t]*[-+.0-9][^\n]*\n){%d,}' % _BULK_MIN_LINES,
+                        re.M)
+
+_LINE, _DATARUN, _MCALINES = range(3)
+
+# lines parsed by FileBlock.parseHeader(): those starting with a letter or @,
+# after an optional #, as they are told from data lines in FileBlock.parse().
+# these expressions look for line ends rather than for ^, which is slower
+_reheaderline = re.compile(br'\n(#?[A-Za-z@][^\n]*)')
+
+# first characters of header lines, after an optional #
+_METACHARS = string.ascii_letters + '@'
+
+# characters in lines of plain numbers
+_NUMCHARS = b'0123456789+-.eE \t\n'
+
+# attributes set when parsing a block (besides data and mcas)
+_PARSED_ATTRS = ('_count_time', '_epoch', '_date', '_columns',
+                 '_labels', '_motor_labels', '_motor_mnes', '_counter_labels',
+                 '_counter_mnes', '_motor_positions', '_comment_lines',
+                 '_user_lines', '_geo_pars', '_qvalue', '_extra_lines',
+                 '_error_lines', '_error_codes', '_error_messages',
+                 '_contains_error', '_find_oned', 'reading_mca', 'firstline')
+
+# batches of scans given to each worker process in FileSpec.parseAll()
+_BATCHES_PER_WORKER = 4
+
+# bytes read at a time when streaming the points of a scan
+_STREAM_BYTES = 1 << 20
+
+# rows formatted at a time by Scan.save()
+_SAVE_ROWS = 4096
+
+# errors in lines, kept as codes and only turned into text when asked for
+_ERR_DATALINE = 0
+_ERR_COLUMNS = 1
+_ERR_MCA = 2
+_ERR_LINE = 3
+_ERR_HEADERLINE = 4
+_ERROR_TEXTS = ("wrong data line", "wrong number of columns",
+                "wrong mca data", "unknown line (%s) ",
+                "unknown header line (%s) ")
+
+# erroneous lines reported by getMeta()
+_MAX_ERRORS = 1000
+
+
+class _FileSource(object):
+    """
+    Gives access to the bytes of a spec file, through a memory map of the
+    file if `use_mmap` is set or with seek/read otherwise
+    """
+
+    compressed = False
+
+    def __init__(self, filename, use_mmap=True):
+        self.filename = filename
+        self.use_mmap = use_mmap
+        self.map = None
+        self._linecount = (0, 0)
+
+    def open(self):
+        """
+        (Re)opens the file and, in mmap mode, maps its current content.
+        Returns the stat of the file
+        """
+        self.close()
+
+        with open(self.filename, "rb") as fd:
+            filestat = os.fstat(fd.fileno())
+            if self.use_mmap and filestat.st_size > 0:
+                self.map = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return filestat
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self._linecount = (0, 0)
+
+    def readBytes(self, start, length):
+        """
+        Returns `length` bytes of the file starting at offset `start`
+        """
+        if self.map is not None:
+            return self.map[start:start + length]
+
+        with open(self.filename, "rb") as fd:
+            fd.seek(start)
+            return fd.read(length)
+
+    def readChunks(self, start, chunksize=_INDEX_CHUNK):
+        """
+        Yields (offset, bytes) pieces of the file from `start` to its end.
+        All pieces but the last end with a complete line
+        """
+        pos = start
+        rest = b''
+        while True:
+            data = self.readBytes(pos, chunksize)
+            pos += len(data)
+            if not data:
+                if rest:
+                    yield pos - len(rest), rest
+                return
+
+            buf = rest + data
+            cut = buf.rfind(b'\n') + 1
+            if cut:
+                yield pos - len(buf), buf[:cut]
+            rest = buf[cut:]
+
+    def lineNumber(self, offset):
+        """
+        Returns the number of lines in the file before byte `offset`
+        """
+        pos, nblines = self._linecount
+        if offset < pos:
+            pos, nblines = 0, 0
+
+        while pos < offset:
+            chunk = self.readBytes(pos, min(_LINECOUNT_CHUNK, offset - pos))
+            if not chunk:
+                break
+            nblines += chunk.count(b'\n')
+            pos += len(chunk)
+
+        self._linecount = (pos, nblines)
+        return nblines
+
+
+class _CompressedSource(_FileSource):
+    """
+    Gives access to the uncompressed bytes of a compressed spec file.
+    Offsets are given in the uncompressed data. Reading goes on from
+    the last read, reading backwards decompresses the file again
+    """
+
+    compressed = True
+
+    def __init__(self, filename, use_mmap=True, opener=None):
+        _FileSource.__init__(self, filename, False)
+        self._opener = opener
+        self._fd = None
+
+        # data offset after the last read, the bytes read before it and
+        # the number of lines up to it
+        self._cursor = None
+
+    def open(self):
+        self.close()
+        return os.stat(self.filename)
+
+    def close(self):
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+        self._cursor = None
+        self._linecount = (0, 0)
+
+    def readBytes(self, start, length):
+        end = start + length
+
+        cursor = self._cursor
+        if cursor is not None and cursor[0] - len(cursor[1]) <= start and \
+                self._resumes(start):
+            datapos, data, nblines = cursor
+        else:
+            datapos, nblines = self._restart(start)
+            data = b''
+
+        # the data read is kept with the cursor, to count lines in it
+        pieces = []
+        while True:
+            if datapos > start and data:
+                first = datapos - len(data)
+                pieces.append(data[max(start - first, 0):])
+            if datapos >= end:
+                break
+
+            data = self._decompress()
+            if not data:
+                break
+            datapos += len(data)
+            nblines += data.count(b'\n')
+            self._addSeekPoint(datapos, nblines)
+
+        data = b''.join(pieces)
+        self._cursor = (datapos, data, nblines)
+
+        first = datapos - len(data)
+        return data[start - first:end - first]
+
+    def lineNumber(self, offset):
+        # lines are counted as the data is decompressed
+        if self._cursor is not None:
+            datapos, data, nblines = self._cursor
+            first = datapos - len(data)
+            if first <= offset <= datapos:
+                return nblines - data.count(b'\n', offset - first)
+        return _FileSource.lineNumber(self, offset)
+
+    def _resumes(self, start):
+        return True
+
+    def _restart(self, start):
+        """
+        Starts decompressing again to read from `start`. Returns the data
+        offset and the number of lines where decompression starts
+        """
+        if self._fd is not None:
+            self._fd.close()
+        self._fd = self._opener(self.filename)
+        return 0, 0
+
+    def _decompress(self):
+        return self._fd.read(_INFLATE_OUTPUT)
+
+    def _addSeekPoint(self, datapos, nblines):
+        pass
+
+
+class _GzipSource(_CompressedSource):
+    """
+    Gives access to the uncompressed bytes of a gzip file. The state of
+    the decompressor is saved every `_SEEKPOINT_BYTES` of data, so a
+    block is read by decompressing only from the seek point before it
+    """
+
+    def __init__(self, filename, use_mmap=True, opener=None):
+        _CompressedSource.__init__(self, filename)
+        self._stat = None
+
+        # (data offset, file offset, decompressor, lines before) of the
+        # seek points
+        self._points = []
+        self._offsets = []
+
+        # file offset and decompressor of the data being read
+        self._filepos = 0
+        self._decomp = None
+
+    def open(self):
+        self.close()
+        filestat = os.stat(self.filename)
+
+        stat = (filestat.st_ino, filestat.st_size, filestat.st_mtime)
+        if stat != self._stat:
+            # the seek points are only valid for the same file
+            self._stat = stat
+            self._points = [(0, 0, zlib.decompressobj(16 + zlib.MAX_WBITS),
+                             0)]
+            self._offsets = [0]
+
+        return filestat
+
+    def lineNumber(self, offset):
+        # count from the seek point before offset if it is closer
+        pos, nblines = self._linecount
+        idx = bisect.bisect_right(self._offsets, offset) - 1
+        if offset < pos or self._offsets[idx] > pos:
+            self._linecount = (self._offsets[idx], self._points[idx][3])
+        return _CompressedSource.lineNumber(self, offset)
+
+    def _resumes(self, start):
+        # go on from the last read unless a seek point is closer
+        idx = bisect.bisect_right(self._offsets, start) - 1
+        return self._cursor[0] >= self._offsets[idx]
+
+    def _restart(self, start):
+        if self._fd is None:
+            self._fd = open(self.filename, "rb")
+
+        idx = bisect.bisect_right(self._offsets, start) - 1
+        datapos, self._filepos, decomp, nblines = self._points[idx]
+        self._decomp = decomp.copy()
+        return datapos, nblines
+
+    def _decompress(self):
+        """
+        Returns the next decompressed bytes. Files with several gzip
+        members, as left by appending to a gzip file, are read as one
+        """
+        decomp = self._decomp
+        while True:
+            if decomp.unused_data:
+                # end of a member
+                data = decomp.unused_data
+                decomp = self._decomp = zlib.decompressobj(16 +
+                                                           zlib.MAX_WBITS)
+            else:
+                data = decomp.unconsumed_tail
+
+            if not data:
+                self._fd.seek(self._filepos)
+                data = self._fd.read(_INFLATE_INPUT)
+                self._filepos += len(data)
+                if not data:
+                    return decomp.flush()
+
+            data = decomp.decompress(data, _INFLATE_OUTPUT)
+            if data:
+                return data
+
+    def _addSeekPoint(self, datapos, nblines):
+        if datapos >= self._offsets[-1] + _SEEKPOINT_BYTES:
+            self._points.append((datapos, self._filepos, self._decomp.copy(),
+                                 nblines))
+            self._offsets.append(datapos)
+
+
+# first bytes of compressed files, and how to read them
+_COMPRESSED = [(b'\x1f\x8b', _GzipSource, None),
+               (b'BZh', _CompressedSource, bz2.BZ2File)]
+if lzma is not None:
+    _COMPRESSED.append((b'\xfd7zXZ\x00', _CompressedSource, lzma.LZMAFile))
+
+
+def _openSource(filename, use_mmap=True):
+    """
+    Returns the source giving the bytes of a spec file, plain or
+    compressed with gzip, bzip2 or xz
+    """
+    with open(filename, "rb") as fd:
+        magic = fd.read(6)
+
+    for prefix, source, opener in _COMPRESSED:
+        if magic.startswith(prefix):
+            return source(filename, use_mmap, opener)
+    return _FileSource(filename, use_mmap)
+
+
+class _FileWatcher(object):
+    """
+    Waits for a file to be written. Uses inotify on Linux, and just
+    sleeps where inotify is not available
+    """
+
+    # inotify events: modify, attrib, close_write, delete_self, move_self
+    _EVENTS = 0x002 | 0x004 | 0x008 | 0x400 | 0x800
+
+    def __init__(self, filename):
+        self._fd = None
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK)
+        except (OSError, AttributeError):
+            return
+
+        if fd < 0:
+            return
+
+        if libc.inotify_add_watch(fd, filename.encode(), self._EVENTS) < 0:
+            os.close(fd)
+            return
+
+        self._fd = fd
+
+    def wait(self, timeout):
+        """
+        Returns when the file is written or after `timeout` seconds
+        """
+        if self._fd is None:
+            time.sleep(timeout)
+            return
+
+        if select.select([self._fd], [], [], timeout)[0]:
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except OSError:
+                pass
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class _ScanCache(object):
+    """
+    Keeps track of the memory used by the data of parsed scans. When
+    it goes over `limit` bytes, the least recently used scans are reset
+    and will be parsed again from the file when needed
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.scans = collections.OrderedDict()
+        self.nbytes = 0
+
+    def touch(self, scan):
+        if self.limit is None:
+            return
+
+        nbytes = self.scans.pop(scan, None)
+        if nbytes is None:
+            nbytes = scan._getParsedBytes()
+            self.nbytes += nbytes
+        self.scans[scan] = nbytes
+
+        # the scan just used is kept even if alone over the limit
+        while self.nbytes > self.limit and len(self.scans) > 1:
+            oldest, nbytes = self.scans.popitem(last=False)
+            self.nbytes -= nbytes
+            oldest._releaseData()
+
+    def discard(self, scan):
+        nbytes = self.scans.pop(scan, None)
+        if nbytes is not None:
+            self.nbytes -= nbytes
+
+    def clear(self):
+        self.scans.clear()
+        self.nbytes = 0
+
+
 class FileSpec(list):
     """
     FileSpec class documentation
+
+    The file is indexed by recording only the byte offset and length of
+    each #F/#E header block and each #S scan block. Blocks read and parse
+    their own bytes the first time their content is needed. With `use_mmap`
+    (the default) the file is memory mapped and blocks are sliced from the
+    map, otherwise they are read from the file with seek/read.
+
+    Files compressed with gzip, bzip2 or xz are read without decompressing
+    them to disk. Offsets are then given in the uncompressed data. For gzip
+    files the decompressor state is saved at points along the data, so
+    reading a scan decompresses only from the point before it.
+
+    With `cache` set, the index is saved in a sidecar file (`cachefile`, by
+    default a hidden file next to the data file) and reloaded on the next
+    opening if the file has not changed. If the file has only grown, just
+    the new data at the end of the file is indexed.
+
+    With `memory_limit` (in bytes) the data of the least recently used
+    parsed scans is dropped to stay under the limit. Those scans are
+    parsed again when their data is accessed.
     """
 
-    def __init__(self, filename):
+    APPENDED = "appended"
+    TRUNCATED = "truncated"
+    REWRITTEN = "rewritten"
+
+    def __init__(self, filename, use_mmap=True, cache=False, cachefile=None,
+                 memory_limit=None):
 
         list.__init__(self)
 
         self._filename = filename
+        self._use_mmap = use_mmap
+        self._cachefile = cachefile
+        self._source = _openSource(filename, use_mmap)
+        self._scancache = _ScanCache(memory_limit)
         self.origfilename = None
         self._headers = []
+        self._lastblock = None
         self.lastpos = 0
 
         self.inheader = False
@@ -89,10 +588,20 @@ class FileSpec(list):
         self.filestat = os.stat(self._filename)
         self.st_size = 0
 
+        # file as it was indexed, to find changes (see update)
+        self._indexstat = (None, 0, 0)
+        self._tailcheck = (0, 0, 0)
+
         # dictionary to hold references (by scan number) to the scanlist
         self.scans = {}
 
-        self._indexscans()
+        if not cache:
+            self._indexscans()
+        elif not self.loadIndex():
+            self._indexscans()
+            self.saveIndex()
+        elif self.update():
+            self.saveIndex()
 
         if len(self.scans) == 0:
             raise FileSpecFormatUnknown("No scans found in file %s"
@@ -106,17 +615,112 @@ class FileSpec(list):
         return os.path.abspath(self._filename)
 
     def update(self):
-
+        """
+        Checks the file for changes and updates the index. Returns
+        APPENDED if data was added at the end of the file, TRUNCATED if
+        the file was cut, REWRITTEN if data already indexed changed (as
+        when spec starts a new file with the same name), or False if the
+        file did not change. Only the blocks from the first changed one
+        on are indexed again
+        """
         currstat = os.stat(self._filename)
 
-        if currstat.st_size > self.st_size:
-            self.st_size = currstat.st_size
-            self._indexscans()
-            modified = True
+        ino, size, mtime = self._indexstat
+        if currstat.st_ino == ino and currstat.st_size == size and \
+                int(currstat.st_mtime * 1e9) == mtime:
+            return False
+
+        # map the file as it is now before reading from it
+        self._source.open()
+
+        blocks = sorted(self._headers + list(self),
+                        key=lambda block: block.start)
+
+        # the first block and the parsed ones are checked as well as the
+        # tail, as the file may have been truncated and written again
+        # past its old size
+        if currstat.st_ino == ino and currstat.st_size >= size and \
+                self._checkTail() and \
+                all(block._checkBytes() for block in blocks
+                    if block is blocks[0] or block.is_parsed):
+            if currstat.st_size > size:
+                self._indexscans()
+                return self.APPENDED
+
+            # written in place with the same size: the blocks are
+            # looked at only then, as it seldom happens
+            if all(block._checkBytes() for block in blocks):
+                self._indexstat = (ino, size, int(currstat.st_mtime * 1e9))
+                return False
+
+        if self._source.compressed:
+            # the size of the data is only known after reading it all
+            first = 0
         else:
-            modified = False
+            first = self._firstChangedBlock(blocks, currstat.st_size)
+        self._reindexFrom(blocks, first)
+
+        if first > 0 and currstat.st_size < size:
+            return self.TRUNCATED
+        return self.REWRITTEN
 
-        return modified
+    def _checkTail(self):
+        """
+        Tells if the last indexed bytes are still in the file
+        """
+        pos, nbytes, crc = self._tailcheck
+        data = self._source.readBytes(pos, nbytes)
+        return len(data) == nbytes and _crc(data) == crc
+
+    def _firstChangedBlock(self, blocks, size):
+        """
+        Returns the index in `blocks` of the first block that is not
+        in the file as it was indexed
+        """
+        for idx, block in enumerate(blocks):
+            if block.start + block.length > size or not block._checkBytes():
+                return idx
+
+        # the change is after the start of the last blocks
+        tailpos = self._tailcheck[0]
+        for idx in range(len(blocks) - 1, -1, -1):
+            if blocks[idx].start <= tailpos:
+                return idx
+        return 0
+
+    def _reindexFrom(self, blocks, first):
+        """
+        Drops the blocks from `blocks[first]` on and indexes the file
+        again from there
+        """
+        if first < len(blocks):
+            startpos = blocks[first].start
+        else:
+            startpos = self.lastpos
+
+        for scan in self:
+            if scan.start >= startpos:
+                self._scancache.discard(scan)
+
+        self[:] = [scan for scan in self if scan.start < startpos]
+        self._headers = [header for header in self._headers
+                         if header.start < startpos]
+
+        kept = blocks[:first]
+        self._lastblock = kept[-1] if kept else None
+        if self._lastblock is not None:
+            # the end of the last block is read again
+            self._lastblock.resetParsedData()
+        self.inheader = isinstance(self._lastblock, Header)
+        self.lastpos = startpos if kept else 0
+
+        self.origfilename = None
+        for header in reversed(self._headers):
+            if header._filename:
+                self.origfilename = header._filename
+                break
+
+        self._indexscans()
 
     @property
     def filename(self):
@@ -135,6 +739,363 @@ class FileSpec(list):
 
     get_scan_by_number = getScanByNumber
 
+    @property
+    def memory_limit(self):
+        return self.getMemoryLimit()
+
+    @memory_limit.setter
+    def memory_limit(self, limit):
+        self.setMemoryLimit(limit)
+
+    def getMemoryLimit(self):
+        return self._scancache.limit
+
+    def setMemoryLimit(self, limit):
+        """
+        Sets the maximum number of bytes used by the data of parsed scans.
+        None means no limit
+        """
+        cache = self._scancache
+        cache.limit = limit
+        if limit is None:
+            cache.clear()
+            return
+
+        for scan in self:
+            if scan.is_parsed and scan not in cache.scans:
+                cache.touch(scan)
+
+    @property
+    def memory_usage(self):
+        return self.getMemoryUsage()
+
+    def getMemoryUsage(self):
+        """
+        Returns the number of bytes used by the data of parsed scans, as
+        accounted when a memory limit is set
+        """
+        return self._scancache.nbytes
+
+    def parseAll(self, workers=None):
+        """
+        Parses all scans in the file that are not parsed yet. The scans
+        are parsed in parallel by `workers` processes (by default, one per
+        cpu). See `iterParse()`
+        """
+        for scan in self.iterParse(workers):
+            pass
+
+    parse_all = parseAll
+
+    def follow(self, interval=1.0, timeout=None):
+        """
+        Follows the file while spec writes it. Yields events as tuples:
+
+            ("scan", scan, None) when a scan starts
+            ("points", scan, rows) with the rows added to a scan
+            (TRUNCATED or REWRITTEN, None, None) when the file was cut
+                or rewritten (see `update()`). Scans after the change
+                are given again
+
+        The last scan in the file is given first with all its points.
+        Only the bytes appended to the file are parsed, and the data of
+        the scan being written is extended as complete lines come in
+        (`rows` is a read-only view of the new rows in that data).
+        The file is checked when it is written (with inotify on Linux)
+        or every `interval` seconds. Stops after `timeout` seconds
+        without changes, or never if None
+        """
+        watcher = _FileWatcher(self._filename)
+
+        live = None
+        sent = 0
+        idle = 0.0
+
+        try:
+            if len(self):
+                live = self[-1]
+                live._startFeed()
+                yield "scan", live, None
+
+            while True:
+                oldscans = list(self)
+                change = self.update()
+                changed = bool(change)
+
+                nbscans = len(oldscans)
+                if change == self.TRUNCATED or change == self.REWRITTEN:
+                    nbscans = 0
+                    while nbscans < min(len(self), len(oldscans)) and \
+                            self[nbscans] is oldscans[nbscans]:
+                        nbscans += 1
+                    if live is not None and live not in self[:nbscans]:
+                        live.resetParsedData()
+                        live = None
+                    yield change, None, None
+                newscans = self[nbscans:]
+
+                for scan in [live] + newscans:
+                    if scan is None:
+                        continue
+
+                    if scan is not live:
+                        live = scan
+                        sent = 0
+                        scan._startFeed()
+                        yield "scan", scan, None
+
+                    if scan._feeder is None:
+                        # parsed again or dropped from memory meanwhile
+                        scan._startFeed()
+
+                    if scan is not self[-1]:
+                        scan._stopFeed()
+                    else:
+                        scan._feed()
+
+                    if len(scan._data) > sent:
+                        changed = True
+                        rows = scan._data[sent:]
+                        sent = len(scan._data)
+                        yield "points", scan, rows
+
+                if changed:
+                    idle = 0.0
+                elif timeout is not None and idle >= timeout:
+                    break
+
+                t0 = time.time()
+                watcher.wait(interval)
+                idle += time.time() - t0
+        finally:
+            watcher.close()
+            if live is not None and live._feeder is not None:
+                # parsed again as a whole when needed
+                live.resetParsedData()
+
+    def iterParse(self, workers=None, scans=None):
+        """
+        Parses the scans not parsed yet in `workers` processes (by default,
+        one per cpu) and yields each scan, in file order, once its data is
+        available. The workers read the byte range of each scan from
+        the file and send back only the parsed values and arrays.
+        Compressed files are parsed in this process. With `scans`, only
+        those scans are parsed
+        """
+        if scans is None:
+            scans = self
+        scans = [scan for scan in scans if not scan.is_parsed]
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        if workers <= 1 or len(scans) <= 1 or self._source.compressed:
+            # workers would all decompress the file from its start
+            for scan in scans:
+                scan.parse()
+                yield scan
+            return
+
+        # batches of consecutive scans with about the same number of bytes
+        nbatches = min(len(scans), workers * _BATCHES_PER_WORKER)
+        batchsize = sum(scan.length for scan in scans) / float(nbatches)
+
+        batches = [[]]
+        size = 0
+        for scan in scans:
+            if size >= batchsize:
+                batches.append([])
+                size = 0
+            batches[-1].append(scan)
+            size += scan.length
+
+        tasks = [(self._filename, self._source.use_mmap,
+                  [(scan.start, scan.length) for scan in batch])
+                 for batch in batches]
+
+        pool = multiprocessing.Pool(min(workers, len(batches)))
+        try:
+            for batch, states in zip(batches, pool.imap(_parseScans, tasks)):
+                for scan, state in zip(batch, states):
+                    scan._setParsedState(state)
+                    yield scan
+        finally:
+            pool.terminate()
+            pool.join()
+
+    iter_parse = iterParse
+
+    def getScanTable(self, counters=None, workers=1):
+        """
+        Returns a ScanTable with one row per scan and, in columns, the
+        position of each motor at the start of the scan and, for each
+        label in `counters`, the statistics of that data column. Motor
+        positions only need the scan headers. Statistics are computed
+        when scans are parsed and kept after their data is dropped;
+        scans without them are parsed in `workers` processes (see
+        iterParse) and their data is dropped again
+        """
+        counters = list(counters or [])
+
+        motors = []
+        motoridx = {}
+        columns = {}
+        rows = []
+
+        for scan in self:
+            parsed = scan.is_header_parsed
+            positions = scan.getMotorPositions() or []
+
+            # motor names are shared by the scans under the same header
+            names = tuple(name for name, pos in positions)
+            cols = columns.get(names)
+            if cols is None:
+                for name in names:
+                    if name not in motoridx:
+                        motoridx[name] = len(motors)
+                        motors.append(name)
+                cols = columns[names] = [motoridx[name] for name in names]
+
+            values = []
+            for name, pos in positions:
+                try:
+                    values.append(float(pos))
+                except ValueError:
+                    values.append(numpy.nan)
+            rows.append((cols, values))
+
+            if not parsed:
+                # the header was only parsed for the table
+                scan.resetParsedData()
+
+        positions = numpy.full((len(self), len(motors)), numpy.nan)
+        for row, (cols, values) in enumerate(rows):
+            positions[row, cols[:len(values)]] = values
+
+        stats = numpy.full((len(self), len(counters), 4), numpy.nan)
+        if counters:
+            missing = [scan for scan in self if scan._stats is None]
+            for scan in self.iterParse(workers, missing):
+                # the data was only parsed for the statistics
+                scan.resetParsedData()
+
+            for row, scan in enumerate(self):
+                if scan._stats is None:
+                    continue
+                for col, label in enumerate(counters):
+                    try:
+                        idx = scan._getColumnIndex(label)
+                    except ValueError:
+                        continue
+                    if idx < scan._stats.shape[1]:
+                        stats[row, col] = scan._stats[:, idx]
+
+        return ScanTable(list(self), motors, positions, counters, stats)
+
+    get_scan_table = getScanTable
+
+    def merge(self, scans, on=None, how="concat"):
+        """
+        Merges the data of several scans, given as Scan objects or scan
+        numbers, into one array with the columns whose labels all the
+        scans have, in the order of the first scan. `how` is one of:
+
+          concat: the points of all scans one after the other, sorted
+                  by the column labelled `on` if given
+          mean:   the average of the scans, point by point. The scans
+                  must have the same number of points
+          interp: the average of the scans interpolated on the values
+                  of column `on` in the first scan. Points out of the
+                  range of a scan are not counted for that scan
+
+        Returns a tuple (data, labels, sources). For concat, sources
+        gives the index in `scans` of each point and, otherwise, the
+        number of scans averaged for each point
+        """
+        if how not in ("concat", "mean", "interp"):
+            raise ValueError("unknown merge method %s" % how)
+        if how == "interp" and on is None:
+            raise ValueError("interp merge needs the label of the axis")
+
+        scans = [self.getScanByNumber(scan) if isinstance(scan, int)
+                 else scan for scan in scans]
+        if not scans or None in scans:
+            raise ValueError("no scans to merge")
+
+        for scan in scans:
+            if not scan.getLabels():
+                raise ValueError("scan %s has no column labels" %
+                                 scan.getNumber())
+
+        labels = list(scans[0].getLabels())
+        for scan in scans[1:]:
+            common = set(scan.getLabels())
+            labels = [label for label in labels if label in common]
+        if on is not None and on not in labels:
+            raise ValueError("column %s is not in all scans" % on)
+        axis = labels.index(on) if on is not None else None
+
+        # columns read only once per labels line
+        indices = {}
+
+        def columns(scan):
+            key = tuple(scan.getLabels() or [])
+            if key not in indices:
+                indices[key] = [key.index(label) for label in labels]
+            return scan._readColumns(indices[key])
+
+        if how == "concat":
+            blocks = [columns(scan) for scan in scans]
+            data = numpy.concatenate(blocks).astype(float, copy=False)
+            sources = numpy.repeat(numpy.arange(len(scans)),
+                                   [len(block) for block in blocks])
+            if axis is not None:
+                order = numpy.argsort(data[:, axis], kind="stable")
+                data = data[order]
+                sources = sources[order]
+            return data, labels, sources
+
+        if how == "mean":
+            data = None
+            for scan in scans:
+                block = columns(scan)
+                if data is None:
+                    data = numpy.array(block, dtype=float)
+                elif block.shape != data.shape:
+                    raise ValueError("scan %s has %d points instead of %d" %
+                                     (scan.getNumber(), len(block), len(data)))
+                else:
+                    data += block
+            data /= len(scans)
+            sources = numpy.full(len(data), len(scans))
+            return data, labels, sources
+
+        data = None
+        for scan in scans:
+            block = columns(scan)
+            if data is None:
+                grid = numpy.array(block[:, axis], dtype=float)
+                data = numpy.zeros((len(grid), len(labels)))
+                sources = numpy.zeros(len(grid), dtype=int)
+
+            # points with no axis value are left out
+            block = block[~numpy.isnan(block[:, axis])]
+            block = block[numpy.argsort(block[:, axis], kind="stable")]
+            xvalues = block[:, axis]
+            if not len(xvalues):
+                continue
+
+            inside = (grid >= xvalues[0]) & (grid <= xvalues[-1])
+            sources += inside
+            for col in range(len(labels)):
+                data[inside, col] += numpy.interp(grid[inside], xvalues,
+                                                  block[:, col])
+
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            data /= sources[:, numpy.newaxis]
+        data[:, axis] = grid
+        return data, labels, sources
+
     @property
     def time_created(self):
         return self.getTimeCreated()
@@ -198,45 +1159,63 @@ class FileSpec(list):
 
     def _indexscans(self):
 
-        self.fd = open(self._filename, "r")
+        self.filestat = self._source.open()
 
-        if len(self) > 0:
-            fb = self[-1]
-            self.fd.seek(self.lastpos)
+        fb = self._lastblock
+
+        if self._source.map is not None:
+            chunks = [(0, self._source.map)]
         else:
-            fb = None
+            chunks = self._source.readChunks(self.lastpos)
 
-        data = self.fd.read()
+        # share label lines between scans
+        labellines = {}
 
-        for lineno, sline in enumerate(data.split('\n#')):
+        base, buf = self.lastpos, b''
+        for base, buf in chunks:
 
-            if not sline.strip():
-                continue
+            # only complete lines are checked for block starts. An
+            # incomplete last line stays in the last block until it is
+            # terminated
+            start = max(self.lastpos - base, 0)
+            endpos = buf.rfind(b'\n', start) + 1
 
-            if sline[0] in ['S', 'F', 'E']:
+            for mat in _reblock.finditer(buf, start, endpos):
 
-                btype = sline[0]
+                btype = mat.group(1)
+                blockstart = base + mat.start()
 
-                if btype in ['F', 'E']:
-                    # block not followed by space is not a block. ignore line
-                    if sline[1] != " ":
-                        continue
+                if btype == b'N' or btype == b'L':
+                    if fb is not None and not self.inheader:
+                        content = _decode(mat.group(2)).strip()
+                        if btype == b'N':
+                            fb._setIndexColumns(content)
+                        else:
+                            fb._setIndexLabels(
+                                labellines.setdefault(content, content))
+                    continue
 
-                blockstart = self.lastpos
-                blockline = lineno
+                if btype == b'E' and self.inheader:
+                    # epoch line belonging to the current header
+                    continue
 
                 if fb is not None:
-                    fb.end()
+                    fb.end(blockstart)
+
+                head = buf[mat.start():min(mat.start() + _CHECK_BYTES,
+                                           endpos)]
+                blockcheck = (len(head), _crc(head))
 
-                if btype == 'F' or (btype == 'E' and not self.inheader):
-                    if btype == 'F':
-                        self.origfilename = sline[2:].strip()
-                    fb = Header(blockstart, blockline)
+                if btype == b'F' or btype == b'E':
+                    if btype == b'F':
+                        self.origfilename = _decode(mat.group(2)).strip()
+                    fb = Header(self._source, blockstart)
                     self.inheader = True
                     self._headers.append(fb)
-                elif btype == 'S':
-                    fb = Scan(blockstart, blockline)
-                    fb.addSLine(sline[2:])
+                else:
+                    fb = Scan(self._source, blockstart)
+                    fb._setScanCache(self._scancache)
+                    fb.addSLine(_decode(mat.group(2)).strip())
                     self.inheader = False
                     self.append(fb)
                     fb._setScanIndex(len(self))
@@ -244,17 +1223,38 @@ class FileSpec(list):
                         # Assign last added header to current scan
                         fb._setFileHeader(self._headers[-1])
 
+                fb._check = blockcheck
+
                 if self.origfilename:
                     fb.setFileName(self.origfilename)
 
-            if sline and fb:
-                fb.addLine(sline)
+            if endpos > 0:
+                self.lastpos = base + endpos
 
-            self.lastpos = self.fd.tell()
+        size = base + len(buf)
+
+        # an unterminated "#" line may be a block start still being
+        # written. keep it out of the last block until it is complete
+        blockend = size
+        if buf[self.lastpos - base:self.lastpos - base + 1] == b'#':
+            blockend = self.lastpos
 
         # register last block
         if fb is not None:
-            fb.end()
+            fb.end(blockend)
+
+        self._lastblock = fb
+        self.st_size = size
+
+        tailstart = max(size - _CHECK_BYTES, 0)
+        tail = self._source.readBytes(tailstart, size - tailstart)
+        self._tailcheck = (tailstart, len(tail), _crc(tail))
+        self._indexstat = (self.filestat.st_ino, self.filestat.st_size,
+                           int(self.filestat.st_mtime * 1e9))
+
+        self._sortscans()
+
+    def _sortscans(self):
 
         # correct the scan order if necessary
         # assign number in file
@@ -272,57 +1272,437 @@ class FileSpec(list):
             scan._setNumberInFile(scanidx)
             scanidx += 1
 
-        self.fd.close()
+    def getIndexFileName(self):
+        """
+        Returns the name of the file where the index is cached
+        """
+        if self._cachefile:
+            return self._cachefile
 
+        dirname, basename = os.path.split(self.absolutePath())
+        return os.path.join(dirname, ".%s.idx" % basename)
 
-class FileBlock:
+    def saveIndex(self, cachefile=None):
+        """
+        Saves the block index of the file in `cachefile` (or the default
+        index file) so that it can be reloaded with `loadIndex()`.
+        Returns True if the index could be saved.
+        """
+        if cachefile is None:
+            cachefile = self.getIndexFileName()
+
+        header_idx = dict((id(header), idx)
+                          for idx, header in enumerate(self._headers))
+
+        labellines = []
+        label_idx = {}
+
+        nscans = len(self)
+        scan_pos = numpy.empty((nscans, 2), dtype=numpy.int64)
+        scan_info = numpy.empty((nscans, 3), dtype=numpy.int32)
+        scan_check = numpy.empty((nscans, 2), dtype=numpy.int64)
+        commands = []
+
+        for idx, scan in enumerate(self):
+            scan_pos[idx] = (scan.start, scan.length)
+            scan_check[idx] = scan._check or (0, 0)
+
+            if scan._labelline is None:
+                labidx = -1
+            else:
+                labidx = label_idx.setdefault(scan._labelline, len(labellines))
+                if labidx == len(labellines):
+                    labellines.append(scan._labelline)
+
+            scan_info[idx] = (header_idx.get(id(scan._fileheader), -1),
+                              scan._nbcolumns or 0, labidx)
+            commands.append("%s %s" % (scan._number, scan._command))
+
+        header_pos = numpy.array([(header.start, header.length)
+                                  for header in self._headers],
+                                 dtype=numpy.int64).reshape(-1, 2)
+        header_check = numpy.array([header._check or (0, 0)
+                                    for header in self._headers],
+                                   dtype=numpy.int64).reshape(-1, 2)
+
+        ino, size, mtime = self._indexstat
+        filestat = numpy.array([ino, size, mtime, self.lastpos,
+                                self.inheader] + list(self._tailcheck),
+                               dtype=numpy.int64)
+
+        tmpfile = "%s.%d" % (cachefile, os.getpid())
+        try:
+            with open(tmpfile, "wb") as fd:
+                numpy.savez(fd,
+                            version=numpy.array(_INDEX_VERSION),
+                            filestat=filestat,
+                            header_pos=header_pos,
+                            header_check=header_check,
+                            scan_pos=scan_pos,
+                            scan_info=scan_info,
+                            scan_check=scan_check,
+                            commands=_encodeLines(commands),
+                            labels=_encodeLines(labellines),
+                            origfilename=_encodeLines(
+                                [self.origfilename or ""]))
+            os.rename(tmpfile, cachefile)
+        except (IOError, OSError):
+            log.log(2, "cannot save index for %s in %s" % (self._filename,
+                                                          cachefile))
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            return False
+
+        return True
+
+    def loadIndex(self, cachefile=None):
+        """
+        Reloads a block index saved with `saveIndex()`. Returns True if
+        the index could be loaded. Changes in the file since the index
+        was saved are found, and indexed, on the next `update()`.
+        """
+        if cachefile is None:
+            cachefile = self.getIndexFileName()
+
+        try:
+            with open(cachefile, "rb") as fd:
+                index = numpy.load(fd, allow_pickle=False)
+                if int(index["version"]) != _INDEX_VERSION:
+                    return False
+                filestat = index["filestat"]
+                header_pos = index["header_pos"]
+                header_check = index["header_check"]
+                scan_pos = index["scan_pos"]
+                scan_info = index["scan_info"]
+                scan_check = index["scan_check"]
+                commands = _decodeLines(index["commands"])
+                labellines = _decodeLines(index["labels"])
+                origfilename = _decodeLines(index["origfilename"])[0]
+        except (IOError, OSError, ValueError, KeyError):
+            return False
+
+        ino, size, mtime, lastpos, inheader = filestat.tolist()[:5]
+
+        del self[:]
+        self._headers = []
+        self.origfilename = origfilename or None
+        self.lastpos = lastpos
+        self.inheader = bool(inheader)
+        self.st_size = size
+        self._indexstat = (ino, size, mtime)
+        self._tailcheck = tuple(filestat.tolist()[5:])
+
+        self.filestat = self._source.open()
+
+        blocks = []
+
+        for (start, length), check in zip(header_pos.tolist(),
+                                          header_check.tolist()):
+            header = Header(self._source, start)
+            header._check = tuple(check)
+            if self.origfilename:
+                header.setFileName(self.origfilename)
+            header.end(start + length)
+            self._headers.append(header)
+            blocks.append((start, header))
+
+        for (start, length), (hidx, columns, labidx), check, command in \
+                zip(scan_pos.tolist(), scan_info.tolist(),
+                    scan_check.tolist(), commands):
+            scan = Scan(self._source, start)
+            scan._check = tuple(check)
+            scan._setScanCache(self._scancache)
+            scan.addSLine(command)
+            if columns:
+                scan._setIndexColumns(columns)
+            if labidx >= 0:
+                scan._setIndexLabels(labellines[labidx])
+            if hidx >= 0:
+                scan._setFileHeader(self._headers[hidx])
+            # a new scan has no parsed data to reset. no need for end()
+            scan.length = length
+            self.append(scan)
+            scan._setScanIndex(len(self))
+            blocks.append((start, scan))
+
+        if blocks:
+            self._lastblock = max(blocks, key=lambda blk: blk[0])[1]
+        else:
+            self._lastblock = None
 
-    respecuser = re.compile(r'(?P<spec>.*?)\s+User\s+=\s+(?P<user>.*?)$')
+        self._sortscans()
 
-    def __init__(self, start, firstline):
+        return True
 
-        self.start = start
-        self.firstline = firstline
-        self.lines = []
-        self._filename = None
-        self._contains_error = False
-        self._error_messages = []
-        self._id = ""
 
-        self.funcs = {
-            'S': self.addSLine,
-            'E': self.addEpochLine,
-            'F': self.addFileLine,
-            'D': self.addDateLine,
-            'N': self.addColumnsLine,
-            'L': self.addLabelLine,
-            'O': self.addMotorLabelLine,
-            'o': self.addMotorMneLine,
-            'J': self.addCounterLabelLine,
-            'j': self.addCounterMneLine,
-            'U': self.addUserLine,
-            'C': self.addCommentLine,
-            'P': self.addMotorPositionLine,
-            'T': self.addTimeLine,
-            'G': self.addGeoLine,
-            'Q': self.addQLine,
-            '@': self.addExtraLine,
-        }
+class ScanTable(object):
+    """
+    Values of the scans of a file in columns, one row per scan, to
+    select scans with numpy expressions (see FileSpec.getScanTable):
 
-        self.resetParsedData()
+        table = filespec.getScanTable(counters=["det"])
+        mask = (table["tth"] >= 20) & (table["tth"] <= 30)
+        scans = table.select(mask & (table["det", "max"] > 1000))
+
+    table[motor] gives the position of a motor at the start of each
+    scan and table[counter, stat] a statistic of a data column, with
+    stat one of STATS. Values a scan does not have are NaN
+    """
+
+    STATS = ("min", "max", "sum", "argmax")
+
+    def __init__(self, scans, motors, positions, counters, stats):
+        self.scans = scans
+        self.motors = motors
+        self.counters = counters
+        self.positions = positions
+        self.stats = stats
+
+        self.numbers = numpy.array([scan.getNumber() for scan in scans],
+                                   dtype=int)
+        self.orders = numpy.array([scan.getOrder() for scan in scans],
+                                  dtype=int)
+
+    def __len__(self):
+        return len(self.scans)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            counter, stat = key
+            if counter not in self.counters:
+                raise KeyError(counter)
+            if stat not in self.STATS:
+                raise KeyError(stat)
+            return self.stats[:, self.counters.index(counter),
+                              self.STATS.index(stat)]
+
+        if key not in self.motors:
+            raise KeyError(key)
+        return self.positions[:, self.motors.index(key)]
+
+    def select(self, mask):
+        """
+        Returns the scans for which `mask` is true
+        """
+        return [self.scans[idx] for idx in numpy.flatnonzero(mask)]
+
+
+def _parseScans(task):
+    """
+    Parses scans in a worker process. `task` gives the file and the byte
+    range of each scan. Returns the parsed state of each scan
+    """
+    filename, use_mmap, ranges = task
+
+    source = _openSource(filename, use_mmap)
+    source.open()
+
+    states = []
+    for start, length in ranges:
+        scan = Scan(source, start)
+        scan.length = length
+        scan._parseBlock()
+        states.append(scan._getParsedState())
+
+    source.close()
+    return states
+
+
+def _mcaEnd(text):
+    """
+    Returns the position after the first line in `text` not continued
+    with a backslash or None if all lines are continued
+    """
+    pos = 0
+    for line in text.split('\n')[:-1]:
+        pos += len(line) + 1
+        if not line.strip().endswith("\\"):
+            return pos
+    return None
+
+
+def _plainFields(lines, nbfields):
+    """
+    Returns True if `lines` only hold numeric characters and as many
+    fields as `nbfields` per line on average. Together with a conversion
+    of the last field this tells that every line has `nbfields` fields
+    """
+    text = ('\n'.join(lines) + '\n').encode('utf-8')
+    if text.translate(None, _NUMCHARS):
+        return False
+    blank = numpy.frombuffer(text, dtype=numpy.uint8) <= 32
+    nbstarts = numpy.count_nonzero(blank[:-1] > blank[1:]) + (not blank[0])
+    return nbstarts == len(lines) * nbfields
+
+
+def _fieldCounts(lines):
+    """
+    Returns an array with the number of fields in each of `lines`
+    """
+    text = ('\n'.join(lines) + '\n').encode('utf-8')
+    chars = numpy.frombuffer(text, dtype=numpy.uint8)
+    blank = chars <= 32
+    starts = numpy.flatnonzero(~blank & numpy.append(True, blank[:-1]))
+    ends = numpy.flatnonzero(chars == 10)
+    return numpy.bincount(numpy.searchsorted(ends, starts),
+                          minlength=len(lines))
+
+
+def _isNumeric(line):
+    """
+    Returns True if every field of `line` converts to a float
+    """
+    try:
+        list(map(float, line.split()))
+    except ValueError:
+        return False
+    return True
+
+
+def _columnStats(data):
+    """
+    Returns a (4, columns) array with the minimum, maximum, sum and index
+    of the maximum of each column of `data` (NaN if there are no rows)
+    """
+    stats = numpy.full((4, data.shape[1]), numpy.nan)
+    if len(data):
+        stats[0] = data.min(axis=0)
+        stats[1] = data.max(axis=0)
+        stats[2] = data.sum(axis=0)
+        stats[3] = data.argmax(axis=0)
+    return stats
+
+
+def _stackSpectra(spectra):
+    """
+    Returns a list of spectra as a (nb_spectra, nb_channels) array, or
+    as a list if they do not have all the same number of channels
+    """
+    if not len(spectra):
+        return numpy.empty((0, 0))
+    if len(set(len(spectrum) for spectrum in spectra)) > 1:
+        return list(spectra)
+    return numpy.array(spectra, dtype=float)
+
+
+def saveScans(scans, outfile, format="npz", append=False, prefix=None):
+    """
+    Saves the data of `scans` in one binary file, a numpy .npz file or
+    with format "h5" an HDF5 file. Each scan is saved under the name
+    "<number>.<order>" with one array per column (named after its label),
+    one (spectra, channels) array per MCA ("mca_<n>") and its metadata
+    from getMeta() as a JSON string ("meta"). With `append` set, the scans
+    are added to an existing HDF5 file. With `prefix` the scans are saved
+    under "<prefix>/<number>.<order>", to keep apart the scans of several
+    files saved together
+    """
+    if format == "npz":
+        if append:
+            raise ValueError("scans cannot be appended to a npz file")
+        arrays = {}
+        for scan in scans:
+            key = _scanKey(scan, prefix)
+            for name, array in _scanArrays(scan):
+                arrays["%s/%s" % (key, name)] = array
+            arrays["%s/meta" % key] = numpy.array(_scanMeta(scan))
+        with open(outfile, "wb") as fd:
+            numpy.savez(fd, **arrays)
+
+    elif format == "h5":
+        if h5py is None:
+            raise ImportError("saving in h5 format needs the h5py module")
+        with h5py.File(outfile, append and "a" or "w") as fd:
+            for scan in scans:
+                key = _scanKey(scan, prefix)
+                if key in fd:
+                    del fd[key]
+                group = fd.create_group(key)
+                for name, array in _scanArrays(scan):
+                    group.create_dataset(name, data=array)
+                group.attrs["meta"] = _scanMeta(scan)
+
+    else:
+        raise ValueError("unknown binary format %s" % format)
+
+
+def _scanKey(scan, prefix=None):
+    key = "%s.%s" % (scan.getNumber(), scan.getOrder())
+    if prefix:
+        key = "%s/%s" % (prefix, key)
+    return key
+
+
+def _scanArrays(scan):
+    """
+    Returns (name, array) pairs with the columns and MCA data of `scan`
+    """
+    data = scan.getData()
+    labels = scan.getLabels() or []
+
+    arrays = []
+    names = set(["meta"])
+    for col in range(data.shape[1]):
+        name = col < len(labels) and labels[col].replace("/", "_") or ""
+        name = name or "col%d" % col
+        while name in names:
+            name += "_"
+        names.add(name)
+        arrays.append((name, data[:, col]))
+
+    for idx in range(scan.getNumberOneD()):
+        oned = scan.getOneD(idx)
+        try:
+            arrays.append(("mca_%d" % idx, oned.getData()))
+        except ValueError:
+            # spectra of different lengths are saved one by one
+            for sidx, mcadata in enumerate(oned):
+                arrays.append(("mca_%d_%d" % (idx, sidx), mcadata._data))
+
+    return arrays
+
+
+def _scanMeta(scan):
+    return json.dumps(scan.getMeta(), default=str)
 
-    def resetParsedData(self):
-        # Default
-        self.is_parsed = False
 
+def _crc(data):
+    return zlib.crc32(data) & 0xffffffff
+
+
+def _decode(bytestr):
+    return bytestr.decode('utf-8', 'replace')
+
+
+def _encodeLines(lines):
+    return numpy.frombuffer("\n".join(lines).encode('utf-8'),
+                            dtype=numpy.uint8)
+
+
+def _decodeLines(arr):
+    return _decode(arr.tobytes()).split("\n")
+
+
+class _ParsedBlock(object):
+    """
+    Values a block gets from parsing. They are kept apart and only
+    created when first used, so that the blocks of a file that is
+    indexed but not parsed take little memory
+    """
+
+    __slots__ = ('_data', '_oneds', '_count_time', '_epoch', '_date',
+                 '_columns', '_labels', '_motor_labels', '_motor_mnes',
+                 '_counter_labels', '_counter_mnes', '_motor_positions',
+                 '_comment_lines', '_user_lines', '_geo_pars', '_qvalue',
+                 '_extra_lines', '_error_lines', '_error_codes',
+                 '_error_messages', '_contains_error', '_find_oned',
+                 'reading_mca', 'tmpmca', 'motor_positions_list', '_feeder',
+                 '_feedtexts', '_fedpos', '_databuf', '_datalines')
+
+    def __init__(self):
         self._data = []
         self._oneds = []
 
-        # self._number = 0
-        # self._command = ""
-
         self._count_time = 0
-        self._filename = ""
         self._epoch = 0
         self._date = ""
         self._columns = 0
@@ -337,110 +1717,631 @@ class FileBlock:
         self._geo_pars = []
         self._qvalue = 0
         self._extra_lines = []
-        self._wrong_lines = []
+        self._error_lines = array.array('l')
+        self._error_codes = array.array('B')
         self._error_messages = []
         self._contains_error = False
         self._find_oned = True
         self.reading_mca = False
+        self.tmpmca = None
+        self.motor_positions_list = None
+        # data lines read by _iterChunks, rejected ones included
+        self._datalines = 0
 
-    def addLine(self, line):
-        self.lines.append(line)
+        # incremental parsing of a scan being written (see FileSpec.follow)
+        self._feeder = None
+        self._feedtexts = None
+        self._fedpos = 0
+        self._databuf = None
 
-    def end(self):
-        pass
+
+def _parsedAttribute(name):
+    """
+    Returns a property giving access to attribute `name` of the parsed
+    values of a block, created when first needed. The parsing loops
+    use the _ParsedBlock directly instead (see FileBlock._getParsed)
+    """
+    def fget(block):
+        parsed = block._parsed
+        if parsed is None:
+            parsed = block._parsed = _ParsedBlock()
+        return getattr(parsed, name)
+
+    def fset(block, value):
+        parsed = block._parsed
+        if parsed is None:
+            parsed = block._parsed = _ParsedBlock()
+        setattr(parsed, name, value)
+
+    return property(fget, fset)
+
+
+class FileBlock(object):
+
+    __slots__ = ('_source', 'start', 'length', 'firstline', '_filename',
+                 '_id', '_scancache', '_check', 'is_parsed',
+                 'is_header_parsed', '_parsed')
+
+    respecuser = re.compile(r'(?P<spec>.*?)\s+User\s+=\s+(?P<user>.*?)$')
+
+    # methods parsing each type of header line
+    linefuncs = {
+        'S': 'addSLine',
+        'E': 'addEpochLine',
+        'F': 'addFileLine',
+        'D': 'addDateLine',
+        'N': 'addColumnsLine',
+        'L': 'addLabelLine',
+        'O': 'addMotorLabelLine',
+        'o': 'addMotorMneLine',
+        'J': 'addCounterLabelLine',
+        'j': 'addCounterMneLine',
+        'U': 'addUserLine',
+        'C': 'addCommentLine',
+        'P': 'addMotorPositionLine',
+        'T': 'addTimeLine',
+        'G': 'addGeoLine',
+        'Q': 'addQLine',
+        '@': 'addExtraLine',
+    }
+
+    def __init__(self, source, start):
+
+        self._source = source
+        self.start = start
+        self.length = 0
+        self.firstline = None
+        self._filename = ""
+        self._id = ""
+        self._scancache = None
+
+        # size and crc of the first bytes of the block when it was indexed
+        self._check = None
+
+        self.resetParsedData()
+
+    def resetParsedData(self):
+        # Default
+        self.is_parsed = False
+        self.is_header_parsed = False
+
+        if self._scancache is not None:
+            self._scancache.discard(self)
+
+        # parsed values are created again when used
+        self._parsed = None
+
+    def _getParsed(self):
+        """
+        Returns the _ParsedBlock of the block, created when first needed
+        """
+        parsed = self._parsed
+        if parsed is None:
+            parsed = self._parsed = _ParsedBlock()
+        return parsed
+
+    def end(self, endpos):
+        self.length = endpos - self.start
+
+    def _checkBytes(self):
+        """
+        Tells if the first bytes of the block are still as when indexed
+        """
+        if self._check is None:
+            return True
+        nbytes, crc = self._check
+        data = self._source.readBytes(self.start, nbytes)
+        return len(data) == nbytes and _crc(data) == crc
+
+    def getText(self):
+        """
+        Returns the content of the block as read from the file
+        """
+        return _decode(self._source.readBytes(self.start, self.length))
+
+    def _iterText(self, size=_STREAM_BYTES):
+        """
+        Yields the content of the block in pieces of about `size` bytes,
+        each one ending on a line end
+        """
+        pos = self.start
+        end = self.start + self.length
+        rest = b''
+
+        while pos < end:
+            nbytes = min(size, end - pos)
+            buf = rest + self._source.readBytes(pos, nbytes)
+            pos += nbytes
+
+            if pos < end:
+                cut = buf.rfind(b'\n') + 1
+                if not cut:
+                    # line longer than size
+                    rest = buf
+                    continue
+            else:
+                cut = len(buf)
+
+            rest = buf[cut:]
+            yield _decode(buf[:cut])
+
+    def getFirstLine(self):
+        """
+        Returns the line number in the file where the block starts
+        """
+        if self.firstline is None:
+            self.firstline = self._source.lineNumber(self.start)
+        return self.firstline
 
     def parse(self):
+        self._parseBlock()
+        self.is_parsed = True
+        self.is_header_parsed = True
+        self.finalizeParsing()
+        self._touch()
+
+    def parseHeader(self):
+        """
+        Parses only the metadata lines of the block (#S, #D, #L, #P...),
+        skipping the data lines. The data is parsed when it is needed
+        """
+        if self.is_parsed or self.is_header_parsed:
+            self.resetParsedData()
+
+        # with a line end in front of the first line
+        buf = b'\n' + self._source.readBytes(self.start, self.length)
+        lineno = 0
+        pos = 0
+
+        for mat in _reheaderline.finditer(buf):
+            lineno += buf.count(b'\n', pos, mat.start())
+            pos = mat.start()
+
+            sline = _decode(mat.group(1))
+            if sline[:1] == '#':
+                sline = sline[1:]
+            self._parseMetaLine(lineno, sline)
+
+        self.is_header_parsed = True
+        self.finalizeParsing()
+
+    def _setScanCache(self, scancache):
+        self._scancache = scancache
+
+    def _touch(self):
+        if self._scancache is not None:
+            self._scancache.touch(self)
+
+    def _getParsedBytes(self):
+        """
+        Returns the number of bytes held in the data arrays of the block
+        """
+        nbytes = getattr(self._data, 'nbytes', 0)
+        for oned in self._oneds:
+            if oned._array is not None:
+                nbytes += oned._array.nbytes
+            else:
+                nbytes += sum(mcadata._data.nbytes for mcadata in oned)
+        return nbytes
+
+    def _releaseData(self):
+        """
+        Drops the parsed data of the block (see _ScanCache)
+        """
+        self.resetParsedData()
+
+    def _parseBlock(self, usecols=None):
+        """
+        Parses the text of the block. With `usecols` only those data
+        columns are converted and returned, mca spectra are not decoded
+        and the data of the block is left untouched
+        """
+        if self.is_parsed or self.is_header_parsed:
+            self.resetParsedData()
+
+        datachunks = []
+        for chunks in self._iterChunks([self.getText()], usecols):
+            datachunks.extend(chunks)
+
+        if usecols is not None:
+            if not datachunks:
+                return numpy.empty((0, len(usecols)))
+            return numpy.concatenate(datachunks)
+
+        parsed = self._getParsed()
+        if len(datachunks) == 1:
+            parsed._data = datachunks[0]
+        elif datachunks:
+            parsed._data = numpy.concatenate(datachunks)
+        else:
+            parsed._data = numpy.empty((0, parsed._columns))
+        parsed._data.flags.writeable = False
+
+        for oned in parsed._oneds:
+            for mcadata in oned._decode():
+                self.wrongLine(mcadata._lineno, _ERR_MCA)
+
+    def _iterChunks(self, texts, usecols=None):
+        """
+        Parses the lines in `texts`, consecutive pieces of the block text
+        ending on a line end. Yields for each piece the list of data arrays
+        found in it. Mca spectra are added to the OneD objects as they
+        are completed, unless the data line they go with is rejected, so
+        that spectrum i of each OneD goes with row i of the data
+        """
+        parsed = self._getParsed()
+        parsed._datalines = 0
+        rejected = set()
+
         lineno = -1
         oned_idx = 0
         data_line = 0
         comp_line = 2  # The mca data is between 2 data counter lines.
 
-        for line in self.lines:
-            for sline in line.split('\n'):
+        datarows = []
+        nbrows = 0
+
+        for text in texts:
+            datachunks = []
+
+            for linetype, sline in self._iterLines(text):
+
+                if linetype == _MCALINES:
+                    # several continuation lines of the current mca spectrum
+                    nblines = sline.count('\n')
+                    lineno += nblines
+                    data_line += nblines
+                    complete = parsed.tmpmca._addLines(sline)
+                    if complete:
+                        if parsed.tmpmca._point not in rejected:
+                            parsed._oneds[oned_idx].append(parsed.tmpmca)
+                        parsed.reading_mca = False
+                        oned_idx += 1
+                    continue
+
+                if linetype == _DATARUN:
+                    # a run of numeric lines is parsed in one go
+                    datarun = sline
+                    runlines = datarun.split('\n')[:-1]
+                    linenos = range(lineno + 1, lineno + 1 + len(runlines))
+                    lineno += len(runlines)
+                    data_line += len(runlines)
+                    oned_idx = 0
+
+                    if datarows:
+                        datachunks.append(numpy.array(datarows, dtype=float))
+                        datarows = []
+
+                    mark = len(parsed._error_lines)
+                    added = self._parseDataRun(runlines, linenos, datachunks,
+                                               usecols)
+                    if added < len(runlines):
+                        # errors of the run, in line order
+                        first = parsed._datalines - linenos[0]
+                        self._rejectPoints(
+                            [first + errline
+                             for errline in parsed._error_lines[mark:]],
+                            rejected)
+                    parsed._datalines += len(runlines)
+                    if nbrows < comp_line <= nbrows + added:
+                        parsed._find_oned = False
+                    nbrows += added
+                    continue
 
                 lineno += 1
 
+                if sline[:1] == '#':
+                    sline = sline[1:]
+
                 if not sline:
                     continue
 
                 first_char = sline[0]
 
-                if first_char in string.ascii_letters + '@':
-
-                    widx = sline.find(" ")
+                if first_char in _METACHARS:
 
-                    metakey = sline[0]
-                    metaval = sline[1:widx].strip()
-                    content = sline[widx:].strip()
-
-                    if metakey in self.funcs:
-                        try:
-                            self.funcs[metakey](content.strip(), metaval)
-                        except:
-                            self.wrongLine(lineno, sline,
-                                           "unknown line (%s) " % metakey)
-                    else:
-                        self.wrongLine(lineno, sline,
-                                       "unknown header line (%s) " % metakey)
+                    self._parseMetaLine(lineno, sline)
 
                     if sline[0:2] == '@A':
                         if data_line == 1:
                             comp_line = 1  # The mca data is the first line.
 
                         sline = sline[2:]
-                        self.reading_mca = True
-
-                        if self._find_oned:
-                            self._oneds.append(OneD())
-
-                        self.tmpmca = McaData()
-                        complete = self.tmpmca._addLine(sline)
+                        parsed.reading_mca = True
+
+                        if parsed._find_oned:
+                            parsed._oneds.append(OneD())
+
+                        parsed.tmpmca = McaData()
+                        parsed.tmpmca._lineno = lineno
+                        # the spectra come before their data line, or after
+                        # it if the first one came after the first line
+                        parsed.tmpmca._point = parsed._datalines
+                        if comp_line == 1:
+                            parsed.tmpmca._point -= 1
+                        complete = parsed.tmpmca._addLine(sline)
                         if complete:
-                            self._oneds[oned_idx].append(self.tmpmca)
-                            self.reading_mca = False
+                            if parsed.tmpmca._point not in rejected:
+                                parsed._oneds[oned_idx].append(parsed.tmpmca)
+                            parsed.reading_mca = False
                             oned_idx += 1
                 else:
                     data_line += 1
-                    if self.reading_mca:
-                        complete = self.tmpmca._addLine(sline)
+                    if parsed.reading_mca:
+                        complete = parsed.tmpmca._addLine(sline)
                         if complete:
-                            self._oneds[oned_idx].append(self.tmpmca)
-                            self.reading_mca = False
+                            if parsed.tmpmca._point not in rejected:
+                                parsed._oneds[oned_idx].append(parsed.tmpmca)
+                            parsed.reading_mca = False
                             oned_idx += 1
                     else:
                         oned_idx = 0
-                        try:
-                            try:
-                                dataline = list(map
-                                                (float, sline.strip().split()))
-                            except BaseException:
-                                self.wrongLine(lineno,
-                                               sline, "wrong data line")
-                                continue
-
-                            if len(dataline) != self._columns:
-                                self.wrongLine(
-                                    lineno, sline, "wrong number of columns")
-                            else:
-                                self._data.append(dataline)
-                                if len(self._data) == comp_line:
-                                    self._find_oned = False
-                        except ValueError:
-                            self.wrongLine(lineno, sline, "cannot parse line ")
+                        dataline = self._parseDataLine(lineno, sline)
+                        if dataline is None:
+                            self._rejectPoints([parsed._datalines], rejected)
+                        parsed._datalines += 1
+                        if dataline is not None:
+                            if usecols is not None:
+                                dataline = [dataline[i] for i in usecols]
+                            datarows.append(dataline)
+                            nbrows += 1
+                            if nbrows == comp_line:
+                                parsed._find_oned = False
+
+            if datarows:
+                datachunks.append(numpy.array(datarows, dtype=float))
+                datarows = []
+
+            yield datachunks
+
+    def _rejectPoints(self, points, rejected):
+        """
+        Drops the spectra already read of the data `points` whose line was
+        rejected, and adds them to the set `rejected` so that the spectra
+        written after the line are dropped too (see _iterChunks)
+        """
+        rejected.update(points)
+        for oned in self._getParsed()._oneds:
+            while oned and oned[-1]._point in rejected:
+                oned.pop()
+
+    def _parseMetaLine(self, lineno, sline):
+        widx = sline.find(" ")
+
+        metakey = sline[0]
+        metaval = sline[1:widx].strip()
+        content = sline[widx:].strip()
+
+        if metakey in self.linefuncs:
+            try:
+                getattr(self, self.linefuncs[metakey])(content.strip(),
+                                                       metaval)
+            except:
+                self.wrongLine(lineno, _ERR_LINE)
+        else:
+            self.wrongLine(lineno, _ERR_HEADERLINE)
 
-        self.is_parsed = True
+    def _iterLines(self, text):
+        """
+        Yields (_LINE, line) for each line in `text` except for runs of
+        numeric lines, which are yielded as (_DATARUN, run). When a run
+        starts with the continuation lines of an mca spectrum, those
+        are yielded together as (_MCALINES, lines)
+        """
+        parsed = self._getParsed()
+        pos = 0
+        for mat in _redatarun.finditer(text):
+            for sline in text[pos:mat.start()].split('\n')[:-1]:
+                yield _LINE, sline
+
+            datarun = mat.group()
+            if parsed.reading_mca:
+                mcaend = _mcaEnd(datarun)
+                if mcaend is None:
+                    yield _MCALINES, datarun
+                    datarun = ""
+                else:
+                    yield _MCALINES, datarun[:mcaend]
+                    datarun = datarun[mcaend:]
 
-        self.finalizeParsing()
+            if datarun:
+                yield _DATARUN, datarun
+
+            pos = mat.end()
+
+        lines = text[pos:].split('\n')
+        if not lines[-1]:
+            # nothing after the last line end
+            lines.pop()
+
+        for sline in lines:
+            yield _LINE, sline
+
+    def _parseDataRun(self, lines, linenos, chunks, usecols=None):
+        """
+        Parses a run of numeric lines with a single numpy call. The values
+        of the lines with the right number of columns are added to
+        `chunks` as one (nblines, nbcolumns) array. Lines that cannot
+        be converted are isolated and go through the line by line path.
+        With `usecols` only those columns (and the last one, so that
+        short lines are still detected) are converted, once the run has
+        been checked to hold only plain numbers in the right amount.
+        Returns the number of lines added
+        """
+        parsed = self._getParsed()
+        ncols = parsed._columns
+
+        if len(lines) < _BULK_MIN_LINES or not ncols:
+            rows = []
+            for lineno, sline in zip(linenos, lines):
+                dataline = self._parseDataLine(lineno, sline)
+                if dataline is not None:
+                    if usecols is not None:
+                        dataline = [dataline[i] for i in usecols]
+                    rows.append(dataline)
+            if rows:
+                chunks.append(numpy.array(rows, dtype=float))
+            return len(rows)
+
+        loadcols = None
+        if usecols is not None:
+            if not _plainFields(lines, ncols):
+                # let the full conversion sort out the bad lines
+                allcols = []
+                added = self._parseDataRun(lines, linenos, allcols)
+                chunks.extend(rows[:, usecols] for rows in allcols)
+                return added
+            loadcols = list(usecols) + [ncols - 1]
+
+        try:
+            rows = numpy.loadtxt(lines, dtype=float, comments=None, ndmin=2,
+                                 usecols=loadcols)
+        except ValueError:
+            nbfields = _fieldCounts(lines)
+            if (nbfields != ncols).any():
+                # lines with another number of fields are set apart, so
+                # that the others are still converted in one go
+                right = numpy.flatnonzero(nbfields == ncols)
+                wrong = numpy.flatnonzero(nbfields != ncols)
+                mark = len(parsed._error_lines)
+                added = self._parseDataRun([lines[i] for i in right],
+                                           [linenos[i] for i in right],
+                                           chunks, usecols)
+                self._wrongFields([lines[i] for i in wrong],
+                                  [linenos[i] for i in wrong], mark)
+                return added
+
+            # bad values
+            half = len(lines) // 2
+            return (self._parseDataRun(lines[:half], linenos[:half],
+                                       chunks, usecols) +
+                    self._parseDataRun(lines[half:], linenos[half:],
+                                       chunks, usecols))
+
+        if loadcols is not None:
+            rows = rows[:, :-1]
+        elif rows.shape[1] != ncols:
+            parsed._error_lines.extend(linenos)
+            parsed._error_codes.extend([_ERR_COLUMNS] * len(linenos))
+            parsed._contains_error = True
+            return 0
+
+        chunks.append(rows)
+        return len(rows)
+
+    def _wrongFields(self, lines, linenos, mark):
+        """
+        Records the errors of `lines`, that do not have the right number
+        of fields, in line order with the errors recorded from `mark` on
+        """
+        parsed = self._getParsed()
+        try:
+            numpy.array(' '.join(lines).split(), dtype=float)
+        except ValueError:
+            for lineno, sline in zip(linenos, lines):
+                self._parseDataLine(lineno, sline)
+        else:
+            parsed._error_lines.extend(linenos)
+            parsed._error_codes.extend([_ERR_COLUMNS] * len(linenos))
+            parsed._contains_error = True
+
+        errlines = parsed._error_lines
+        if mark < len(errlines) - len(linenos):
+            order = sorted(range(mark, len(errlines)),
+                           key=errlines.__getitem__)
+            errlines[mark:] = array.array('l', [errlines[i] for i in order])
+            codes = parsed._error_codes
+            codes[mark:] = array.array('B', [codes[i] for i in order])
+
+    def _parseDataLine(self, lineno, sline):
+        try:
+            dataline = list(map(float, sline.strip().split()))
+        except BaseException:
+            self.wrongLine(lineno, _ERR_DATALINE)
+            return None
+
+        if len(dataline) != self._getParsed()._columns:
+            self.wrongLine(lineno, _ERR_COLUMNS)
+            return None
+
+        return dataline
 
     def finalizeParsing(self):
         pass
 
-    def wrongLine(self, lineno, sline, errmsg):
-        self._wrong_lines.append([errmsg, sline])
-        line = "%s (%s)" % (lineno + 1, self.firstline + lineno + 1)
-        ermsg = "erroneous data / %s " % errmsg
-        self._error_messages.append([self._id, line, ermsg])
-        self._contains_error = True
+    def _getParsedState(self):
+        """
+        Returns the result of parsing the block as a picklable dictionary
+        """
+        state = dict((name, getattr(self, name)) for name in _PARSED_ATTRS)
+        state['_data'] = self._data
+        state['_oneds'] = [oned._getSpectra() for oned in self._oneds]
+        return state
+
+    def _setParsedState(self, state):
+        """
+        Sets the result of parsing the block elsewhere (see FileSpec.parseAll)
+        """
+        self.resetParsedData()
+        for name in _PARSED_ATTRS:
+            setattr(self, name, state[name])
+        self._data = state['_data']
+        self._data.flags.writeable = False
+        self._oneds = [OneD._fromSpectra(spectra)
+                       for spectra in state['_oneds']]
+        self.is_parsed = True
+        self.is_header_parsed = True
+        self.finalizeParsing()
+        self._touch()
+
+    def wrongLine(self, lineno, code):
+        """
+        Records an error in line `lineno` of the block. Messages are only
+        made when asked for (see getErrors)
+        """
+        parsed = self._getParsed()
+        parsed._error_lines.append(lineno)
+        parsed._error_codes.append(code)
+        parsed._contains_error = True
+
+    def getErrors(self, limit=_MAX_ERRORS):
+        """
+        Returns the errors found when parsing the block as [id, line,
+        message] lists. Only the first `limit` erroneous lines are
+        reported (all of them if None), followed by a count of the rest
+        """
+        nblines = len(self._error_lines)
+        if limit is not None:
+            nblines = min(nblines, limit)
+
+        errors = []
+        firstline = None
+        lines = None
+        for idx in range(nblines):
+            lineno = self._error_lines[idx]
+            code = self._error_codes[idx]
+            errmsg = _ERROR_TEXTS[code]
+            if code in (_ERR_LINE, _ERR_HEADERLINE):
+                # the line key is taken again from the block
+                if lines is None:
+                    lines = self.getText().split('\n')
+                sline = lines[lineno]
+                if sline[:1] == '#':
+                    sline = sline[1:]
+                errmsg = errmsg % sline[:1]
+            if firstline is None:
+                firstline = self.getFirstLine()
+            line = "%s (%s)" % (lineno + 1, firstline + lineno + 1)
+            errors.append([self._id, line, "erroneous data / %s " % errmsg])
+
+        if nblines < len(self._error_lines):
+            errors.append([self._id, "", "%d more erroneous lines" %
+                           (len(self._error_lines) - nblines)])
+
+        errors.extend(self._error_messages)
+        return errors
+
+    get_errors = getErrors
 
     def setFileName(self, filename):
         self._filename = filename
@@ -524,8 +2425,8 @@ class FileBlock:
         """
         Returns the date when the scan was started
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return self._date
 
     @property
@@ -553,8 +2454,8 @@ class FileBlock:
         Returns the name of the spec application
         from which the file was created
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
 
         return self.getUserSpec()[1]
 
@@ -566,21 +2467,29 @@ class FileBlock:
         """
         Returns the name of the unix user that created the file
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
 
         return self.getUserSpec()[0]
 
 
+for _name in _ParsedBlock.__slots__:
+    setattr(FileBlock, _name, _parsedAttribute(_name))
+del _name
+
+
 class Header(FileBlock):
     """
     Class representing a file header.
     """
 
-    def __init__(self, start, firstline):
-        FileBlock.__init__(self, start, firstline)
+    __slots__ = ()
 
-    def end(self):
+    def __init__(self, source, start):
+        FileBlock.__init__(self, source, start)
+
+    def end(self, endpos):
+        FileBlock.end(self, endpos)
         self.parse()
 
 
@@ -589,14 +2498,106 @@ class Scan(FileBlock):
     Scan class documentation
     """
 
-    def __init__(self, start, firstline):
-        FileBlock.__init__(self, start, firstline)
+    __slots__ = ('_fileheader', '_numberinfile', '_order', '_nbcolumns',
+                 '_labelline', '_number', '_command', '_index', '_colcache',
+                 '_stats')
+
+    def __init__(self, source, start):
+        FileBlock.__init__(self, source, start)
         self._fileheader = None
         self._numberinfile = -1
         self._order = 1
 
-    def end(self):
+        # from #N and #L lines found while indexing
+        self._nbcolumns = None
+        self._labelline = None
+
+        # data columns read on their own (see getColumn)
+        self._colcache = None
+
+        # column statistics kept from parsing (see FileSpec.getScanTable)
+        self._stats = None
+
+    def end(self, endpos):
+        FileBlock.end(self, endpos)
+        if self._parsed is None or self._feeder is None:
+            self.resetParsedData()
+            self._colcache = None
+            self._stats = None
+
+    def _startFeed(self):
+        """
+        Starts parsing the scan piece by piece, as it is written
+        """
         self.resetParsedData()
+        self._feedtexts = collections.deque()
+        self._feeder = self._iterChunks(iter(self._feedtexts.popleft, None))
+        self._fedpos = self.start
+        self._data = numpy.empty((0, 0))
+        self.is_parsed = True
+        self.is_header_parsed = True
+
+    def _feed(self, final=False):
+        """
+        Parses the complete lines added to the scan since the last call,
+        all the rest of the scan if `final`
+        """
+        end = self.start + self.length
+        buf = self._source.readBytes(self._fedpos, end - self._fedpos)
+        if not final:
+            buf = buf[:buf.rfind(b'\n') + 1]
+
+        if not buf:
+            return
+
+        self._fedpos += len(buf)
+        self._feedtexts.append(_decode(buf))
+        chunks = next(self._feeder)
+
+        if chunks:
+            self._appendData(numpy.concatenate(chunks))
+        elif not len(self._data):
+            self._data = numpy.empty((0, self._columns))
+            self._data.flags.writeable = False
+
+        for oned in self._oneds:
+            for mcadata in oned._decode():
+                self.wrongLine(mcadata._lineno, _ERR_MCA)
+
+        self.finalizeParsing()
+        if self._scancache is not None:
+            # measured again, as it grew
+            self._scancache.discard(self)
+            self._touch()
+
+    def _stopFeed(self):
+        """
+        Parses what is left of the scan. The scan is then parsed as if
+        parse() had been called
+        """
+        self._feed(final=True)
+        self._feeder = None
+        self._feedtexts = None
+        self._stats = _columnStats(self._data)
+
+    def _appendData(self, rows):
+        """
+        Adds rows to the data of the scan. The data is a view of a larger
+        buffer so that rows can be added without copying the data each time
+        """
+        nbrows = len(self._data)
+        total = nbrows + len(rows)
+        buf = self._databuf
+
+        if buf is None or len(buf) < total:
+            buf = numpy.empty((max(2 * total, 64), rows.shape[1]))
+            if nbrows:
+                buf[:nbrows] = self._data
+            self._databuf = buf
+
+        buf[nbrows:total] = rows
+        self._data = buf[:total]
+        self._data.flags.writeable = False
 
     def finalizeParsing(self):
 
@@ -608,22 +2609,49 @@ class Scan(FileBlock):
 
         if not labels:
             ermsg = "no motor names"
-            self._error_messages.append([self._id, "", ermsg])
-            self._contains_error = True
             poserr = True
 
         elif len(labels) != len(poss):
             ermsg = "number of motor labels and positions are different"
+            poserr = True
+
+        # a scan being followed is finalized after each new piece
+        if poserr and [self._id, "", ermsg] not in self._error_messages:
             self._error_messages.append([self._id, "", ermsg])
             self._contains_error = True
-            poserr = True
 
         if not poserr:
             self.motor_positions_list = list(zip(labels, poss))
 
+        if self.is_parsed and self._feeder is None:
+            self._stats = _columnStats(self._data)
+            # the columns read on their own are now in the data
+            self._colcache = None
+
+    def _getParsedBytes(self):
+        nbytes = FileBlock._getParsedBytes(self)
+        if self._colcache:
+            nbytes += sum(col.nbytes for col in self._colcache.values())
+        return nbytes
+
+    def _releaseData(self):
+        FileBlock._releaseData(self)
+        self._colcache = None
+
     def _setFileHeader(self, header):
         self._fileheader = header
 
+    def _setIndexColumns(self, content):
+        if self._nbcolumns is None:
+            try:
+                self._nbcolumns = int(content)
+            except ValueError:
+                pass
+
+    def _setIndexLabels(self, content):
+        if self._labelline is None:
+            self._labelline = content
+
     def _setScanIndex(self, idx):
         self._index = idx
 
@@ -668,6 +2696,33 @@ class Scan(FileBlock):
     def getNumberInFile(self):
         return self._numberinfile
 
+    def _countDataLines(self):
+        """
+        Returns the number of data lines in the scan that the parse
+        accepts (see _iterChunks), without parsing them
+        """
+        ncols = self.getColumns()
+        lines = []
+        reading_mca = False
+        for sline in self.getText().split('\n'):
+            if sline[:1] == '#':
+                sline = sline[1:]
+            if not sline:
+                continue
+            if sline[0] in _METACHARS:
+                if sline[0:2] == '@A':
+                    reading_mca = sline.strip().endswith('\\')
+            elif reading_mca:
+                reading_mca = sline.strip().endswith('\\')
+            elif len(sline.split()) == ncols:
+                lines.append(sline)
+
+        try:
+            numpy.array(' '.join(lines).split(), dtype=float)
+        except ValueError:
+            return len([sline for sline in lines if _isNumeric(sline)])
+        return len(lines)
+
     @property
     def nb_points(self):
         return self.getLines()
@@ -676,6 +2731,10 @@ class Scan(FileBlock):
         """
         Returns number of data lines
         """
+        if not self.is_parsed:
+            self.parse()
+
+        self._touch()
         return len(self._data)
 
     @property
@@ -686,10 +2745,77 @@ class Scan(FileBlock):
         """
         Returns number of columns from scan header
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            if self._nbcolumns:
+                return self._nbcolumns
+            if self._labelline is not None:
+                return len(re.split(r'\s\s+', self._labelline))
+            self.parseHeader()
         return self._columns
 
+    get_columns = getColumns
+
+    def getColumn(self, label):
+        """
+        Returns the data of one column, given by its label or its index.
+        Only that field of each data line is converted when the scan is
+        not parsed yet, and the result is kept for later calls
+        """
+        return self._readColumns([self._getColumnIndex(label)])[:, 0]
+
+    get_column = getColumn
+
+    def getColumnData(self, labels):
+        """
+        Returns the data of the columns given by their labels or indices
+        as a (points, len(labels)) array (see getColumn)
+        """
+        indices = [self._getColumnIndex(label) for label in labels]
+        return self._readColumns(indices)
+
+    get_column_data = getColumnData
+
+    def _getColumnIndex(self, label):
+        if isinstance(label, (int, numpy.integer)):
+            if not 0 <= label < self.getColumns():
+                raise ValueError("scan %s has no column %d" %
+                                 (self.getNumber(), label))
+            return label
+
+        labels = self.getLabels() or []
+        if label not in labels:
+            raise ValueError("scan %s has no column labelled %s" %
+                             (self.getNumber(), label))
+        return labels.index(label)
+
+    def _readColumns(self, indices):
+        if self.is_parsed:
+            self._touch()
+            return self._data[:, indices]
+
+        if self._colcache is None:
+            self._colcache = {}
+
+        missing = sorted(set(indices).difference(self._colcache))
+        if missing:
+            # the header parsed before is kept, not the partial parse
+            header = self._parsed if self.is_header_parsed else None
+
+            # values in the other columns are not checked
+            data = self._parseBlock(usecols=missing)
+            self.resetParsedData()
+            if header is not None:
+                self._parsed = header
+                self.is_header_parsed = True
+
+            for idx, col in zip(missing, data.T):
+                self._colcache[idx] = col
+            self._touch()
+
+        if not indices:
+            return numpy.empty((0, 0))
+        return numpy.column_stack([self._colcache[idx] for idx in indices])
+
     @property
     def labels(self):
         return self.getLabels()
@@ -698,8 +2824,10 @@ class Scan(FileBlock):
         """
         Returns the labels for the data columns
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            if self._labelline is not None:
+                return re.split(r'\s\s+', self._labelline)
+            self.parseHeader()
         return self._labels
 
     @property
@@ -721,8 +2849,8 @@ class Scan(FileBlock):
         """
         Returns a list with motor names
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
 
         if self._motor_labels:
             return self._motor_labels
@@ -740,8 +2868,8 @@ class Scan(FileBlock):
         Returns a list with motor mnemonics. Motor mnemonics are saved
         in files only since spec version 6.0.10
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
 
         if self._motor_mnes:
             return self._motor_mnes
@@ -759,8 +2887,8 @@ class Scan(FileBlock):
         Returns a list with counter names. Counter names are saved
         in files only since spec version 6.0.10
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
 
         if self._counter_labels:
             return self._counter_labels
@@ -778,8 +2906,8 @@ class Scan(FileBlock):
         Returns a list with counter mnemonics. Counter mnemonics are saved
         in files only since spec version 6.0.10
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
 
         if self._counter_mnes:
             return self._counter_mnes
@@ -797,8 +2925,8 @@ class Scan(FileBlock):
         Returns a dictionary with motor names and positions.
         These are the positions of the motors when the scan was started
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
 
         return self.motor_positions_list
 
@@ -826,8 +2954,8 @@ class Scan(FileBlock):
         """
         Returns the date when the scan was started
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return self._date
 
     @property
@@ -866,8 +2994,8 @@ class Scan(FileBlock):
         Returns geometry values as saved in the file.
         Check the spec documentation for the meaning of these values
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return [' '.join(line) for line in self._geo_pars]
 
     @property
@@ -878,8 +3006,8 @@ class Scan(FileBlock):
         """
         Returns a list with HKL values at the beginning of the scan
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return self._qvalue
 
     @property
@@ -906,8 +3034,8 @@ class Scan(FileBlock):
         Returns a list with two values: counting time and units
         if time units cannot be found in file the units value is left empty
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return self._count_time
 
     @property
@@ -919,8 +3047,8 @@ class Scan(FileBlock):
         Returns comments in the scan.
         Aborted termination can be found in this way
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return self._comment_lines
 
     @property
@@ -928,8 +3056,8 @@ class Scan(FileBlock):
         return self.getUserLines()
 
     def getUserLines(self):
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return self._user_lines
 
     @property
@@ -941,13 +3069,13 @@ class Scan(FileBlock):
         Returns extra lines starting with "@" character.
         These are normally lines related with MCA data
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return self.getExtraLines()
 
     def getExtraLines(self):
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         return [' '.join(line) for line in self._extra_lines]
 
     @property
@@ -956,10 +3084,13 @@ class Scan(FileBlock):
 
     def getMeta(self):
         """
-        Returns a dictionary with the most relevant metdata information
+        Returns a dictionary with the most relevant metdata information.
+        The data is not parsed for it: until it is, the number of points
+        is the number of data lines and errors in data lines are not
+        reported
         """
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
 
         meta = {
             'spec':   "",
@@ -985,7 +3116,10 @@ class Scan(FileBlock):
         meta["comments"] = self.getComments()
         meta["order"] = self.getOrder()
         meta["noinfile"] = self.getNumberInFile()
-        meta["points"] = self.getLines()
+        if self.is_parsed:
+            meta["points"] = self.getLines()
+        else:
+            meta["points"] = self._countDataLines()
         meta["columns"] = self.getColumns()
         meta["userlines"] = self.getUserLines()
         meta["geo"] = self.getGeometry()
@@ -996,7 +3130,7 @@ class Scan(FileBlock):
             meta["motormnes"] = self.getMotorMnemonics()
 
         if self._contains_error:
-            meta['errors'] = self._error_messages
+            meta['errors'] = self.getErrors()
 
         return meta
 
@@ -1006,15 +3140,108 @@ class Scan(FileBlock):
 
     def getData(self):
         """
-        Returns a numpy array with all data in the scan
+        Returns a numpy array with all data in the scan.
+        The array is kept by the scan and is read-only
         """
         if not self.is_parsed:
             self.parse()
 
-        if self._data:
-            return numpy.array(self._data, dtype=float)
-        else:
-            return numpy.empty((0, self._columns))
+        self._touch()
+        return self._data
+
+    def _takeSpectra(self, allspectra, points):
+        """
+        Moves the spectra of the first `points` data lines out of the
+        OneDs, decoded, to the lists in `allspectra`. The others are
+        left, as they are dropped if their line is rejected
+        """
+        for idx, oned in enumerate(self._oneds):
+            nbdone = len(oned)
+            while nbdone and oned[nbdone - 1]._point >= points:
+                nbdone -= 1
+            done = OneD(oned[:nbdone])
+            del oned[:nbdone]
+
+            if idx == len(allspectra):
+                allspectra.append([])
+            for mcadata in done._decode():
+                self.wrongLine(mcadata._lineno, _ERR_MCA)
+            allspectra[idx].extend(mcadata._data for mcadata in done)
+
+    def iterPoints(self, chunk=1000, mcas=False):
+        """
+        Yields the data of the scan in arrays of `chunk` rows (the last
+        one can be shorter). If the scan is not parsed, the rows are
+        parsed from the file as they are needed and the scan is left
+        unparsed, so that scans larger than memory can be processed.
+        With `mcas`, yields (rows, spectra) with a (rows, nb_channels)
+        array in `spectra` for each OneD channel (see OneD.getData),
+        holding the spectra that go with those rows
+        """
+        if self.is_parsed:
+            self._touch()
+            allspectra = [oned._getSpectra() for oned in self._oneds]
+            for pos in range(0, len(self._data), chunk):
+                rows = self._data[pos:pos + chunk]
+                if mcas:
+                    yield rows, [_stackSpectra(spectra[pos:pos + chunk])
+                                 for spectra in allspectra]
+                else:
+                    yield rows
+            return
+
+        # a scan of its own does the parsing. this one is not modified
+        reader = Scan(self._source, self.start)
+        reader.length = self.length
+
+        rows = None
+        allspectra = []
+
+        for chunks in reader._iterChunks(reader._iterText()):
+            if rows is not None:
+                chunks.insert(0, rows)
+            if chunks:
+                rows = numpy.concatenate(chunks)
+
+            # spectra are decoded as they come and dropped from the OneDs
+            if mcas:
+                reader._takeSpectra(allspectra, reader._datalines)
+            else:
+                for oned in reader._oneds:
+                    del oned[:]
+
+            if rows is None:
+                continue
+
+            ready = len(rows)
+            if allspectra:
+                ready = min([ready] + [len(spectra) for spectra in allspectra])
+            ready -= ready % chunk
+
+            for pos in range(0, ready, chunk):
+                if mcas:
+                    yield rows[pos:pos + chunk], \
+                        [_stackSpectra(spectra[pos:pos + chunk])
+                         for spectra in allspectra]
+                else:
+                    yield rows[pos:pos + chunk]
+
+            rows = rows[ready:]
+            allspectra = [spectra[ready:] for spectra in allspectra]
+
+        if rows is None:
+            return
+
+        # as from a parsed scan, spectra after the last row are left out
+        for pos in range(0, len(rows), chunk):
+            if mcas:
+                yield rows[pos:pos + chunk], \
+                    [_stackSpectra(spectra[pos:pos + chunk])
+                     for spectra in allspectra]
+            else:
+                yield rows[pos:pos + chunk]
+
+    iter_points = iterPoints
 
     @property
     def nb_mcas(self):
@@ -1039,6 +3266,7 @@ class Scan(FileBlock):
         """
         if not self.is_parsed:
             self.parse()
+        self._touch()
         result = []
         for mcas in self._oneds:
             result += mcas
@@ -1059,6 +3287,7 @@ class Scan(FileBlock):
     def getOneD(self, idx):
         if not self.is_parsed:
             self.parse()
+        self._touch()
         return self._oneds[idx]
 
     get_mca = getOneD
@@ -1068,8 +3297,8 @@ class Scan(FileBlock):
         self._order = order
 
     def __str__(self):
-        if not self.is_parsed:
-            self.parse()
+        if not self.is_header_parsed:
+            self.parseHeader()
         if self._order > 1:
             return "%s.%s %s" % (self._number, self._order, self._command)
         else:
@@ -1078,8 +3307,12 @@ class Scan(FileBlock):
     def save(self, outfile, format="spec",
              append=False, columns=None, mcas=False):
         """ scan.save method produces a simple output meant to export scan
-data to format readable by excel and other programs
+data to format readable by excel and other programs.
+Formats "npz" and "h5" save the data in binary form (see saveScans)
 """
+        if format in ("npz", "h5"):
+            saveScans([self], outfile, format=format, append=append)
+            return
 
         data = self.getData()
         meta = {}
@@ -1088,11 +3321,6 @@ data to format readable by excel and other programs
         meta['number'] = self.getNumber()
         meta['columns'] = data.shape[1]
 
-        if append:
-            ofd = open(outfile, "a")
-        else:
-            ofd = open(outfile, "w")
-
         if format == "tabs":
             labsep = "\t"
             datsep = "\t"
@@ -1109,11 +3337,16 @@ data to format readable by excel and other programs
 #N %(columns)s
 #L """ % meta
 
-        ofd.write(first + labsep.join(self.getLabels()) + "\n")
-        for row in range(data.shape[0]):
-            outline = datsep.join(["%.12g" % val for val in data[row]]) + "\n"
-            ofd.write(outline)
-        ofd.write("\n")
+        # rows are formatted and written a block at a time
+        rowfmt = datsep.join(["%.12g"] * data.shape[1]) + "\n"
+
+        with open(outfile, append and "a" or "w") as ofd:
+            ofd.write(first + labsep.join(self.getLabels()) + "\n")
+            for pos in range(0, data.shape[0], _SAVE_ROWS):
+                block = data[pos:pos + _SAVE_ROWS]
+                ofd.write((rowfmt * len(block)) %
+                          tuple(block.ravel().tolist()))
+            ofd.write("\n")
 
 
 class McaData:
@@ -1122,15 +3355,19 @@ class McaData:
     """
 
     def __init__(self):
-        self._data = []
+        self._data = numpy.empty(0)
+        self._text = []
         self._calib = None
+        self._lineno = -1
+        # index of the data line the spectrum goes with
+        self._point = -1
 
     @property
     def calib(self):
         return self.getCalib()   
 
     def getCalib(self):
-        return self.calib
+        return self._calib
 
     @calib.setter
     def calib(self, calib):
@@ -1144,16 +3381,16 @@ class McaData:
         return self.getData()
 
     def getData(self, calibrated=False):
-        channels = list(range(len(self._data)))
+        channels = numpy.arange(len(self._data), dtype=float)
 
         if calibrated and self._calib:
             a, b, c = self._calib
-            indexes = [(a + b*x + c*x**2) for x in channels]
+            indexes = a + channels * (b + c * channels)
         else:
             indexes = channels
 
-        if self._data:
-            return numpy.array([indexes, self._data], dtype=float).transpose()
+        if len(self._data):
+            return numpy.column_stack((indexes, self._data))
         else:
             return numpy.empty((0, 1))
 
@@ -1161,16 +3398,30 @@ class McaData:
         return len(self._data)
 
     def _addLine(self, line):
-        if line.strip()[-1] == "\\":
-            dataline = line.strip()[:-1]
+        if line.strip().endswith("\\"):
+            self._text.append(line.strip()[:-1])
             complete = False
         else:
-            dataline = line
+            self._text.append(line)
             complete = True
 
-        self._data.extend(list(map(float, dataline.split())))
         return complete
 
+    def _addLines(self, lines):
+        """
+        Adds several newline terminated lines of the spectrum at once
+        """
+        self._text.append(lines.replace("\\", " ").replace("\n", " "))
+        lastline = lines[:-1].rsplit("\n", 1)[-1]
+        return not lastline.strip().endswith("\\")
+
+    def _getText(self):
+        return " ".join(self._text)
+
+    def _setData(self, data):
+        self._data = data
+        self._text = None
+
 
 class OneD(list):
     """
@@ -1178,16 +3429,82 @@ class OneD(list):
     It has a list of McaData objects.
     """
 
+    def __init__(self, *args):
+        list.__init__(self, *args)
+        self._array = None
+
     @property
     def data(self):
         return self.getData()
 
     def getData(self):
-        data = []
-        for mcadata in self:
-            raw_data = mcadata.getData().transpose()[1].tolist()
-            data.append(raw_data)
-        return numpy.array(data, dtype=float)
+        """
+        Returns a (nb_spectra, nb_channels) numpy array with all spectra.
+        The array is shared with the McaData objects and is read-only
+        """
+        if self._array is None or len(self._array) != len(self):
+            self._array = numpy.array([mcadata._data for mcadata in self],
+                                      dtype=float)
+            self._array.flags.writeable = False
+        return self._array
+
+    def _getSpectra(self):
+        if self._array is not None:
+            return self._array
+        return [mcadata._data for mcadata in self]
+
+    @classmethod
+    def _fromSpectra(cls, spectra):
+        oned = cls()
+        for spectrum in spectra:
+            mcadata = McaData()
+            mcadata._setData(spectrum)
+            oned.append(mcadata)
+
+        if isinstance(spectra, numpy.ndarray):
+            spectra.flags.writeable = False
+            oned._array = spectra
+
+        return oned
+
+    def _decode(self):
+        """
+        Converts the text of the spectra not converted yet, in one
+        (nb_spectra, nb_channels) array. Spectra with a different number
+        of channels than the first one are converted one by one. Returns
+        the McaData objects whose text could not be converted.
+        """
+        pending = [mcadata for mcadata in self if mcadata._text is not None]
+        if not pending:
+            return []
+
+        try:
+            array = numpy.loadtxt([mcadata._getText() for mcadata in pending],
+                                  dtype=float, comments=None, ndmin=2)
+        except ValueError:
+            array = None
+
+        if array is not None and len(array) == len(pending):
+            array.flags.writeable = False
+            if len(pending) == len(self):
+                self._array = array
+            else:
+                self._array = None
+            for mcadata, spectrum in zip(pending, array):
+                mcadata._setData(spectrum)
+            return []
+
+        wrong = []
+        for mcadata in pending:
+            try:
+                spectrum = numpy.array(mcadata._getText().split(), dtype=float)
+            except ValueError:
+                spectrum = numpy.empty(0)
+                wrong.append(mcadata)
+            mcadata._setData(spectrum)
+
+        self._array = None
+        return wrong
 
 
 if __name__ == '__main__':
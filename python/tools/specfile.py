@@ -58,35 +58,46 @@ version = "1.0"
 
 import sys
 import os
+import re
+import glob
+import shutil
 import getopt
+import multiprocessing
+import numpy
 
 SPECD='/usr/local/lib/spec.d'
 specd = os.environ.get('SPECD', SPECD)
 sys.path.append( specd )
 
 try:
-   from pyspec.file.spec import FileSpec
+   from pyspec.file.spec import FileSpec, saveScans
 except ImportError:
    print("Cannot find filespec module. Try setting SPECD variable")
    sys.exit(0)
 
-outformats = ['csv', 'tabs', 'spec']
+outformats = ['csv', 'tabs', 'spec', 'npz', 'h5']
+binformats = ['npz', 'h5']
 
 def printUsage(msg=None, longmode=False):
     if msg:
        print(msg)
 
     if not longmode:
-       print("""Usage: %(progname)s [options] filename [scanlist] 
+       print("""Usage: %(progname)s [options] filename [filename ...] [scanlist] 
    type \"%(progname)s -h\" for a detailed help """ % {'progname': os.path.basename(sys.argv[0])} )
     else:
        print("""
-Usage: %(progname)s [options] filename [scanlist]
+Usage: %(progname)s [options] filename [filename ...] [scanlist]
+
+Several input files, or glob patterns such as "data/*.dat", can be given.
+The scan selection applies to all of them.
 
 Options are: 
   -f format
-      Format of the output files. Format can be one out of "tabs", "csv" or "spec"
-      Default output format is "tabs"
+      Format of the output files. Format can be one out of "tabs", "csv", "spec",
+      "npz" or "h5". Default output format is "tabs"
+      "npz" (numpy) and "h5" (HDF5) formats save one array per column, the MCA
+      spectra and the scan metadata of each scan
 
   -O 
       Do not overwrite existing files. By default %(progname)s will overwrite existing files
@@ -94,6 +105,8 @@ Options are:
 
   -S 
       Use single file for output. Useful particularly in the case of "spec" output format
+      When the scans of several files go to the same "npz" or "h5" file, each scan
+      is saved under the name of its file ("<file>/<number>.<order>")
 
   -p  prefix
       Use `prefix` as prefix for output files
@@ -113,6 +126,10 @@ Options are:
   -a 
       Extract all scans in the file
 
+  -j  jobs
+      Export the scans in `jobs` parallel processes. With -S each process
+      writes part of the bundle and the parts are joined in scan order
+
   -h 
       Prints this help and exits
 
@@ -132,6 +149,7 @@ Specifying a scanlist:
      %(progname)s myfile.dat 3,6:12,37
      %(progname)s myfile.dat 3 6:12 37
      %(progname)s myfile.dat 3,6:12 37
+     %(progname)s -j 4 -a "run*.dat"
  
   Remember you can also use the "-a" flag to extract all scans in a file
 
@@ -194,12 +212,120 @@ def formatScanList(scanlist, condensed=True):
 
     return strlist
 
+def splitArgs(args):
+    """
+    Separates input files, with glob patterns expanded, from the
+    scan selection arguments
+    """
+    filenames = []
+    scanargs = []
+
+    for arg in args:
+        if re.match(r'^[\d.,:\s]+$', arg) and not os.path.exists(arg):
+            scanargs.append(arg)
+        elif glob.has_magic(arg):
+            matches = sorted(glob.glob(arg))
+            if not matches:
+                print("No files match %s." % arg)
+            filenames.extend(matches)
+        else:
+            filenames.append(arg)
+
+    return filenames, scanargs
+
+def outputName(outdir, prefix, scanno, suffix, taken, overwrite):
+    """
+    Returns the output file for a scan. Unless `overwrite` is set, an
+    alternative name is found if the file exists or was already given
+    in this run (names in `taken`)
+    """
+    outfile = os.path.join( outdir, "%s_%s.%s" % ( prefix, scanno, suffix ))
+
+    if not overwrite:
+        tryno = 0
+        while os.path.exists(outfile) or outfile in taken:
+            tryno += 1
+            outfile = os.path.join( outdir, "%s_%s-%d.%s" % ( prefix, scanno, tryno, suffix ))
+
+    taken.add(outfile)
+    return outfile
+
+# files indexed by this process, by name
+_filespecs = {}
+
+def exportScans(task):
+    """
+    Exports the scans in `task`. Each task is done by one process, which
+    indexes each input file only once
+    """
+    filename, scankeys, outfiles, outformat, bundle, keyprefix = task
+
+    fs = _filespecs.get(filename)
+    if fs is None:
+        fs = _filespecs[filename] = FileSpec(filename)
+
+    scans = [ fs.getScanByNumber(sno, sord) for sno, sord in scankeys ]
+
+    if bundle is None:
+        for scan, outfile in zip(scans, outfiles):
+            scan.save(outfile, format=outformat)
+    elif outformat in binformats:
+        saveScans(scans, bundle, format=outformat, prefix=keyprefix)
+    else:
+        for scan in scans:
+            scan.save(bundle, format=outformat, append=True)
+
+def _copyGroups(src, dst):
+    """
+    Copies the scans in HDF5 group `src` to `dst`, joining the groups
+    of the files they come from
+    """
+    for key in src:
+        item = src[key]
+        if key in dst and "meta" not in item.attrs:
+            _copyGroups(item, dst[key])
+        else:
+            src.copy(item, dst, name=key)
+
+def mergeParts(parts, bundle, outformat):
+    """
+    Joins the bundle parts written by the worker processes, in order,
+    and removes them
+    """
+    if outformat in binformats and len(parts) == 1:
+        os.rename(parts[0], bundle)
+        return
+
+    if outformat == "npz":
+        arrays = {}
+        for part in parts:
+            with numpy.load(part) as npz:
+                for key in npz.files:
+                    arrays[key] = npz[key]
+        with open(bundle, "wb") as ofd:
+            numpy.savez(ofd, **arrays)
+    elif outformat == "h5":
+        import h5py
+        with h5py.File(bundle, "w") as ofd:
+            for part in parts:
+                with h5py.File(part, "r") as ifd:
+                    _copyGroups(ifd, ofd)
+    else:
+        with open(bundle, "ab") as ofd:
+            for part in parts:
+                with open(part, "rb") as ifd:
+                    shutil.copyfileobj(ifd, ofd)
+
+    for part in parts:
+        os.remove(part)
+
 def main():
 
     outformat = "tabs"
     suffix    = None
     prefix    = None
     outdir    = None
+    jobs      = 1
 
     overw_flag  = False
     single_flag = False
@@ -211,7 +337,7 @@ def main():
        sys.exit(0)
 
     try:
-       optlist, args = getopt.getopt(sys.argv[1:], "f:s:p:d:alLOShV")
+       optlist, args = getopt.getopt(sys.argv[1:], "f:s:p:d:j:alLOShV")
     except:
        printUsage(msg="wrong usage")
        sys.exit(1)
@@ -231,6 +357,12 @@ def main():
             suffix = a
         elif o == '-d':
             outdir = a
+        elif o == '-j':
+            try:
+                jobs = int(a)
+            except ValueError:
+                printUsage(msg="Wrong number of jobs %s" % a)
+                sys.exit(1)
         elif o == "-l":
             list_flag = True
             condensed = True
@@ -252,97 +384,163 @@ def main():
         printUsage( msg="Wrong output format specified. Valid formats are %s" % ",".join(outformats))
         sys.exit(1)
 
-    filename = args[0]
+    if outformat == "h5":
+        try:
+            import h5py
+        except ImportError:
+            print("Output format h5 needs the h5py python module")
+            sys.exit(1)
 
-    if len(args) > 1:
-       scanargs = " ".join( args[1:] )
-    else:
-       scanargs = None
+    filenames, scanargs = splitArgs(args)
 
-    # check if file exists and it is plain and readable file
-    if not os.path.exists(filename):
-        print("File %s does not exist." % filename) 
+    if not filenames:
+        printUsage("You should specify an input filename")
         sys.exit(1)
 
-    # open file. check if any scan could  be indexed
-    try:
-        fs = FileSpec(filename)
-    except:
-        import traceback
-        traceback.print_exc()
-        print("Cannot index file %s." % filename)
-        sys.exit(1)
-
-    if len(fs) <= 0:
-        print("Cannot index file %s." % filename)
-        sys.exit(1)
-
-    if list_flag:
-        scanlist = [ scan.getNumber() for scan in fs ]
-        strlist = formatScanList( scanlist, condensed=condensed )
-        print(strlist)
-        sys.exit(0)
-
     # prepare the scan list to extract
     scanlist = None
-    if scanargs is not None:
+    if scanargs:
        #try: 
-          scanlist = parseScanArgs( scanargs ) 
+          scanlist = parseScanArgs( " ".join(scanargs) ) 
        #except:
           #print("Wrong scan selection")
           #sys.exit(1)
-       
-    scans = []
-    if scanlist:
-       for scanno in scanlist:
-           sparts = scanno.split(".")
-           sno  = int(sparts[0])
-           if len(sparts) > 1:
-              sord = int(sparts[1])
-           else:
-              sord = 0
-           scan = fs.getScanByNumber( int(sno), int(sord) ) 
-           if scan:
-              scans.append( scan ) 
-           else:
-              print("Cannot find scan %d(%d) in file %s" % (sno,sord,filename))
-    else:
-       if all_flag:
-          # extract them all
-          scans = [ scan for scan in fs ]
-
-    inprefix = os.path.splitext( os.path.basename( filename ))[0]
-
-    if not outdir:
-       outdir = inprefix
 
     if not suffix:
        if outformat == "csv":
           suffix = "csv"
+       elif outformat in binformats:
+          suffix = outformat
        else:
           suffix = "dat"
 
-    if not prefix:
-        prefix = inprefix
+    status = 0
+
+    # tasks in output order: scans of a file are split in batches
+    tasks = []
+    bundles = []
+    taken = set()
+
+    for filename in filenames:
+
+        # check if file exists and it is plain and readable file
+        if not os.path.exists(filename):
+            print("File %s does not exist." % filename) 
+            status = 1
+            continue
+
+        # open file. check if any scan could  be indexed
+        try:
+            fs = FileSpec(filename)
+        except:
+            import traceback
+            traceback.print_exc()
+            print("Cannot index file %s." % filename)
+            status = 1
+            continue
+
+        if len(fs) <= 0:
+            print("Cannot index file %s." % filename)
+            status = 1
+            continue
+
+        _filespecs[filename] = fs
+
+        if list_flag:
+            scannos = [ scan.getNumber() for scan in fs ]
+            strlist = formatScanList( scannos, condensed=condensed )
+            if len(filenames) > 1:
+                strlist = "%s: %s" % (filename, strlist)
+            print(strlist)
+            continue
+
+        scans = []
+        if scanlist:
+           for scanno in scanlist:
+               sparts = scanno.split(".")
+               sno  = int(sparts[0])
+               if len(sparts) > 1:
+                  sord = int(sparts[1])
+               else:
+                  sord = 0
+               scan = fs.getScanByNumber( int(sno), int(sord) ) 
+               if scan:
+                  scans.append( scan ) 
+               else:
+                  print("Cannot find scan %d(%d) in file %s" % (sno,sord,filename))
+        else:
+           if all_flag:
+              # extract them all
+              scans = [ scan for scan in fs ]
 
-    if not os.path.exists(outdir):
-       os.makedirs(outdir)
+        if not scans:
+            continue
 
-    for scan in scans:
- 
-       if single_flag:
-          outfile = os.path.join( outdir, "%s_bundle.%s" % ( prefix, suffix ))
-       else:
-          outfile = os.path.join( outdir, "%s_%s.%s" % ( prefix, scan.getNumber(), suffix ))
+        inprefix = os.path.splitext( os.path.basename( filename ))[0]
 
-       # find alternative name if not set to overwrite
-       if not overw_flag and not single_flag:
-          tryno = 0
-          while os.path.exists(outfile):
-             tryno += 1
-             outfile = os.path.join( outdir, "%s_%s-%d.%s" % ( prefix, scan.getNumber(), tryno, suffix )) 
+        fileoutdir = outdir or inprefix
+        fileprefix = prefix or inprefix
+
+        if not os.path.exists(fileoutdir):
+           os.makedirs(fileoutdir)
+
+        scankeys = [ (scan.getNumber(), scan.getOrder()) for scan in scans ]
+
+        if single_flag:
+            bundle = os.path.join( fileoutdir, "%s_bundle.%s" % ( fileprefix, suffix ))
+            if bundle not in bundles:
+                bundles.append(bundle)
+            outfiles = [ bundle ] * len(scans)
+        else:
+            bundle = None
+            outfiles = [ outputName(fileoutdir, fileprefix, scan.getNumber(), suffix, taken, overw_flag) for scan in scans ]
+
+        if jobs > 1:
+            nbatches = min(len(scans), jobs * 4)
+        else:
+            nbatches = 1
+        for batch in range(nbatches):
+            first = batch * len(scans) // nbatches
+            last = (batch + 1) * len(scans) // nbatches
+            tasks.append([ filename, scankeys[first:last], outfiles[first:last], outformat, bundle, None ])
+
+    # the scans of several files saved in the same binary bundle are
+    # kept apart under the name of their file, as their numbers repeat
+    bundlefiles = {}
+    for task in tasks:
+        if task[4] is not None:
+            bundlefiles.setdefault(task[4], set()).add(task[0])
+    if outformat in binformats:
+        for task in tasks:
+            if task[4] is not None and len(bundlefiles[task[4]]) > 1:
+                task[5] = os.path.basename(task[0])
+
+    # bundle parts are written separately and merged in order, unless
+    # text is appended to the bundle by a single process
+    parts = dict((bundle, []) for bundle in bundles)
+    if jobs > 1 or outformat in binformats:
+        for idx, task in enumerate(tasks):
+            if task[4] is not None:
+                part = "%s.part%d" % (task[4], idx)
+                parts[task[4]].append(part)
+                task[4] = part
+
+    if jobs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            pool.map(exportScans, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            exportScans(task)
+
+    for bundle in bundles:
+        if parts[bundle]:
+            mergeParts(parts[bundle], bundle, outformat)
+
+    sys.exit(status)
 
-       scan.save(outfile, format=outformat, append=single_flag)
- 
 if __name__ == "__main__":
      main()
@@ -0,0 +1,99 @@
+"""
+Test configuration. The package sources in python/ are imported as
+pyspec, as they are installed.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PYSPEC_DIR = os.path.join(ROOT, "python")
+
+
+def _importPyspec():
+    if "pyspec" in sys.modules:
+        return
+    spec = importlib.util.spec_from_file_location(
+        "pyspec", os.path.join(PYSPEC_DIR, "__init__.py"),
+        submodule_search_locations=[PYSPEC_DIR])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["pyspec"] = module
+    spec.loader.exec_module(module)
+
+
+_importPyspec()
+
+
+# a file header, a plain scan, a scan with mca spectra, a scan with a
+# wrong data line and a second scan with the same number
+SAMPLE = r"""#F /data/sample.dat
+#E 1600000000
+#D Mon Mar  1 10:00:00 2021
+#C fourc  User = specuser
+#O0 Two Theta  Theta  Chi
+#o0 tth th chi
+#J0 Seconds  Monitor  Detector
+#j0 sec mon det
+
+#S 1  ascan  th 1 2.5 3 0.1
+#D Mon Mar  1 10:01:00 2021
+#T 0.1  (Seconds)
+#P0 10 5 0.5
+#N 4
+#L Theta  H  Monitor  Detector
+1 0.5 1000 10
+1.5 0.25 1000 20
+2 0.125 1000 30
+2.5 0.0625 1000 40
+
+#S 2  ascan  th 0 1 1 0.1
+#D Mon Mar  1 10:02:00 2021
+#T 0.1  (Seconds)
+#P0 20 6 0.5
+#@MCA 4C
+#@CHANN 8 0 7 1
+#N 2
+#L Theta  Detector
+@A 1 2 3 4\
+ 5 6 7 8
+0 100
+@A 8 7 6 5\
+ 4 3 2 1
+1 200
+
+#S 3  ascan  th 0 2 2 0.1
+#D Mon Mar  1 10:03:00 2021
+#T 0.1  (Seconds)
+#P0 30 7 0.5
+#N 2
+#L Theta  Detector
+0 1
+1 2 3
+2 3
+
+#S 3  ascan  th 0 1 1 0.1
+#D Mon Mar  1 10:04:00 2021
+#T 0.1  (Seconds)
+#P0 40 8 0.5
+#N 2
+#L Theta  Detector
+0 5
+1 6
+"""
+
+
+@pytest.fixture
+def specfile(tmp_path):
+    """
+    Returns a function writing `text` (by default SAMPLE) to a file in
+    a temporary directory and returning its name
+    """
+    def write(text=SAMPLE, name="sample.dat"):
+        path = os.path.join(str(tmp_path), name)
+        with open(path, "w") as fd:
+            fd.write(text)
+        return path
+    return write
@@ -0,0 +1,53 @@
+"""
+Tests of the synthetic files and runs of the parser benchmark
+"""
+
+import json
+import os
+
+import numpy
+
+from pyspec.file.benchmark import generateFile, runBenchmark
+from pyspec.file.spec import FileSpec
+
+
+def test_generate_file(tmp_path):
+    filename = os.path.join(str(tmp_path), "bench.dat")
+    size = generateFile(filename, scans=5, points=20, columns=4, channels=40,
+                        errors=0.2)
+    assert size == os.path.getsize(filename)
+
+    fs = FileSpec(filename)
+    assert [scan.getNumber() for scan in fs] == [1, 2, 3, 4, 5]
+    scan = fs[0]
+    assert scan.getLabels() == ["Theta", "cnt1", "cnt2", "cnt3"]
+    data = scan.getData()
+    nberrors = len(scan.getErrors(None))
+    assert 0 < nberrors < 20
+    assert len(data) + nberrors == 20
+    # the spectra of the wrong lines are dropped with them
+    assert scan.getOneD(0).getData().shape == (len(data), 40)
+
+    # the same file for the same parameters
+    other = os.path.join(str(tmp_path), "other.dat")
+    generateFile(other, scans=5, points=20, columns=4, channels=40,
+                 errors=0.2)
+    assert numpy.array_equal(FileSpec(other)[3].getData(), fs[3].getData())
+
+    generateFile(filename, scans=2, first=6, append=True)
+    assert fs.update() == FileSpec.APPENDED
+    assert [scan.getNumber() for scan in fs] == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_run_benchmark(tmp_path):
+    results = runBenchmark(scans=4, points=10, columns=3, channels=8,
+                           workdir=str(tmp_path))
+    assert results["params"]["scans"] == 4
+    assert set(results["times"]) == set(["open", "getData", "getMcas",
+                                         "getMeta", "save", "update"])
+    for result in results["times"].values():
+        assert result["seconds"] >= 0
+    json.dumps(results)
+
+    # the generated files are removed
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,101 @@
+"""
+Tests of the catalog of scans in many spec files
+"""
+
+import bz2
+import gzip
+import os
+
+import numpy
+
+from pyspec.file.catalog import ScanCatalog
+
+from conftest import SAMPLE
+
+
+def _tree(tmp_path):
+    top = str(tmp_path)
+    os.makedirs(os.path.join(top, "data", "sub"))
+    files = {"data/a.dat": SAMPLE,
+             "data/sub/b.dat": SAMPLE.replace("User = specuser",
+                                              "User = other"),
+             "data/notes.txt": "not a spec file\n",
+             "data/sub/bad.dat": "#F bad\n#E 1600000000\n\n#S  \n1 2\n"}
+    for name, text in files.items():
+        with open(os.path.join(top, name), "w") as fd:
+            fd.write(text)
+    return os.path.join(top, "data")
+
+
+def test_crawl_and_find(tmp_path):
+    top = _tree(tmp_path)
+    catalog = ScanCatalog(os.path.join(str(tmp_path), "scans.db"))
+
+    # the unreadable file is recorded without scans
+    assert catalog.crawl([top]) == 4
+    assert len(catalog.getFiles()) == 4
+    assert catalog.getNumberScans() == 8
+
+    entries = catalog.find(command="ascan th", counter="Detector")
+    assert len(entries) == 8
+    entries = catalog.find(counter="H")
+    assert [(os.path.basename(entry["filename"]), entry["number"])
+            for entry in entries] == [("a.dat", 1), ("b.dat", 1)]
+    assert entries[0]["labels"] == ["Theta", "H", "Monitor", "Detector"]
+
+    entries = catalog.find(user="other", filename="*/sub/*")
+    assert [(entry["number"], entry["order"]) for entry in entries] == \
+        [(1, 0), (2, 0), (3, 0), (3, 1)]
+    assert catalog.find(motor="th") == catalog.find(motor="Theta")
+    assert catalog.find(command="ascan tth") == []
+
+    entry = catalog.find(user="specuser")[3]
+    assert catalog.getMotorPositions(entry)[0] == ("Two Theta", 40.0)
+    scan = catalog.getScan(entry)
+    assert numpy.array_equal(scan.getData(), [[0, 5], [1, 6]])
+    catalog.close()
+
+
+def test_incremental_crawl(tmp_path):
+    top = _tree(tmp_path)
+    dbfile = os.path.join(str(tmp_path), "scans.db")
+    catalog = ScanCatalog(dbfile)
+    catalog.crawl([top])
+    catalog.close()
+
+    # unchanged files are not read again
+    catalog = ScanCatalog(dbfile)
+    assert catalog.crawl([top]) == 0
+
+    filename = os.path.join(top, "a.dat")
+    with open(filename, "a") as fd:
+        fd.write("\n#S 4  ascan  th 0 1 1 0.1\n#N 2\n#L Theta  Detector\n"
+                 "0 1\n")
+    assert catalog.crawl([top]) == 1
+    assert catalog.getNumberScans() == 9
+
+    # removed files are forgotten
+    os.remove(filename)
+    assert catalog.crawl([top]) == 0
+    assert catalog.getNumberScans() == 4
+    assert filename not in catalog.getFiles()
+    catalog.close()
+
+
+def test_compressed_files(tmp_path):
+    top = _tree(tmp_path)
+    for name, compress in (("c.dat.gz", gzip.compress),
+                           ("c.dat.bz2", bz2.compress)):
+        with open(os.path.join(top, name), "wb") as fd:
+            fd.write(compress(SAMPLE.replace("User = specuser",
+                                             "User = packed").encode()))
+    catalog = ScanCatalog(os.path.join(str(tmp_path), "scans.db"))
+
+    assert catalog.crawl([top]) == 6
+    assert catalog.getNumberScans() == 16
+    entries = catalog.find(user="packed")
+    assert sorted(set(os.path.basename(entry["filename"])
+                      for entry in entries)) == ["c.dat.bz2", "c.dat.gz"]
+    scan = catalog.getScan(entries[-1])
+    assert numpy.array_equal(scan.getData(), [[0, 5], [1, 6]])
+    catalog.close()
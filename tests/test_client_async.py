@@ -0,0 +1,169 @@
+"""
+Tests of the asyncio connection against a SpecServer running in a thread
+"""
+
+import asyncio
+import threading
+import time
+
+import numpy
+import pytest
+
+pytest.importorskip("pyspec.datashm")
+
+import pyspec.client.SpecServer as SpecServer
+import pyspec.client.SpecAsyncConnection as SpecAsyncConnection
+from pyspec.utils import async_loop
+
+IMAGE = numpy.arange(400 * 300, dtype=numpy.int32).reshape(400, 300)
+
+
+class ServerThread(threading.Thread):
+    """
+    Serves a SpecServer. Functions given to call() run in the thread
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.calls = []
+        self.running = True
+        self.values = {"var/A": 42}
+
+        self.server = SpecServer.SpecServer(name="pytest")
+        self.server.set_channel("var/A", [self.setValue,
+                                          lambda: self.values["var/A"]])
+        self.server.set_channel("var/img", [None, lambda: IMAGE])
+        self.server.set_command("add", lambda a, b: a + b)
+
+    def setValue(self, value):
+        self.values["var/A"] = value
+        return value
+
+    def call(self, func, *args):
+        self.calls.append((func, args))
+
+    def run(self):
+        while self.running:
+            async_loop(timeout=0.01, count=1)
+            self.server._update()
+            while self.calls:
+                func, args = self.calls.pop(0)
+                func(*args)
+
+        for client in list(self.server.clients):
+            client.close()
+        self.server.close()
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+
+@pytest.fixture
+def server():
+    thread = ServerThread()
+    thread.start()
+    yield thread
+    thread.stop()
+
+
+def _run(server, test):
+    async def main():
+        conn = SpecAsyncConnection.SpecAsyncConnection(
+            "127.0.0.1:%d" % server.server.get_port())
+        await asyncio.wait_for(conn.connect(), 5)
+        assert conn.is_connected()
+        assert conn.specname == "pytest"
+        try:
+            await asyncio.wait_for(test(conn), 10)
+        finally:
+            conn.close()
+    asyncio.run(main())
+
+
+def test_read_and_write(server):
+    async def test(conn):
+        assert await conn.read_channel("A") == 42
+
+        conn.write_channel("A", 7)
+        # replies come in order, after the write is done
+        assert await conn.read_channel("var/A") == 7
+
+        values = await asyncio.gather(*[conn.read_channel("A")
+                                        for idx in range(200)])
+        assert values == [7] * 200
+        assert conn.reg_replies == {}
+
+    _run(server, test)
+
+
+def test_read_arrays(server):
+    async def test(conn):
+        data = await conn.read_channel("img")
+        assert numpy.array_equal(data, IMAGE)
+
+        out = numpy.zeros_like(IMAGE)
+        data = await conn.read_channel("img", out=out)
+        assert data is out
+        assert numpy.array_equal(out, IMAGE)
+
+        # the array given is dropped with a reply that is not an array
+        assert await conn.read_channel("A", out=out) == 42
+        assert conn.reply_arrays == {}
+
+    _run(server, test)
+
+
+def test_commands(server):
+    async def test(conn):
+        assert await conn.run_cmd("add", 2, 3) == 5
+        # arguments of a command line are strings
+        assert await conn.run_cmd("add 2 3") == 23
+
+        with pytest.raises(SpecAsyncConnection.SpecClientError):
+            await conn.run_cmd("nothing")
+
+    _run(server, test)
+
+
+def test_events(server):
+    async def test(conn):
+        events = conn.channel_events("var/x")
+        await asyncio.sleep(0.1)
+        assert len(server.server.clients) == 1
+
+        handler = server.server.clients[0]
+        for idx in range(100):
+            server.call(handler.send_msg_event, "var/x", idx, False)
+
+        values = []
+        async for value in events:
+            values.append(value)
+            if value == 99:
+                break
+        await events.aclose()
+        assert values == list(range(100))
+        assert conn.listeners == {}
+
+    _run(server, test)
+
+
+def test_connection_lost(server):
+    async def test(conn):
+        lost = []
+        conn.add_listener("var/x", lambda value, flags: lost.append(flags))
+        pending = conn.read_channel("nothing")
+
+        for client in list(server.server.clients):
+            server.call(client.handle_close)
+
+        t0 = time.time()
+        while conn.is_connected() and time.time() - t0 < 5:
+            await asyncio.sleep(0.01)
+        assert not conn.is_connected()
+        assert lost == [SpecAsyncConnection.CONNECTION_LOST]
+        with pytest.raises(Exception):
+            await pending
+
+    _run(server, test)
@@ -0,0 +1,99 @@
+"""
+Tests of a client connection to a SpecServer in the same process
+"""
+
+import time
+
+import numpy
+import pytest
+
+pytest.importorskip("pyspec.datashm")
+
+import pyspec.client.SpecConnection as SpecConnection
+import pyspec.client.SpecServer as SpecServer
+
+IMAGE = numpy.arange(300 * 200, dtype=numpy.float32).reshape(300, 200)
+
+
+@pytest.fixture
+def server():
+    server = SpecServer.SpecServer(name="pytest")
+    server.set_channel("var/img", [None, lambda: IMAGE])
+    server.set_channel("var/A", [None, lambda: 42])
+    yield server
+    for client in list(server.clients):
+        client.close()
+    server.close()
+
+
+@pytest.fixture
+def conn(server):
+    conn = SpecConnection._SpecConnection("127.0.0.1",
+                                          str(server.get_port()), False)
+    # both ends are served by the same loop
+    conn.pump = lambda cond: _pump(conn, server, cond)
+    assert conn.pump(lambda: conn.state == SpecConnection.CONNECTED)
+    yield conn
+    conn.close_connection()
+
+
+def _pump(conn, server, cond, timeout=10):
+    t0 = time.time()
+    while not cond() and time.time() - t0 < timeout:
+        conn.check_connection()
+        SpecConnection.async_loop(timeout=0.01, count=1)
+        server._update()
+    return cond()
+
+
+def _read(conn, chan_name, out=None):
+    reply_id = conn.send_msg_chan_read(chan_name, out)
+    reply = conn.reg_replies[reply_id]
+    assert conn.pump(lambda: not reply.is_pending())
+    return reply.get_data()
+
+
+def test_read_array(conn):
+    data = _read(conn, "var/img")
+    assert numpy.array_equal(data, IMAGE)
+    assert data.dtype == IMAGE.dtype
+
+    assert _read(conn, "var/A") == 42
+
+
+def test_read_array_in_place(conn):
+    out = numpy.zeros_like(IMAGE)
+    data = _read(conn, "var/img", out)
+    assert data is out
+    assert numpy.array_equal(out, IMAGE)
+
+    # an array that does not fit is not used
+    other = numpy.zeros(IMAGE.shape, dtype=numpy.float64)
+    data = _read(conn, "var/img", other)
+    assert data is not other
+    assert numpy.array_equal(data, IMAGE)
+    assert not other.any()
+    assert conn.reply_arrays == {}
+
+
+def test_no_array_kept_for_other_replies(conn):
+    out = numpy.zeros(4)
+    assert _read(conn, "var/A", out) == 42
+    _read(conn, "var/missing", out)
+    assert conn.reply_arrays == {}
+
+
+def test_array_events_in_place(conn, server):
+    frame = numpy.zeros_like(IMAGE)
+    conn.set_array_buffer("var/frame", frame)
+    conn.registerChannel("var/frame", lambda value: None)
+    channel = conn.reg_channels["var/frame"]
+    assert conn.pump(lambda: len(server.clients) == 1)
+
+    for idx in range(3):
+        server.clients[0].send_msg_event("var/frame", IMAGE + idx)
+    # the array is filled as the data comes
+    assert conn.pump(lambda: channel.value is not None and
+                     channel.value[-1, -1] == IMAGE[-1, -1] + 2)
+    assert channel.value is frame
+    assert numpy.array_equal(frame, IMAGE + 2)
@@ -0,0 +1,228 @@
+"""
+Tests of the reading and writing of spec server messages
+"""
+
+import numpy
+import pytest
+
+pytest.importorskip("pyspec.datashm")
+
+import pyspec.client.SpecMessage as SpecMessage
+
+
+class PieceSocket(object):
+    """
+    Gives the bytes of `data` at most `piece` bytes per recv_into call
+    """
+
+    def __init__(self, data, piece):
+        self.data = data
+        self.piece = piece
+        self.pos = 0
+
+    def recv_into(self, view, nbytes):
+        nbytes = min(nbytes, self.piece, len(self.data) - self.pos)
+        view[:nbytes] = self.data[self.pos:self.pos + nbytes]
+        self.pos += nbytes
+        return nbytes
+
+
+def _readAll(sock, bufsize=64):
+    """
+    Reads messages from `sock` as SpecConnection.handle_read does
+    """
+    recvbuf = SpecMessage.ReceiveBuffer(bufsize)
+    messages = []
+    msg = None
+    while recvbuf.recvFrom(sock, 100):
+        sbuffer = recvbuf.view()
+        offset = 0
+        while offset < len(sbuffer):
+            if msg is None:
+                msg = SpecMessage.message(version=None)
+            consumed = msg.readFromStream(sbuffer, offset)
+            if consumed == 0:
+                break
+            offset += consumed
+            if msg.isComplete():
+                messages.append(msg)
+                msg = None
+        del sbuffer
+        recvbuf.consume(offset)
+    assert len(recvbuf) == 0
+    return messages, recvbuf
+
+
+@pytest.mark.parametrize("piece", [1, 7, 100])
+def test_messages_split_across_reads(piece):
+    sent = [SpecMessage.reply_message(idx, "var/A", "x" * (idx * 50))
+            for idx in range(1, 8)]
+    data = b"".join(msg.sendingString() for msg in sent)
+
+    messages, recvbuf = _readAll(PieceSocket(data, piece))
+    assert [msg.sn for msg in messages] == list(range(1, 8))
+    assert [msg.data for msg in messages] == \
+        ["x" * (idx * 50) for idx in range(1, 8)]
+    assert all(msg.name == "var/A" for msg in messages)
+
+
+def test_receive_buffer():
+    recvbuf = SpecMessage.ReceiveBuffer(16)
+    sock = PieceSocket(bytes(bytearray(range(100))), 10)
+
+    assert recvbuf.recvFrom(sock, 10) == 10
+    recvbuf.consume(6)
+    assert bytes(recvbuf.view()) == bytes(bytearray(range(6, 10)))
+
+    # the unread bytes are moved to make room
+    assert recvbuf.recvFrom(sock, 10) == 10
+    assert bytes(recvbuf.view()) == bytes(bytearray(range(6, 20)))
+
+    # and the buffer grows for more
+    for idx in range(8):
+        recvbuf.recvFrom(sock, 10)
+    assert bytes(recvbuf.view()) == bytes(bytearray(range(6, 100)))
+    assert len(recvbuf.buf) >= 94
+
+    # it is given back once all is read
+    recvbuf.consume(len(recvbuf))
+    assert len(recvbuf) == 0
+    assert len(recvbuf.buf) == 16
+
+
+def test_receive_in_place():
+    recvbuf = SpecMessage.ReceiveBuffer(16)
+    view = recvbuf.freeView(4)
+    assert len(view) >= 4
+    view[:4] = b"abcd"
+    recvbuf.received(4)
+    assert bytes(recvbuf.view()) == b"abcd"
+
+
+def _stream(*messages):
+    return bytearray(b"".join(msg.sendingString() for msg in messages))
+
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_batch_decoding(version):
+    sent = [SpecMessage.msg_event("var/x%d" % (idx % 3), idx,
+                                  version=version) for idx in range(50)]
+    stream = _stream(*sent)
+    view = memoryview(stream)
+
+    read = list(SpecMessage.iterMessages(view, 0, version))
+    assert len(read) == 50
+    assert [msg.data for msg, end in read] == list(range(50))
+    assert read[-1][1] == len(stream)
+
+    # the same as read one by one
+    start = 0
+    for record, end in read:
+        msg = SpecMessage.message(version=version)
+        assert msg.readFromStream(view, start) == end - start
+        for attr in ("vers", "sn", "cmd", "type", "name", "data", "err"):
+            assert getattr(record, attr) == getattr(msg, attr)
+        start = end
+
+
+def test_batch_decoding_stops():
+    sent = [SpecMessage.reply_message(idx, "var/A", "value %d" % idx)
+            for idx in range(3)]
+    stream = _stream(*sent)
+    first = len(sent[0].sendingString())
+
+    # at a message not received yet in full
+    view = memoryview(stream)[:len(stream) - 5]
+    read = list(SpecMessage.iterMessages(view, 0, 4))
+    assert [msg.sn for msg, end in read] == [0, 1]
+
+    # from an offset
+    read = list(SpecMessage.iterMessages(memoryview(stream), first, 4))
+    assert [msg.sn for msg, end in read] == [1, 2]
+
+    # at an array message, read with a SpecMessage object
+    array = numpy.arange(6, dtype=numpy.int32).reshape(2, 3)
+    stream = _stream(sent[0], SpecMessage.reply_message(7, "var/img", array),
+                     sent[1])
+    read = list(SpecMessage.iterMessages(memoryview(stream), 0, 4))
+    assert [msg.sn for msg, end in read] == [0]
+
+    msg = SpecMessage.message(version=4)
+    end = read[0][1]
+    end += msg.readFromStream(memoryview(stream), end)
+    assert msg.isComplete()
+    assert numpy.array_equal(msg.data, array)
+    read = list(SpecMessage.iterMessages(memoryview(stream), end, 4))
+    assert [msg.sn for msg, end in read] == [1]
+
+
+def test_batch_decoding_byte_order():
+    sent = [SpecMessage.reply_message(idx, "var/A", idx * 1.5, order=">")
+            for idx in range(3)]
+    sent.append(SpecMessage.error_message(3, "var/B", "no such variable"))
+    read = list(SpecMessage.iterMessages(memoryview(_stream(*sent)), 0, 4))
+    assert [msg.data for msg, end in read] == [0, 1.5, 3.0,
+                                               "no such variable"]
+    assert read[-1][0].type == SpecMessage.ERROR
+
+
+class LimitSocket(object):
+    """
+    Takes at most `limit` bytes per send call, with sendmsg if `gather`
+    """
+
+    def __init__(self, limit, gather=True):
+        self.limit = limit
+        self.sent = bytearray()
+        self.calls = []
+        if gather:
+            self.sendmsg = self._sendmsg
+
+    def _sendmsg(self, buffers):
+        self.calls.append(len(buffers))
+        data = b"".join(bytes(part) for part in buffers)[:self.limit]
+        self.sent += data
+        return len(data)
+
+    def send(self, data):
+        self.calls.append(1)
+        data = bytes(data)[:self.limit]
+        self.sent += data
+        return len(data)
+
+
+@pytest.mark.parametrize("gather", [True, False])
+@pytest.mark.parametrize("limit", [1, 50, 1 << 20])
+def test_send_queue(gather, limit):
+    array = numpy.arange(1000, dtype=numpy.float64)
+    sent = [SpecMessage.msg_chan_send("var/img", array),
+            SpecMessage.msg_cmd("ascan th 0 1 10 0.1"),
+            SpecMessage.msg_chan_send("var/img", array.reshape(10, 100))]
+
+    queue = SpecMessage.SendQueue()
+    for msg in sent:
+        queue.append(msg)
+
+    sock = LimitSocket(limit, gather)
+    while len(queue):
+        assert queue.sendTo(sock) > 0
+    assert queue.sendTo(sock) == 0
+
+    assert bytes(sock.sent) == b"".join(msg.sendingString() for msg in sent)
+    if gather and limit > len(sock.sent):
+        # all in one call
+        assert sock.calls == [6]
+
+    assert queue.offset == 0
+    received = SpecMessage.message(version=4)
+    received.readFromStream(memoryview(sock.sent))
+    assert numpy.array_equal(received.data, array)
+
+
+def test_arrays_sent_without_copy():
+    array = numpy.arange(1000, dtype=numpy.float64)
+    msg = SpecMessage.msg_chan_send("var/img", array)
+    header, data = msg.sendingParts()
+    assert len(header) == 132
+    assert numpy.shares_memory(numpy.frombuffer(data, dtype=array.dtype),
+                               array)
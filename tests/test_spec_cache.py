@@ -0,0 +1,66 @@
+"""
+Tests of the index cache of FileSpec (cache=True)
+"""
+
+import os
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+
+EXTRA = """
+#S 4  ascan  th 0 1 1 0.1
+#P0 50 9 0.5
+#N 2
+#L Theta  Detector
+0 7
+1 8
+"""
+
+
+def _blocks(filespec):
+    return [(scan.getNumber(), scan.getOrder(), scan.start, scan.length)
+            for scan in filespec]
+
+
+def _noIndexing(self):
+    raise AssertionError("file indexed again")
+
+
+def test_index_saved_and_reloaded(specfile, monkeypatch):
+    filename = specfile()
+    first = FileSpec(filename, cache=True)
+    assert os.path.exists(first.getIndexFileName())
+
+    # the unchanged file is not indexed again
+    monkeypatch.setattr(FileSpec, "_indexscans", _noIndexing)
+    cached = FileSpec(filename, cache=True)
+    assert _blocks(cached) == _blocks(first)
+    assert cached[0].getLabels() == first[0].getLabels()
+    assert numpy.array_equal(cached[2].getData(), first[2].getData())
+
+
+def test_appended_file(specfile):
+    filename = specfile()
+    FileSpec(filename, cache=True)
+
+    with open(filename, "a") as fd:
+        fd.write(EXTRA)
+
+    cached = FileSpec(filename, cache=True)
+    fresh = FileSpec(filename)
+    assert len(cached) == 5
+    assert _blocks(cached) == _blocks(fresh)
+    assert cached[4].getData().tolist() == [[0, 7], [1, 8]]
+
+
+def test_unreadable_cache(specfile):
+    filename = specfile()
+    cachefile = filename + ".idx"
+    with open(cachefile, "wb") as fd:
+        fd.write(b"not an index")
+
+    filespec = FileSpec(filename, cache=True, cachefile=cachefile)
+    assert _blocks(filespec) == _blocks(FileSpec(filename))
+    assert filespec.loadIndex(cachefile)
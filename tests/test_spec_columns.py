@@ -0,0 +1,47 @@
+"""
+Tests of the reads of some data columns
+"""
+
+import numpy
+import pytest
+
+from pyspec.file.spec import FileSpec
+
+
+def test_column_reads(specfile):
+    scan = FileSpec(specfile())[0]
+
+    assert numpy.array_equal(scan.getColumn("Detector"), [10, 20, 30, 40])
+    assert numpy.array_equal(scan.getColumn(1), [0.5, 0.25, 0.125, 0.0625])
+    assert not scan.is_parsed
+
+    data = scan.getColumnData(["Detector", "Theta"])
+    assert numpy.array_equal(data, [[10, 1], [20, 1.5], [30, 2], [40, 2.5]])
+    assert not scan.is_parsed
+
+    with pytest.raises(ValueError):
+        scan.getColumn("Nothing")
+    with pytest.raises(ValueError):
+        scan.getColumn(4)
+
+
+def test_column_reads_keep_header(specfile):
+    scan = FileSpec(specfile())[0]
+    assert scan.getMotorPositions()[1] == ("Theta", "5")
+    assert scan.is_header_parsed
+
+    scan.getColumn("H")
+    assert scan.is_header_parsed
+    assert scan.getMotorPositions()[1] == ("Theta", "5")
+
+    # the full parse replaces the columns read before
+    data = scan.getData()
+    assert scan._colcache is None
+    assert numpy.array_equal(scan.getColumn("H"), data[:, 1])
+
+
+def test_column_reads_parsed_scan(specfile):
+    scan = FileSpec(specfile()).getScanByNumber(3)
+    data = scan.getData()
+    assert numpy.array_equal(scan.getColumnData([1, 0]), data[:, ::-1])
+
@@ -0,0 +1,87 @@
+"""
+Tests of the reading of compressed spec files
+"""
+
+import bz2
+import gzip
+
+import numpy
+import pytest
+
+from pyspec.file import spec
+from pyspec.file.spec import FileSpec
+
+from test_spec_parallel import _manyScans
+
+
+def _compress(filename, compress):
+    with open(filename, "rb") as fd:
+        data = fd.read()
+    with open(filename + ".z", "wb") as fd:
+        fd.write(compress(data))
+    return filename + ".z"
+
+
+def _compare(plain, other):
+    assert len(plain) == len(other)
+    for scan, otherscan in zip(plain, other):
+        assert str(scan) == str(otherscan)
+        assert scan.getFirstLine() == otherscan.getFirstLine()
+        assert numpy.array_equal(scan.getData(), otherscan.getData())
+        assert scan.getErrors(None) == otherscan.getErrors(None)
+
+
+@pytest.mark.parametrize("compress", [gzip.compress, bz2.compress])
+def test_compressed(specfile, compress):
+    filename = specfile(_manyScans(40))
+    _compare(FileSpec(filename), FileSpec(_compress(filename, compress)))
+
+
+def test_xz(specfile):
+    lzma = pytest.importorskip("lzma")
+    filename = specfile(_manyScans(40))
+    _compare(FileSpec(filename), FileSpec(_compress(filename, lzma.compress)))
+
+
+def test_gzip_random_access(specfile, monkeypatch):
+    # seek points are saved between chunks of decompressed data
+    monkeypatch.setattr(spec, "_SEEKPOINT_BYTES", 4096)
+    monkeypatch.setattr(spec, "_INFLATE_OUTPUT", 1024)
+    filename = specfile(_manyScans(400))
+    plain = FileSpec(filename)
+    fs = FileSpec(_compress(filename, gzip.compress))
+    assert len(fs._source._points) > 10
+
+    # a scan is read from the seek point before it
+    restarts = []
+    restart = fs._source._restart
+
+    def record(start):
+        datapos, nblines = restart(start)
+        restarts.append((start, datapos))
+        return datapos, nblines
+
+    fs._source._restart = record
+
+    for idx in (300, 10, 399, 200):
+        scan = fs[idx]
+        assert numpy.array_equal(scan.getData(), plain[idx].getData())
+        assert scan.getFirstLine() == plain[idx].getFirstLine()
+    assert [start for start, datapos in restarts] == \
+        [fs[idx].start for idx in (300, 10, 399, 200)]
+    for start, datapos in restarts:
+        assert start - 2 * 4096 < datapos <= start
+
+def test_gzip_appended_member(specfile):
+    filename = specfile()
+    gzname = _compress(filename, gzip.compress)
+    fs = FileSpec(gzname)
+    assert len(fs) == 4
+
+    # appending to a gzip file adds a member
+    with gzip.open(gzname, "ab") as fd:
+        fd.write(b"\n#S 4  ascan  th 0 1 1 0.1\n#N 2\n#L Theta  Detector\n"
+                 b"0 9\n1 10\n")
+    fs.update()
+    assert len(fs) == 5
+    assert numpy.array_equal(fs[-1].getData(), [[0, 9], [1, 10]])
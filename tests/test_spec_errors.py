@@ -0,0 +1,54 @@
+"""
+Tests of the reporting of erroneous lines
+"""
+
+from pyspec.file.spec import FileSpec
+
+WRONG = """#F data
+#E 1600000000
+#O0 Theta
+
+#S 1  ascan  th 0 1 10 0.1
+#P0 0
+#Z unknown key
+#N x
+#L Theta  Detector
+0 1
+1 2 3
+@A 1 2 x
+2 3
+abc
+"""
+
+
+def test_error_messages(specfile):
+    scan = FileSpec(specfile(WRONG))[0]
+    assert scan.getErrors() == []
+
+    scan.getData()
+    # lines in the scan and, in parentheses, in the file
+    assert scan.getErrors(None) == [
+        [1, "3 (7)", "erroneous data / unknown header line (Z)  "],
+        [1, "4 (8)", "erroneous data / unknown line (N)  "],
+        [1, "7 (11)", "erroneous data / wrong number of columns "],
+        [1, "10 (14)", "erroneous data / unknown header line (a)  "],
+        [1, "8 (12)", "erroneous data / wrong mca data "]]
+    assert scan.getMeta()["errors"] == scan.getErrors(None)
+
+
+def test_error_limit(specfile):
+    scan = FileSpec(specfile(WRONG))[0]
+    scan.getData()
+    errors = scan.getErrors(2)
+    assert [error[1] for error in errors] == ["3 (7)", "4 (8)", ""]
+    assert errors[-1][2] == "3 more erroneous lines"
+
+
+def test_many_errors(specfile):
+    lines = WRONG.split("\n")[:9] + ["1 2 3"] * 5000 + ["0 1"]
+    scan = FileSpec(specfile("\n".join(lines) + "\n"))[0]
+    assert scan.getData().tolist() == [[0, 1]]
+    errors = scan.getErrors()
+    assert len(errors) == 1001
+    assert errors[-1][2] == "4002 more erroneous lines"
+    assert len(scan.getErrors(None)) == 5002
@@ -0,0 +1,54 @@
+"""
+Tests of following a spec file while it is written
+"""
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+from conftest import SAMPLE
+
+
+def _append(filename, text):
+    with open(filename, "a") as fd:
+        fd.write(text)
+
+
+def test_follow(specfile):
+    filename = specfile(SAMPLE + "\n#S 4  ascan  th 0 3 3 0.1\n#P0 50 9 0.5"
+                        "\n#N 2\n#L Theta  Detector\n0 7\n1 8")
+    fs = FileSpec(filename)
+    events = fs.follow(interval=0.01, timeout=1.0)
+
+    event, scan, rows = next(events)
+    assert (event, scan.getNumber()) == ("scan", 4)
+    event, scan, rows = next(events)
+    # the line without its end is not taken yet
+    assert event == "points"
+    assert numpy.array_equal(rows, [[0, 7]])
+    assert not rows.flags.writeable
+
+    _append(filename, "\n2 9\n3 10\n")
+    event, scan, rows = next(events)
+    assert event == "points"
+    assert numpy.array_equal(rows, [[1, 8], [2, 9], [3, 10]])
+
+    _append(filename, "\n#S 5  ascan  th 0 1 1 0.1\n#N 2\n"
+            "#L Theta  Detector\n0 11\n")
+    event, scan, rows = next(events)
+    assert (event, scan.getNumber()) == ("scan", 5)
+    event, scan, rows = next(events)
+    assert numpy.array_equal(rows, [[0, 11]])
+
+    # the scans followed are complete once parsed again
+    events.close()
+    assert numpy.array_equal(fs.getScanByNumber(4).getData()[:, 1],
+                             [7, 8, 9, 10])
+    assert len(fs) == 6
+
+
+def test_follow_timeout(specfile):
+    fs = FileSpec(specfile())
+    events = list(fs.follow(interval=0.01, timeout=0.05))
+    assert [event for event, scan, rows in events] == ["scan", "points"]
+    assert events[0][1] is fs[-1]
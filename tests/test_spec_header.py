@@ -0,0 +1,75 @@
+"""
+Tests of the reading of scan metadata without parsing the data
+"""
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+from test_spec_mca import _mcaText
+
+
+def test_metadata_without_data(specfile):
+    fs = FileSpec(specfile())
+    scan = fs[0]
+
+    assert scan.getDate() == "Mon Mar  1 10:01:00 2021"
+    assert scan.getCountTime() == ["0.1", "Seconds"]
+    assert scan.getMotorPositions() == [("Two Theta", "10"), ("Theta", "5"),
+                                        ("Chi", "0.5")]
+    assert scan.getCounterMnemonics() == ["sec", "mon", "det"]
+    assert scan.getUser() == "specuser"
+    assert scan.is_header_parsed
+    assert not scan.is_parsed
+
+    meta = scan.getMeta()
+    assert meta["points"] == 4
+    assert meta["columns"] == 4
+    assert meta["errors"] is None
+    assert not scan.is_parsed
+
+
+def test_metadata_as_parsed(specfile):
+    filename = specfile()
+    header = FileSpec(filename)
+    parsed = FileSpec(filename)
+    parsed.parseAll(workers=1)
+
+    for scan, other in zip(header, parsed):
+        meta = scan.getMeta()
+        assert not scan.is_parsed
+        othermeta = other.getMeta()
+
+        # data errors only show up after parsing, but the wrong data
+        # lines are never counted as points
+        if other.getErrors(None):
+            othermeta["errors"] = None
+        assert meta == othermeta
+
+
+def test_parse_after_header(specfile):
+    scan = FileSpec(specfile()).getScanByNumber(3)
+    assert scan.getMeta()["points"] == 2
+    assert not scan.is_parsed
+
+    # the full parse starts again from a clean state
+    data = scan.getData()
+    assert numpy.array_equal(data, [[0, 1], [2, 3]])
+    assert scan.getMeta()["points"] == 2
+    assert len(scan.getErrors()) == 1
+    assert scan.getComments() == []
+
+
+def test_points_after_header(specfile):
+    fs = FileSpec(specfile())
+    for scan in fs:
+        scan.getCountTime()
+    assert [scan.nb_points for scan in fs] == [4, 2, 2, 2]
+
+
+def test_points_with_mca_lines(specfile):
+    text = _mcaText(numpy.arange(60.).reshape(3, 20), perline=7)
+    text = text.replace("\n1 10\n", "\n1 1O\n")
+    scan = FileSpec(specfile(text))[0]
+    assert scan.getMeta()["points"] == 2
+    assert scan.getLines() == 2
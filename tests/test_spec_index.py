@@ -0,0 +1,44 @@
+"""
+Tests of the block index of FileSpec (offsets of #S and header blocks)
+"""
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+from conftest import SAMPLE
+
+
+def test_scan_blocks(specfile):
+    filespec = FileSpec(specfile())
+
+    assert len(filespec) == 4
+    assert [(scan.getNumber(), scan.getOrder()) for scan in filespec] == \
+        [(1, 0), (2, 0), (3, 0), (3, 1)]
+    assert filespec.getScanByNumber(3, 1) is filespec[3]
+
+    # each block is sliced from the file by its offset and length
+    for scan in filespec:
+        text = scan.getText()
+        assert text == SAMPLE[scan.start:scan.start + scan.length]
+        assert text.startswith("#S %d " % scan.getNumber())
+
+
+def test_scans_are_not_parsed_when_indexed(specfile):
+    filespec = FileSpec(specfile())
+    assert not any(scan.is_parsed for scan in filespec)
+    assert filespec[0].getLabels() == ["Theta", "H", "Monitor", "Detector"]
+
+
+def test_mmap_and_read(specfile):
+    filename = specfile()
+    mapped = FileSpec(filename)
+    read = FileSpec(filename, use_mmap=False)
+
+    for scan, other in zip(mapped, read):
+        assert (scan.start, scan.length) == (other.start, other.length)
+        assert numpy.array_equal(scan.getData(), other.getData())
+
+    assert mapped[0].getData().tolist() == [
+        [1, 0.5, 1000, 10], [1.5, 0.25, 1000, 20],
+        [2, 0.125, 1000, 30], [2.5, 0.0625, 1000, 40]]
@@ -0,0 +1,53 @@
+"""
+Tests of the decoding of mca (@A) spectra
+"""
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+
+def _mcaText(spectra, perline=16):
+    lines = ["#F data", "#E 1600000000", "#O0 Theta", "",
+             "#S 1  ascan  th 0 1 10 0.1", "#P0 0", "#@MCA 16C",
+             "#@CHANN %d 0 %d 1" % (spectra.shape[1], spectra.shape[1] - 1),
+             "#N 2", "#L Theta  Detector"]
+    for idx, spectrum in enumerate(spectra):
+        values = ["%g" % value for value in spectrum]
+        pieces = [" ".join(values[pos:pos + perline])
+                  for pos in range(0, len(values), perline)]
+        lines.append("@A " + "\\\n ".join(pieces))
+        lines.append("%d %d" % (idx, idx * 10))
+    return "\n".join(lines) + "\n"
+
+
+def test_sample_spectra(specfile):
+    scan = FileSpec(specfile()).getScanByNumber(2)
+    assert scan.getNumberMcas() == 2
+
+    oned = scan.getOneD(0)
+    expected = [[1, 2, 3, 4, 5, 6, 7, 8], [8, 7, 6, 5, 4, 3, 2, 1]]
+    assert numpy.array_equal(oned.getData(), expected)
+    assert not oned.getData().flags.writeable
+    # the spectra share the rows of the array
+    assert numpy.array_equal(scan.getMcas()[1].getData()[:, 1], expected[1])
+    assert numpy.array_equal(scan.getData(), [[0, 100], [1, 200]])
+
+
+def test_continuation_lines(specfile):
+    spectra = numpy.arange(20 * 100.).reshape(20, 100) % 97
+    scan = FileSpec(specfile(_mcaText(spectra, perline=7)))[0]
+
+    assert numpy.array_equal(scan.getOneD(0).getData(), spectra)
+    assert numpy.array_equal(scan.getData()[:, 0], numpy.arange(20))
+    assert scan.getErrors(None) == []
+
+
+def test_calibration(specfile):
+    scan = FileSpec(specfile()).getScanByNumber(2)
+    mca = scan.getMcas()[0]
+    mca.setCalib((1.0, 0.5, 0.25))
+    channels = numpy.arange(8.)
+    assert numpy.allclose(mca.getData(calibrated=True)[:, 0],
+                          1.0 + 0.5 * channels + 0.25 * channels ** 2)
+    assert numpy.array_equal(mca.getData()[:, 0], channels)
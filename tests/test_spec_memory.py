@@ -0,0 +1,40 @@
+"""
+Tests of the memory used by parsed data
+"""
+
+import pytest
+
+from pyspec.file.spec import FileSpec
+
+
+def test_data_is_read_only(specfile):
+    scan = FileSpec(specfile())[0]
+    with pytest.raises(ValueError):
+        scan.getData()[0, 0] = 1
+
+
+def test_memory_limit(specfile):
+    fs = FileSpec(specfile())
+    scansize = fs[0].getData().nbytes
+    assert fs.getMemoryUsage() == 0
+
+    fs.setMemoryLimit(scansize + 1)
+    assert fs.getMemoryUsage() == scansize
+
+    # the least recently used scan is dropped, and parsed again when needed
+    fs[3].getData()
+    assert not fs[0].is_parsed
+    assert fs[3].is_parsed
+    assert fs.getMemoryUsage() == fs[3].getData().nbytes
+    assert fs[0].getData()[3, 3] == 40
+    assert not fs[3].is_parsed
+
+    # columns read are counted too
+    fs[2].getColumn("Detector")
+    assert not fs[0].is_parsed
+    assert fs.getMemoryUsage() <= scansize + 1
+
+    fs.setMemoryLimit(None)
+    assert fs.getMemoryUsage() == 0
+    fs[1].getData()
+    assert fs[2]._colcache is not None
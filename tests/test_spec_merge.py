@@ -0,0 +1,62 @@
+"""
+Tests of the merging of the data of several scans
+"""
+
+import numpy
+import pytest
+
+from pyspec.file.spec import FileSpec
+
+from conftest import SAMPLE
+
+
+def test_concat(specfile):
+    fs = FileSpec(specfile())
+    data, labels, sources = fs.merge([1, 3])
+    assert labels == ["Theta", "Detector"]
+    assert numpy.array_equal(data, [[1, 10], [1.5, 20], [2, 30], [2.5, 40],
+                                    [0, 1], [2, 3]])
+    assert numpy.array_equal(sources, [0, 0, 0, 0, 1, 1])
+
+    data, labels, sources = fs.merge([1, 3], on="Theta")
+    assert numpy.array_equal(data, [[0, 1], [1, 10], [1.5, 20], [2, 30],
+                                    [2, 3], [2.5, 40]])
+    assert numpy.array_equal(sources, [1, 0, 0, 0, 1, 0])
+
+    # the scans are not parsed for it
+    assert not any(scan.is_parsed for scan in fs)
+
+
+def test_mean(specfile):
+    fs = FileSpec(specfile())
+    data, labels, sources = fs.merge([fs[2], fs[3]], how="mean")
+    assert numpy.array_equal(data, [[0, 3], [1.5, 4.5]])
+    assert numpy.array_equal(sources, [2, 2])
+
+    with pytest.raises(ValueError):
+        fs.merge([1, 2], how="mean")
+
+
+def test_interp(specfile):
+    fs = FileSpec(specfile())
+    data, labels, sources = fs.merge([fs[3], fs[0]], on="Theta",
+                                     how="interp")
+    assert labels == ["Theta", "Detector"]
+    assert numpy.array_equal(data, [[0, 5], [1, 8]])
+    assert numpy.array_equal(sources, [1, 2])
+
+    with pytest.raises(ValueError):
+        fs.merge([1, 2], how="interp")
+
+
+def test_wrong_merges(specfile):
+    fs = FileSpec(specfile(SAMPLE + "\n#S 4  ascan  th 0 1 1 0.1\n#N 2\n"
+                                    "0 1\n1 2\n"))
+    with pytest.raises(ValueError):
+        fs.merge([1, 4])
+    with pytest.raises(ValueError):
+        fs.merge([1, 2], on="H")
+    with pytest.raises(ValueError):
+        fs.merge([1, 5])
+    with pytest.raises(ValueError):
+        fs.merge([1, 2], how="sum")
@@ -0,0 +1,54 @@
+"""
+Tests of the parsing of scans in worker processes
+"""
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+from conftest import SAMPLE
+
+
+def _manyScans(nbscans):
+    header, scans = SAMPLE.split("\n#S 1 ", 1)
+    scans = "#S 1 " + scans
+    text = [header]
+    for idx in range(nbscans // 4):
+        text.append(scans.replace("#S 3 ", "#S %d " % (idx + 3)))
+    return "\n".join(text)
+
+
+def _compare(serial, parallel):
+    assert len(serial) == len(parallel)
+    for scan, other in zip(serial, parallel):
+        assert other.is_parsed
+        assert scan.getNumber() == other.getNumber()
+        assert scan.getOrder() == other.getOrder()
+        assert scan.getLabels() == other.getLabels()
+        assert scan.getMotorPositions() == other.getMotorPositions()
+        assert numpy.array_equal(scan.getData(), other.getData())
+        assert scan.getNumberMcas() == other.getNumberMcas()
+        for mca, othermca in zip(scan.getMcas(), other.getMcas()):
+            assert numpy.array_equal(mca.getData(), othermca.getData())
+        assert scan.getErrors(None) == other.getErrors(None)
+
+
+def test_parse_all(specfile):
+    filename = specfile(_manyScans(40))
+
+    serial = FileSpec(filename)
+    serial.parseAll(workers=1)
+
+    parallel = FileSpec(filename)
+    parallel.parseAll(workers=2)
+    _compare(serial, parallel)
+
+
+def test_iter_parse_order(specfile):
+    fs = FileSpec(specfile(_manyScans(40)))
+    fs[3].parse()
+    scans = list(fs.iterParse(workers=2))
+    assert scans == [scan for scan in fs if scan is not fs[3]]
+
+    scans = list(fs.iterParse(workers=2))
+    assert scans == []
@@ -0,0 +1,43 @@
+"""
+Tests of the parsing of scan data lines
+"""
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+
+def _scanText(rows, extra=None):
+    lines = ["#F data", "#E 1600000000", "#O0 Theta", "",
+             "#S 1  ascan  th 0 1 10 0.1", "#P0 0", "#N 3",
+             "#L Theta  Monitor  Detector"]
+    for idx, row in enumerate(rows):
+        if extra and idx in extra:
+            lines.append(extra[idx])
+        lines.append(" ".join("%.10g" % value for value in row))
+    return "\n".join(lines) + "\n"
+
+
+def test_numeric_runs(specfile):
+    rand = numpy.random.RandomState(0)
+    rows = rand.standard_normal((500, 3)) * [1, 1e-8, 1e12]
+
+    scan = FileSpec(specfile(_scanText(rows)))[0]
+    data = scan.getData()
+    assert data.shape == (500, 3)
+    assert numpy.allclose(data, rows, rtol=1e-9)
+    assert scan.getErrors(None) == []
+
+
+def test_wrong_lines_are_skipped(specfile):
+    rows = numpy.arange(30.).reshape(10, 3)
+    extra = {3: "1 2", 5: "#C a comment between points",
+             7: "1 2 abc", 9: "4 5 6 7"}
+
+    scan = FileSpec(specfile(_scanText(rows, extra)))[0]
+    assert numpy.array_equal(scan.getData(), rows)
+    assert scan.getComments() == ["a comment between points"]
+
+    # lines counted from the #S line, then in the file
+    assert [error[1] for error in scan.getErrors(None)] == \
+        ["8 (12)", "14 (18)", "17 (21)"]
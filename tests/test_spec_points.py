@@ -0,0 +1,75 @@
+"""
+Tests of the iteration over the points of a scan
+"""
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+from test_spec_mca import _mcaText
+
+
+def test_points_unparsed(specfile):
+    rows = numpy.arange(2500 * 3.).reshape(2500, 3)
+    lines = ["#F data", "#E 1600000000", "#O0 Theta", "",
+             "#S 1  ascan  th 0 1 10 0.1", "#P0 0", "#N 3",
+             "#L Theta  Monitor  Detector"]
+    lines += ["%g %g %g" % tuple(row) for row in rows]
+    scan = FileSpec(specfile("\n".join(lines) + "\n"))[0]
+
+    chunks = list(scan.iterPoints(chunk=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert numpy.array_equal(numpy.concatenate(chunks), rows)
+    assert not scan.is_parsed
+
+    scan.getData()
+    chunks = list(scan.iterPoints(chunk=1000))
+    assert numpy.array_equal(numpy.concatenate(chunks), rows)
+
+
+def test_points_with_mcas(specfile):
+    spectra = numpy.arange(30 * 20.).reshape(30, 20)
+    scan = FileSpec(specfile(_mcaText(spectra, perline=8)))[0]
+
+    pieces = list(scan.iterPoints(chunk=7, mcas=True))
+    assert not scan.is_parsed
+    assert [len(rows) for rows, mcas in pieces] == [7, 7, 7, 7, 2]
+    data = numpy.concatenate([rows for rows, mcas in pieces])
+    assert numpy.array_equal(data, scan.getData())
+    assert numpy.array_equal(
+        numpy.concatenate([mcas[0] for rows, mcas in pieces]), spectra)
+
+    # the same from the parsed scan
+    parsed = list(scan.iterPoints(chunk=7, mcas=True))
+    for (rows, mcas), (prows, pmcas) in zip(pieces, parsed):
+        assert numpy.array_equal(rows, prows)
+        assert numpy.array_equal(mcas[0], pmcas[0])
+
+
+def test_points_with_mcas_and_errors(specfile):
+    spectra = numpy.arange(300 * 20.).reshape(300, 20)
+    # with two channels per line, the rows are read in runs of lines
+    for perline in (8, 2):
+        text = _mcaText(spectra, perline=perline)
+        # a missing field, a wrong value and an extra line
+        text = text.replace("\n5 50\n", "\n5\n")
+        text = text.replace("\n77 770\n", "\n77 7x0\n")
+        text = text.replace("\n151 1510\n", "\n151 1510\n152 1520 9\n")
+        scan = FileSpec(specfile(text))[0]
+
+        pieces = list(scan.iterPoints(chunk=7, mcas=True))
+        data = numpy.concatenate([rows for rows, mcas in pieces])
+        points = data[:, 0].astype(int)
+        assert len(data) == 298
+        assert 5 not in points and 77 not in points
+        for rows, mcas in pieces:
+            assert numpy.array_equal(mcas[0], spectra[rows[:, 0].astype(int)])
+
+        # the same from the parsed scan
+        assert numpy.array_equal(scan.getData(), data)
+        assert numpy.array_equal(scan.getOneD(0).getData(), spectra[points])
+        assert len(scan.getErrors(None)) == 3
+        parsed = list(scan.iterPoints(chunk=7, mcas=True))
+        for (rows, mcas), (prows, pmcas) in zip(pieces, parsed):
+            assert numpy.array_equal(rows, prows)
+            assert numpy.array_equal(mcas[0], pmcas[0])
@@ -0,0 +1,70 @@
+"""
+Tests of the export of scans to other formats
+"""
+
+import json
+import os
+
+import numpy
+import pytest
+
+from pyspec.file.spec import FileSpec, saveScans
+
+
+def test_save_npz(specfile, tmp_path):
+    fs = FileSpec(specfile())
+    outfile = os.path.join(str(tmp_path), "scans.npz")
+    saveScans(fs, outfile)
+
+    with numpy.load(outfile) as npz:
+        assert sorted(key for key in npz.files if key.startswith("1.0/")) == \
+            ["1.0/Detector", "1.0/H", "1.0/Monitor", "1.0/Theta", "1.0/meta"]
+        assert numpy.array_equal(npz["1.0/H"], [0.5, 0.25, 0.125, 0.0625])
+        assert numpy.array_equal(npz["2.0/mca_0"],
+                                 fs.getScanByNumber(2).getOneD(0).getData())
+        assert numpy.array_equal(npz["3.1/Detector"], [5, 6])
+
+        meta = json.loads(str(npz["1.0/meta"]))
+        assert meta["scanno"] == 1
+        assert meta["motors"][0] == ["Two Theta", "10"]
+
+
+def test_save_prefix_and_no_labels(specfile, tmp_path):
+    text = ("#F data\n#E 1600000000\n\n#S 1  ascan  th 0 1 1 0.1\n#N 2\n"
+            "0 1\n1 2\n")
+    scan = FileSpec(specfile(text))[0]
+    assert scan.getLabels() is None
+
+    outfile = os.path.join(str(tmp_path), "scans.npz")
+    saveScans([scan], outfile, prefix="data")
+    with numpy.load(outfile) as npz:
+        assert sorted(npz.files) == ["data/1.0/col0", "data/1.0/col1",
+                                     "data/1.0/meta"]
+        assert numpy.array_equal(npz["data/1.0/col1"], [1, 2])
+
+
+def test_save_errors(specfile, tmp_path):
+    fs = FileSpec(specfile())
+    outfile = os.path.join(str(tmp_path), "scans.npz")
+    with pytest.raises(ValueError):
+        saveScans(fs, outfile, append=True)
+    with pytest.raises(ValueError):
+        saveScans(fs, outfile, format="mat")
+
+
+@pytest.mark.parametrize("format", ["spec", "csv", "tabs"])
+def test_save_text(specfile, tmp_path, format):
+    scan = FileSpec(specfile())[0]
+    outfile = os.path.join(str(tmp_path), "scan.txt")
+    scan.save(outfile, format=format)
+
+    with open(outfile) as fd:
+        lines = fd.read().strip().split("\n")
+    sep = {"spec": " ", "csv": ",", "tabs": "\t"}[format]
+    data = numpy.array([[float(value) for value in line.split(sep)]
+                        for line in lines[-4:]])
+    assert numpy.array_equal(data, scan.getData())
+    if format == "spec":
+        assert lines[0] == "#S 1 ascan th 1 2.5 3 0.1"
+        reread = FileSpec(outfile)[0]
+        assert numpy.array_equal(reread.getData(), scan.getData())
@@ -0,0 +1,36 @@
+"""
+Tests of the memory taken by the blocks of an indexed file
+"""
+
+import pytest
+
+from pyspec.file import spec
+from pyspec.file.spec import FileSpec
+
+
+def test_blocks_have_slots(specfile):
+    fs = FileSpec(specfile())
+    for block in fs._headers + list(fs):
+        assert not hasattr(block, "__dict__")
+        with pytest.raises(AttributeError):
+            block.other = 1
+
+    assert not hasattr(spec, "_name")
+
+
+def test_parsed_values_created_when_used(specfile):
+    fs = FileSpec(specfile())
+    scan = fs[0]
+    assert scan._parsed is None
+
+    # the labels of an indexed file come from the index
+    assert scan.getLabels() == ["Theta", "H", "Monitor", "Detector"]
+    assert scan._parsed is None
+
+    scan.getData()
+    assert isinstance(scan._parsed, spec._ParsedBlock)
+    assert not hasattr(scan._parsed, "__dict__")
+
+    scan.resetParsedData()
+    assert scan._parsed is None
+    assert scan.getData()[0, 3] == 10
@@ -0,0 +1,76 @@
+"""
+Tests of the selection of scans from a table of their values
+"""
+
+import numpy
+import pytest
+
+from pyspec.file.spec import FileSpec
+
+
+def test_motor_positions(specfile):
+    fs = FileSpec(specfile())
+    table = fs.getScanTable()
+
+    assert len(table) == 4
+    assert table.motors == ["Two Theta", "Theta", "Chi"]
+    assert numpy.array_equal(table["Two Theta"], [10, 20, 30, 40])
+    assert numpy.array_equal(table.numbers, [1, 2, 3, 3])
+    assert numpy.array_equal(table.orders, [0, 0, 0, 1])
+    assert table.select(table["Theta"] >= 7) == fs[2:]
+
+    # the table only needs the headers
+    assert not any(scan.is_parsed or scan.is_header_parsed for scan in fs)
+    with pytest.raises(KeyError):
+        table["Phi"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_counter_stats(specfile, workers):
+    fs = FileSpec(specfile())
+    fs[1].getData()
+    table = fs.getScanTable(counters=["Detector", "H"], workers=workers)
+
+    for row, scan in enumerate(fs):
+        data = scan.getData()
+        assert table["Detector", "max"][row] == data[:, -1].max()
+        assert table["Detector", "min"][row] == data[:, -1].min()
+        assert table["Detector", "sum"][row] == data[:, -1].sum()
+        assert table["Detector", "argmax"][row] == data[:, -1].argmax()
+        scan.resetParsedData()
+
+    # scans without the column have no values
+    assert numpy.isnan(table["H", "max"][1:]).all()
+    assert table["H", "max"][0] == 0.5
+
+    # the scans are not kept parsed, except the one that was
+    fs = FileSpec(fs._filename)
+    fs[1].getData()
+    fs.getScanTable(counters=["Detector"], workers=workers)
+    assert [scan.is_parsed for scan in fs] == [False, True, False, False]
+
+    mask = (table["Detector", "max"] > 100) & (table["Two Theta"] < 30)
+    assert [scan.getNumber() for scan in table.select(mask)] == [2]
+    with pytest.raises(KeyError):
+        table["Detector", "mean"]
+
+
+def test_stats_kept_after_release(specfile):
+    fs = FileSpec(specfile())
+    fs.getScanTable(counters=["Detector"])
+    scan = fs[0]
+    assert not scan.is_parsed
+    assert scan._stats is not None
+
+    # parsing is not done again for a new table
+    parsed = []
+    iterParse = fs.iterParse
+
+    def record(workers=None, scans=None):
+        parsed.extend(scans)
+        return iterParse(workers, scans)
+
+    fs.iterParse = record
+    table = fs.getScanTable(counters=["Detector"])
+    assert parsed == []
+    assert table["Detector", "sum"][0] == 100
@@ -0,0 +1,113 @@
+"""
+Tests of the detection of changes in spec files
+"""
+
+import os
+
+import numpy
+
+from pyspec.file.spec import FileSpec
+
+from conftest import SAMPLE
+
+EXTRA = "\n#S 4  ascan  th 0 1 1 0.1\n#N 2\n#L Theta  Detector\n0 9\n1 10\n"
+
+
+def _write(filename, text):
+    # a different size or modification time is needed to see a change
+    stat = os.stat(filename)
+    with open(filename, "w") as fd:
+        fd.write(text)
+    os.utime(filename, (stat.st_atime, stat.st_mtime + 1))
+
+
+def test_unchanged(specfile):
+    fs = FileSpec(specfile())
+    assert fs.update() is False
+
+
+def test_appended(specfile):
+    filename = specfile()
+    fs = FileSpec(filename)
+    first = fs[0]
+    first.getData()
+
+    _write(filename, SAMPLE + EXTRA)
+    assert fs.update() == FileSpec.APPENDED
+    assert len(fs) == 5
+    assert fs[0] is first and first.is_parsed
+    assert numpy.array_equal(fs.getScanByNumber(4).getData(),
+                             [[0, 9], [1, 10]])
+    assert fs.update() is False
+
+
+def test_appended_to_last_scan(specfile):
+    filename = specfile()
+    fs = FileSpec(filename)
+    assert len(fs[-1].getData()) == 2
+
+    _write(filename, SAMPLE + "2 7\n")
+    assert fs.update() == FileSpec.APPENDED
+    assert len(fs) == 4
+    assert numpy.array_equal(fs[-1].getData(), [[0, 5], [1, 6], [2, 7]])
+
+
+def test_truncated(specfile):
+    filename = specfile(SAMPLE + EXTRA)
+    fs = FileSpec(filename)
+    first = fs[0]
+
+    _write(filename, SAMPLE)
+    assert fs.update() == FileSpec.TRUNCATED
+    assert len(fs) == 4
+    assert fs[0] is first
+    assert fs.getScanByNumber(4) is None
+
+
+def test_rewritten(specfile):
+    filename = specfile()
+    fs = FileSpec(filename)
+    fs[0].getData()
+
+    # a new file with the same name, with the same size
+    _write(filename, SAMPLE.replace("1 0.5 1000 10", "1 0.5 1000 11"))
+    assert fs.update() == FileSpec.REWRITTEN
+    assert len(fs) == 4
+    assert fs[0].getData()[0, 3] == 11
+
+    _write(filename, EXTRA.lstrip().replace("#S 4", "#S 1"))
+    assert fs.update() == FileSpec.REWRITTEN
+    assert len(fs) == 1
+    assert numpy.array_equal(fs[0].getData(), [[0, 9], [1, 10]])
+
+
+def test_replaced_file(specfile):
+    filename = specfile()
+    fs = FileSpec(filename)
+
+    # moved over the old file, as editors do
+    other = specfile(SAMPLE.replace("#S 3", "#S 5"), name="other.dat")
+    os.rename(other, filename)
+    assert fs.update() == FileSpec.REWRITTEN
+    assert [scan.getNumber() for scan in fs] == [1, 2, 5, 5]
+
+
+def test_rewritten_larger(specfile):
+    filename = specfile()
+    fs = FileSpec(filename)
+    fs[0].getData()
+
+    # the same scans again with a change in the first one, and more scans
+    _write(filename, "")
+    _write(filename, SAMPLE.replace("1 0.5 1000 10", "1 0.5 1000 11") + EXTRA)
+    assert fs.update() == FileSpec.REWRITTEN
+    assert len(fs) == 5
+    assert fs[0].getData()[0, 3] == 11
+
+    # or with a change in the file header
+    _write(filename, "")
+    _write(filename, SAMPLE.replace("User = specuser", "User = other") +
+           EXTRA + EXTRA.replace("#S 4", "#S 5"))
+    assert fs.update() == FileSpec.REWRITTEN
+    assert len(fs) == 6
+    assert fs.getUser() == "other"
@@ -0,0 +1,69 @@
+"""
+Tests of the specfile command line tool
+"""
+
+import os
+import subprocess
+import sys
+
+import numpy
+import pytest
+
+from conftest import PYSPEC_DIR, SAMPLE
+
+
+def _specfile(tmp_path, *args):
+    # the tool imports pyspec from $SPECD
+    specd = os.path.join(str(tmp_path), "spec.d")
+    if not os.path.exists(specd):
+        os.makedirs(specd)
+        os.symlink(PYSPEC_DIR, os.path.join(specd, "pyspec"))
+
+    env = dict(os.environ, SPECD=specd)
+    tool = os.path.join(PYSPEC_DIR, "tools", "specfile.py")
+    return subprocess.run([sys.executable, tool] + list(args),
+                          cwd=str(tmp_path), env=env,
+                          stdout=subprocess.PIPE, universal_newlines=True)
+
+
+@pytest.fixture
+def twofiles(tmp_path):
+    for name in ("run1.dat", "run2.dat"):
+        with open(os.path.join(str(tmp_path), name), "w") as fd:
+            fd.write(SAMPLE.replace("1 0.5 1000 10", "1 0.5 1000 %s" %
+                                    name[3]))
+    return tmp_path
+
+
+def test_list(twofiles):
+    result = _specfile(twofiles, "-l", "run1.dat")
+    assert result.returncode == 0
+    assert result.stdout.strip() == "1:3,3"
+
+
+@pytest.mark.parametrize("jobs", ["1", "3"])
+def test_bundle_of_two_files(twofiles, jobs):
+    result = _specfile(twofiles, "-S", "-a", "-f", "npz", "-j", jobs,
+                       "-d", "out", "-p", "all", "run*.dat")
+    assert result.returncode == 0
+
+    bundle = os.path.join(str(twofiles), "out", "all_bundle.npz")
+    assert os.listdir(os.path.dirname(bundle)) == ["all_bundle.npz"]
+    with numpy.load(bundle) as npz:
+        keys = set(key.rsplit("/", 1)[0] for key in npz.files)
+        assert keys == set("%s/%s" % (name, scan) for name in
+                           ("run1.dat", "run2.dat")
+                           for scan in ("1.0", "2.0", "3.0", "3.1"))
+        assert npz["run1.dat/1.0/Detector"][0] == 1
+        assert npz["run2.dat/1.0/Detector"][0] == 2
+
+
+def test_export_by_scan(twofiles):
+    result = _specfile(twofiles, "-f", "csv", "-j", "2", "run1.dat",
+                       "1,3.1")
+    assert result.returncode == 0
+
+    outdir = os.path.join(str(twofiles), "run1")
+    assert sorted(os.listdir(outdir)) == ["run1_1.csv", "run1_3.csv"]
+    with open(os.path.join(outdir, "run1_3.csv")) as fd:
+        assert fd.read().split("\n")[1:3] == ["0,5", "1,6"]